@@ -10,4 +10,13 @@
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
-# limitations under the License.
\ No newline at end of file
+# limitations under the License.
+
+__all__ = ["extract", "extract_many", "AsyncExtractor", "aextract_many"]
+
+def __getattr__(name: str):
+    # mediapipe の読み込みは重いため，API は最初に使われたときに読み込む
+    if name in __all__:
+        from . import api
+        return getattr(api, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,287 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+コマンドラインを経由せず，Python から姿勢推定を実行する API
+
+    import mpdriver
+
+    landmarks = mpdriver.extract("video.mp4")   # (T, ...) の np.ndarray
+    for path, landmarks, meta in mpdriver.extract_many(paths, workers=4):
+        ...
+
+    async with mpdriver.AsyncExtractor(workers=4, timeout=600) as extractor:
+        async for path, landmarks, meta in extractor.extract_many(paths):
+            ...
+
+ランドマークはディスクへ書き出さず，配列として返します．
+"""
+
+import asyncio
+import copy
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from threading import Event, Lock
+from typing import Any, AsyncIterator, Iterable, Iterator, TypeVar
+
+import numpy as np
+
+from .core.main_base import AppWorkerThread
+from .apps.run.main import RunApp, RunExecutor
+from .engine.mediapipe import mediapipe_config
+from .utils.meta import RunMetadata
+
+_T = TypeVar("_T")
+NDArray = np.ndarray[Any, np.dtype[_T]]
+PathLike = str | Path
+Config = Iterable[tuple[str, str]]
+
+_lock = Lock()
+_app_config: tuple[tuple[str, str], ...] | None = None
+_default_mediapipe_config = copy.deepcopy(mediapipe_config)
+"RunApp が設定を書き換える前の mediapipe の設定"
+
+def _get_app(config: Config = ()) -> RunApp:
+    """
+    このプロセスの RunApp を返します
+
+    RunApp は mediapipe の設定 (モジュール変数) を書き換えるため，プロセス毎に1つだけ保持し，
+    設定が変わったときだけ既定の設定に戻してから作り直します．`_lock` を取得してから呼び出します．
+    """
+
+    global _app_config
+
+    config = tuple(config)
+    if _app_config != config:
+        # 他のモジュールも同じ辞書を参照しているため，中身を入れ替える
+        mediapipe_config.clear()
+        mediapipe_config.update(copy.deepcopy(_default_mediapipe_config))
+        RunExecutor._signle_init((list(config),))
+        _app_config = config
+    return AppWorkerThread[RunApp].get_thread().app_process
+
+def _run_kwargs(normalize: bool, clip: bool, flat: bool, progress: bool) -> dict[str, Any]:
+    return {
+        "f_normalize": normalize,
+        "f_clip": clip,
+        "f_flat": flat,
+        "return_landmarks": True,
+        "tqdm_kwds": {"disable": not progress},
+    }
+
+def _unpack(result: tuple[NDArray[np.floating], RunMetadata] | None) -> tuple[NDArray[np.floating], RunMetadata | None]:
+    """フレームがなかった場合は空の配列を返します"""
+    if result is None or result[0] is None:
+        return np.empty((0,), dtype=np.float32), None if result is None else result[1]
+    return result
+
+def extract(
+    src: PathLike,
+    *,
+    normalize: bool = True,
+    clip: bool = True,
+    flat: bool = True,
+    config: Config = (),
+    out: NDArray[np.floating] | None = None,
+    progress: bool = False
+    ) -> NDArray[np.floating]:
+    """
+    動画，または連続画像のディレクトリからランドマークを推定します
+
+    Args:
+        src: 動画ファイル，または画像のディレクトリ
+        normalize, clip, flat: `mpdriver run --landmarks` の同名のオプションと同じ
+        config: `--config` と同じ (キー, JSON の値) の組
+        out: 書き込み先の配列 (e.g. 共有メモリ上の配列)．フレーム数以上の長さが必要
+        progress: プログレスバーを表示する
+
+    Returns:
+        NDArray: (T, ...) のランドマーク．`out` を渡した場合はその先頭 T フレームのビュー
+    """
+
+    with _lock: # mediapipe のグラフはスレッドセーフではない
+        result = _get_app(config).run(Path(src), out=out, **_run_kwargs(normalize, clip, flat, progress))
+    return _unpack(result)[0]
+
+def extract_many(
+    paths: Iterable[PathLike],
+    workers: int | None = None,
+    *,
+    normalize: bool = True,
+    clip: bool = True,
+    flat: bool = True,
+    config: Config = (),
+    progress: bool = False
+    ) -> Iterator[tuple[Path, NDArray[np.floating], RunMetadata | None]]:
+    """
+    複数の入力からランドマークを推定し，終わった順に (パス, ランドマーク, メタデータ) を返します
+
+    `workers` を指定した場合はそのプロセス数のプールで並列に実行し，結果はプロセス間で転送されます．
+    None の場合はこのプロセスで順に実行します．途中でイテレータを閉じると未着手の入力は取り消されます．
+    """
+
+    kwargs = _run_kwargs(normalize, clip, flat, progress)
+    jobs = [((Path(path),), kwargs) for path in paths]
+
+    if workers is None:
+        for (src,), _ in jobs:
+            with _lock:
+                result = _get_app(config).run(src, **kwargs)
+            yield (src, *_unpack(result))
+        return
+
+    # このプロセスで既に mediapipe を使っている場合があるため，ワーカは fork せずに forkserver から起動する
+    executor = RunExecutor(workers, (list(config),), mp_context=get_context("forkserver"))
+    try:
+        for ((src,), _), result in executor.as_completed(jobs):
+            yield (src, *_unpack(result))
+    finally:
+        executor.shutdown()
+
+def _run_local(src: Path, kwargs: dict[str, Any], config: Config) -> tuple[NDArray[np.floating], RunMetadata] | None:
+    with _lock:
+        return _get_app(config).run(src, **kwargs)
+
+class AsyncExtractor:
+    """
+    asyncio のイベントループを止めずにランドマークを推定します
+
+    ジョブは `workers` 個のプロセスのプール (None の場合はこのプロセスの1つのスレッド) で実行されます．
+    同時に実行するジョブは `concurrency` (既定は `workers`) 個までです．
+    タイムアウトやタスクの取り消しはワーカへ伝わり，実行中のジョブは次のフレームで中断されます．
+
+        async with AsyncExtractor(workers=4, timeout=600) as extractor:
+            landmarks = await extractor.extract("video.mp4")
+            async for path, landmarks, meta in extractor.extract_many(paths):
+                ...
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        *,
+        concurrency: int | None = None,
+        timeout: float | None = None,
+        normalize: bool = True,
+        clip: bool = True,
+        flat: bool = True,
+        config: Config = (),
+        progress: bool = False
+        ):
+
+        self.timeout = timeout
+        self.config = tuple(config)
+        self.kwargs = _run_kwargs(normalize, clip, flat, progress)
+        self.semaphore = asyncio.Semaphore(concurrency or workers or 1)
+
+        self.executor: RunExecutor | None
+        self.pool: Executor
+        if workers is None:
+            self.executor = None
+            self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mpdriver")
+        else:
+            self.executor = RunExecutor(workers, (list(self.config),), mp_context=get_context("forkserver"))
+            self.pool = self.executor.multi_process_dict["pool"]
+
+    def _create_event(self) -> Event:
+        return Event() if self.executor is None else self.executor.create_event()
+
+    def _submit(self, src: Path, kwargs: dict[str, Any]) -> "Future[Any]":
+        if self.executor is None:
+            return self.pool.submit(_run_local, src, kwargs, self.config)
+        return self.pool.submit(RunExecutor._map_job, ((src,), kwargs))
+
+    async def _extract(self, src: Path, timeout: float | None) -> tuple[NDArray[np.floating], RunMetadata | None]:
+
+        async with self.semaphore:
+
+            loop = asyncio.get_running_loop()
+            cancel_event = await loop.run_in_executor(None, self._create_event)
+            future = self._submit(src, self.kwargs | {"cancel_event": cancel_event})
+            wrapped = asyncio.wrap_future(future)
+
+            try:
+                result = await asyncio.wait_for(asyncio.shield(wrapped), timeout)
+            except (asyncio.CancelledError, TimeoutError):
+                if future.cancel(): # まだ始まっていない
+                    raise
+                # ワーカのジョブを中断し，終わるまで待ってから枠を空ける
+                await loop.run_in_executor(None, cancel_event.set)
+                try:
+                    await wrapped
+                except Exception: # JobCancelled，または中断する前に失敗した
+                    pass
+                raise
+
+        return _unpack(result)
+
+    async def extract(self, src: PathLike, timeout: float | None = None) -> NDArray[np.floating]:
+        """`extract` の非同期版．`timeout` (None の場合はコンストラクタの値) を超えると `TimeoutError`"""
+        return (await self._extract(Path(src), self.timeout if timeout is None else timeout))[0]
+
+    async def extract_many(
+        self,
+        paths: Iterable[PathLike],
+        return_exceptions: bool = False
+        ) -> AsyncIterator[tuple[Path, NDArray[np.floating] | BaseException, RunMetadata | None]]:
+        """
+        複数の入力を投入し，終わった順に (パス, ランドマーク, メタデータ) を返します
+
+        `return_exceptions` の場合，失敗した (タイムアウトを含む) 入力はランドマークの代わりに例外を返します．
+        そうでない場合は最初の例外を送出します．ループを抜けると残りのジョブは取り消されます．
+        """
+
+        async def job(src: Path):
+            try:
+                return (src, *(await self._extract(src, self.timeout)))
+            except Exception as e:
+                if not return_exceptions: raise
+                return src, e, None
+
+        tasks = [asyncio.ensure_future(job(Path(path))) for path in paths]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def aclose(self):
+        """ワーカを終了します"""
+
+        loop = asyncio.get_running_loop()
+        if self.executor is None:
+            await loop.run_in_executor(None, self.pool.shutdown)
+        else:
+            await loop.run_in_executor(None, self.executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+async def aextract_many(
+    paths: Iterable[PathLike],
+    workers: int | None = None,
+    **options: Any
+    ) -> AsyncIterator[tuple[Path, NDArray[np.floating] | BaseException, RunMetadata | None]]:
+    """`extract_many` の非同期版．`options` は `AsyncExtractor` と `AsyncExtractor.extract_many` の引数"""
+
+    return_exceptions = options.pop("return_exceptions", False)
+    async with AsyncExtractor(workers, **options) as extractor:
+        async for item in extractor.extract_many(paths, return_exceptions):
+            yield item
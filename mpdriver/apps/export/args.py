@@ -0,0 +1,133 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+from typing import TypedDict
+
+from ...core.args_base import subparsers, get_help_action, textwrap, argparse, NArgsAction, AppArgs, HelpFormatter, Boolean
+from ..run.args import runarg_config_type, PathResoolved
+from .help import HELP
+
+command = Path(__file__).parent.name
+parser = subparsers.add_parser(command, add_help=False, formatter_class=HelpFormatter)
+parser.set_defaults(command=command)
+parser._add_action(get_help_action(
+    url='https://github.com/plumiume/MPDriver3/blob/main/mpdriver/apps/export/README.md'
+))
+"""
+    mpdriver run src -l path/to/lm --raw-cache path/to/cache
+    mpdriver export src -C path/to/cache -l path/to/lm2 npy normalize=false -p 4
+    ==> 推論せずにキャッシュからランドマークを出力
+"""
+
+class ExportArgs(AppArgs):
+    command = command
+    'コマンド名'
+    src: Path = parser.add_argument('src', type=PathResoolved, help=HELP['apps.export.args:src'])
+    '入力 動画ファイルまたは連続画像ディレクトリ'
+    cache: Path = parser.add_argument(
+        '--cache', '-C', type=PathResoolved, required=True,
+        help=HELP['apps.export.args:cache']
+    )
+    '推論結果のキャッシュのディレクトリ'
+    class LandmarksOptions(TypedDict):
+        overwrite: bool
+        normalize: bool
+        clip: bool
+        flat: bool
+        header: bool
+        sparse: bool
+        mirror: bool
+        precision: int
+        row_group: int
+        compress: bool
+        codec: str
+        level: int
+        chunk: int
+        delta: bool
+        step: float
+        fsync: bool
+        meta: bool
+        shard_mb: int
+    landmarks: tuple[tuple[Path | None, str], LandmarksOptions] = parser.add_argument(
+        '--landmarks', '-l', action=NArgsAction, nargs='*',
+        type=(_type:=(
+            (PathResoolved, None),
+            {
+                'overwrite': Boolean, 'normalize': Boolean,
+                'clip': Boolean, 'flat': Boolean, 'header': Boolean,
+                'sparse': Boolean, 'mirror': Boolean,
+                'precision': int, 'row_group': int,
+                'compress': Boolean, 'codec': str, 'level': int, 'chunk': int,
+                'delta': Boolean, 'step': float, 'fsync': Boolean,
+                'meta': Boolean, 'shard_mb': int
+            }
+        )),
+        default=(_default:=(
+            (None, '.csv'),
+            {
+                'overwrite': False, 'normalize': True,
+                'clip': True, 'flat': True, 'header': False,
+                'sparse': False, 'mirror': False,
+                'precision': 0, 'row_group': 0,
+                'compress': False, 'codec': 'zlib', 'level': -1, 'chunk': 256,
+                'delta': False, 'step': 1e-4, 'fsync': False,
+                'meta': False, 'shard_mb': 2048
+            }
+        )),
+        help=textwrap.dedent(f'''
+            {HELP['apps.export.args:landmarks_options_title']}
+            --landmarks dst [ext] [optkey=optvalue]
+            requires:
+                    dst         {HELP['apps.export.args:landmarks_options_dst'].format(
+                        type=_type[0][0], default=_default[0][0])}
+                    ext         {HELP['apps.export.args:landmarks_options_ext'].format(
+                        type=_type[0][1], default=_default[0][1])}
+            options:
+                    overwrite, normalize, clip, flat, header, sparse, mirror, precision, row_group,
+                    compress, codec, level, chunk, delta, step, fsync, meta, shard_mb
+                                {HELP['apps.export.args:landmarks_options_others']}
+        ''').strip()
+    )
+    'ランドマーク出力ディレクトリ'
+    cpu: int | None = parser.add_argument(
+        '--cpu', '-p', type=int, default=None,
+        help=HELP['apps.export.args:cpu']
+    )
+    threads: int = parser.add_argument(
+        '--threads', type=int, default=0,
+        help=HELP['apps.export.args:threads']
+    )
+    'ワーカあたりのスレッド数'
+    pin: bool = parser.add_argument(
+        '--pin', action=argparse._StoreTrueAction,
+        help=HELP['apps.export.args:pin']
+    )
+    'ワーカをコアに固定する'
+    add_ext: list[str] = parser.add_argument(
+        '--add-ext', type=str, action=argparse._AppendAction,
+        help=HELP['apps.export.args:add_ext'], default=list()
+    )
+    '入力動画ファイルの追加の拡張子'
+    ledger: Path | None = parser.add_argument(
+        '--ledger', type=Path, default=None,
+        help=HELP['apps.export.args:ledger']
+    )
+    'mpdriver run の台帳 (SQLite)'
+    config: list[tuple[str, str]] = parser.add_argument(
+        '--config', '-c', action=argparse._AppendAction,
+        type=runarg_config_type,
+        help=HELP['apps.export.args:config'], default=list()
+    )
+    '追加の設定'
@@ -0,0 +1,29 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+HELP = {
+    'apps.export.args:src': '出力する動画ファイルまたは連続画像ディレクトリ (mpdriver run の src と同じ)',
+    'apps.export.args:cache': 'mpdriver run --raw-cache のディレクトリ',
+    'apps.export.args:landmarks_options_title': 'ランドマーク出力',
+    'apps.export.args:landmarks_options_dst': 'ランドマーク出力ディレクトリ',
+    'apps.export.args:landmarks_options_ext': 'ランドマーク出力の拡張子 .csv, .npy, .npz, .lmz ({default})．pack を指定すると dst に全てのクリップをまとめて追記します',
+    'apps.export.args:landmarks_options_others': 'mpdriver run --landmarks の同名のオプションと同じ (raw を除く)',
+    'apps.export.args:cpu': 'マルチプロセスの数を設定する．指定しない場合は使えるコア数 (cgroup のクォータを含む) から決め，0 ならシングルプロセスで動作します (以前の既定のシングルプロセスは 0)',
+    'apps.export.args:threads': 'ワーカあたりの BLAS のスレッド数．0 ならコア数をワーカで等分する (%(default)s)',
+    'apps.export.args:pin': 'ワーカを重ならないコアの組に固定する',
+    'apps.export.args:add_ext': '入力動画ファイルの追加の拡張子．',
+    'apps.export.args:ledger': 'mpdriver run --ledger --hash-content の台帳．記録した内容のハッシュでキャッシュを探し，入力を読み直さない (%(default)s)',
+    'apps.export.args:config': '追加の設定．[confkey]=[confvalue]で設定ファイルの内容を上書きできます (mediapipe.holistic はキャッシュのキー)',
+}
@@ -0,0 +1,324 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+推論結果のキャッシュからランドマークを出力するアプリ
+
+`mpdriver run --raw-cache cache` がキャッシュした正規化前の全ランドマーク (holistic の設定と入力の内容がキー) を読み込み，
+`landmark_indices`，`dimension_targets`，normalize，clip，flat などを変えた出力を推論せずに作り直します．
+出力は `mpdriver run` と同じく，ファイル毎または pack ディレクトリへまとめて書き出します．
+モデルは読み込まず，動画もデコードしません．
+"""
+
+from pathlib import Path
+from typing import *
+from concurrent.futures import ThreadPoolExecutor
+import mimetypes
+import sys
+import time
+import unicodedata
+
+import numpy as np
+
+from ...utils import is_video, video_or_imgdir_pathes, LandmarkWriter
+from ...utils.atomic import remove_temp_files
+from ...utils.pack import PACK_SUFFIX, DEFAULT_SHARD_SIZE, load_pack_index, clip_spool_path
+from ...utils.raw_cache import raw_cache_path, load_raw_cache_info, iter_raw_cache
+from ...utils.meta import (
+    META_LAYOUT_VERSION, RunMetadata, StageTimer, DetectionStats,
+    engine_versions, metadata_path, write_metadata, update_summary
+)
+from ...core.config import config_hash
+from ...core.ledger import JobLedger, input_identity, content_hash
+from ...core.main_base import AppWorkerThread, AppExecutor, PROGRESS_DESC_PREFIX
+from ...core.progress import TqdmKwargs
+from ...core.threads import resolve_workers
+from ...engine.mediapipe import mediapipe_config
+
+from ..run.main import RunApp, apply_config, holistic_hash, mirrored_path, mirrored_key
+
+from .args import ExportArgs
+
+class ExportApp(RunApp):
+
+    def __init__(self, config: list[tuple[str, str]] = []):
+        # 推論しないのでモデルは読み込まない
+        super().__init__(config, load_model=False)
+
+    def run(
+        self,
+        src: Path,
+        raw: Path,
+        landmarks: Path,
+        f_normalize: bool = True,
+        f_clip: bool = True,
+        f_flat: bool = True,
+        f_header: bool = False,
+        f_sparse: bool = False,
+        f_mirror: bool = False,
+        precision: int | None = None,
+        row_group: int = 0,
+        compress: bool = False,
+        codec: str = "zlib",
+        level: int | None = None,
+        chunk_size: int = 256,
+        delta_step: float | None = None,
+        f_fsync: bool = False,
+        meta_key: str | None = None,
+        pack_key: str | None = None,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        tqdm_kwds: TqdmKwargs = {},
+        src_str_len: int | None = None
+        ):
+        """
+        Writes the landmarks of `src` from the raw cache written by `mpdriver run --raw-cache`, without running inference.
+
+        Args:
+                src (Path): The input source the cache entry was made from.
+                raw (Path): The cache entry (`<cache>/<holistic hash>/<content hash>.raw.npy`).
+                landmarks (Path): The path to save the landmarks, or the pack directory if `pack_key` is given.
+                pack_key (str | None): If given, the clip is appended to the pack `landmarks` under this key.
+                Other arguments are the same as `RunApp.run`.
+        """
+
+        tqdm_handler = AppWorkerThread.get_thread().tqdm_handler
+        timer = StageTimer()
+
+        raw_landmarks = np.load(raw, mmap_mode='r')
+        total = len(raw_landmarks)
+        # 入力の情報はキャッシュを作成したときのもの
+        source = load_raw_cache_info(raw)["source"] | {"path": src.as_posix()}
+        landmarks_config_hash = config_hash(mediapipe_config, f_normalize, f_clip, f_flat)
+
+        writers: list[LandmarkWriter]
+        if pack_key is not None: # pack のシャードに追記
+            pack = self.get_pack_writer(landmarks, shard_size, f_fsync)
+            writers = [pack.open_clip(pack_key, src.as_posix(), total, source["fps"], landmarks_config_hash)]
+            if f_mirror:
+                writers.append(pack.open_clip(mirrored_key(pack_key), src.as_posix(), total, source["fps"], landmarks_config_hash))
+        else:
+            writer_options = (f_header, f_sparse, precision, row_group, compress, codec, level, chunk_size, delta_step, f_fsync)
+            writers = [self.open_landmarks_writer(landmarks, total, *writer_options)]
+            if f_mirror:
+                writers.append(self.open_landmarks_writer(mirrored_path(landmarks), total, *writer_options))
+
+        stats = DetectionStats(self.mp.get_target_sizes().keys())
+
+        def rows(row: np.ndarray) -> Iterator[np.ndarray]:
+            """`RunApp.run` の正規化と整形 (1フレーム)"""
+            mpd = self.mp.from_raw(row)
+            stats.update(mpd)
+            for mpd in ((mpd, self.mp.mirror(mpd)) if f_mirror else (mpd,)):
+                if f_normalize:
+                    mpd = self.mp.normalize(mpd, clip=f_clip)
+                yield self.mp.flatten(mpd, as_3d=not f_flat)
+
+        total_str_len = max(4, len(str(total)))
+        tasks = tqdm_handler.tqdm(timer.wrap_iter("read", raw_landmarks), **({
+            "total": total, "desc": src.as_posix(),
+            "bar_format": (
+                f"{{desc:{70 if src_str_len is None else src_str_len}}} "
+                f"{{percentage:6.2f}}%|"
+                f"{{bar}}|"
+                f"{{n:{total_str_len}d}}/{{total:{total_str_len}d}}|"
+                f"{{rate_fmt}}{{postfix}}"
+            ),
+            "priority": 0,
+            "unit": "f"
+        } | tqdm_kwds)) # プログレスバー
+
+        try:
+            for row in tasks:
+                for writer, landmark_row in zip(writers, rows(row)):
+                    writer.write(landmark_row)
+        except BaseException:
+            for writer in writers:
+                writer.abort()
+            raise
+
+        if meta_key is not None: # メタデータ: サイドカー，または pack のインデックスに埋め込む
+            meta = RunMetadata(
+                version=META_LAYOUT_VERSION,
+                key=meta_key,
+                source=source,
+                frames=stats.frames,
+                **stats.metadata(),
+                config_hash=landmarks_config_hash,
+                engine=engine_versions(),
+                timings=timer.timings,
+                created=time.time()
+            )
+            if pack_key is not None:
+                writers[0].meta = meta
+
+        counts = [writer.close() for writer in writers]
+        del tasks
+
+        if meta_key is not None and pack_key is None and counts[0]:
+            write_metadata(metadata_path(landmarks), meta, f_fsync)
+
+    @classmethod
+    def cleanup(
+        cls,
+        src: Path,
+        raw: Path,
+        landmarks: Path,
+        f_mirror: bool = False,
+        pack_key: str | None = None,
+        **kwargs: Any
+        ):
+
+        if pack_key is not None:
+            paths = [clip_spool_path(landmarks, key) for key in (pack_key, *([mirrored_key(pack_key)] if f_mirror else []))]
+        else:
+            paths = [landmarks, mirrored_path(landmarks), metadata_path(landmarks)]
+        for path in paths:
+            remove_temp_files(path)
+
+class ExportExecutor(AppExecutor[ExportApp]): # 子プロセス上の実行クラス
+    app_type = ExportApp # AppExecutor で使用するので，必ず app_type を設定
+
+def app_main(ns: ExportArgs): # アプリケーションのコマンドラインツール用エントリーポイント
+
+    if ns.landmarks[0][0] is None:
+        print('WARNNING:', 'nothing to do without --landmarks')
+        return
+
+    # sparse=true は .npz だけが対応する (他の形式では黙って密な出力になる)
+    if ns.landmarks[1]["sparse"] and ns.landmarks[0][1] != '.npz':
+        print('ERROR:', f'landmarks sparse=true requires the .npz suffix (got {ns.landmarks[0][1]})', file=sys.stderr)
+        return
+
+    for ext in ns.add_ext:
+        if ext.startswith('.'):
+            ext = ext[1:]
+        mimetypes.add_type(f'video/{ext}', f'.{ext}')
+
+    # キャッシュのキー: ワーカと同じ設定の holistic のハッシュ
+    apply_config(ns.config)
+    holistic_key = holistic_hash()
+
+    # キャッシュを作成したときの入力 (パス，サイズ，更新時刻) が同じなら，内容のハッシュを計算しない
+    known = {
+        (info["source"]["path"], info["source"]["size"], info["source"]["mtime"]): cache_file
+        for cache_file, info in iter_raw_cache(ns.cache, holistic_key)
+    }
+    # --ledger: mpdriver run --hash-content が台帳に記録した内容のハッシュも使う (台帳はこのスレッドで読む)
+    if ns.ledger is None:
+        ledger_hashes = {}
+    else:
+        with JobLedger(ns.ledger) as ledger:
+            ledger_hashes = ledger.content_hashes()
+
+    def find_cache(src: Path) -> Path | None:
+        identity = input_identity(src)
+        if (cache_file := known.get((src.as_posix(), identity.size, identity.mtime))) is None:
+            digest = ledger_hashes.get((identity.path, identity.size, identity.mtime)) or content_hash(src)
+            cache_file = raw_cache_path(ns.cache, holistic_key, digest)
+        return cache_file if cache_file.exists() else None
+
+    executor = ExportExecutor(resolve_workers(ns.cpu, ns.threads), (ns.config,), threads=ns.threads, pin=ns.pin)
+
+    # --landmarks dst pack: 1つの pack ディレクトリにまとめて追記
+    use_pack = ns.landmarks[0][1] == PACK_SUFFIX
+    pack_keys = set(load_pack_index(ns.landmarks[0][0])) if use_pack else set()
+
+    def job(src: Path, src_related: Path) -> tuple[Path, Path, Path, str | None] | None:
+        if use_pack:
+            landmarks, pack_key = ns.landmarks[0][0], src_related.as_posix()
+            if not ns.landmarks[1]["overwrite"] and pack_key in pack_keys:
+                return None
+            return src, src_related, landmarks, pack_key
+        landmarks = (ns.landmarks[0][0] / src_related).with_suffix(ns.landmarks[0][1])
+        if not ns.landmarks[1]["overwrite"] and landmarks.exists():
+            return None
+        return src, src_related, landmarks, None
+
+    def srcs_iter() -> Iterator[tuple[Path, Path, Path, str | None]]:
+
+        if is_video(ns.src): # src が単一ファイル
+            if (item := job(ns.src, Path(ns.src.name))) is not None:
+                yield item
+            return
+
+        for src in video_or_imgdir_pathes(ns.src): # src がディレクトリ
+            src_related = src.relative_to(ns.src)
+            if (item := job(ns.src / src_related, src_related)) is not None:
+                yield item
+
+    srcs = list(executor._tqdm_func(
+        srcs_iter(),
+        desc = f'\033[46m{PROGRESS_DESC_PREFIX.format("Searching...")}\033[0m',
+        priority=1
+    )) # ファイルを探索
+
+    # 内容のハッシュは I/O が主なのでスレッドで並列に計算する
+    with ThreadPoolExecutor(max_workers=8) as hash_pool:
+        cache_files = list(hash_pool.map(find_cache, (src for src, _, _, _ in srcs)))
+
+    options = ns.landmarks[1]
+    args_kwargs_list = list[tuple[tuple[Path, Path, Path], dict[str, Any]]]()
+    for (src, src_related, landmarks, pack_key), cache_file in zip(srcs, cache_files):
+        if cache_file is None:
+            print('WARNNING:', f'skip {src} because it is not in the cache')
+            continue
+        args_kwargs_list.append((
+            (src, cache_file, landmarks),
+            {
+                'f_normalize': options["normalize"],
+                'f_clip': options["clip"],
+                'f_flat': options["flat"],
+                'f_header': options["header"],
+                'f_sparse': options["sparse"],
+                'f_mirror': options["mirror"],
+                'precision': options["precision"] or None,
+                'row_group': options["row_group"],
+                'compress': options["compress"],
+                'codec': options["codec"],
+                'level': None if options["level"] < 0 else options["level"],
+                'chunk_size': options["chunk"],
+                'delta_step': options["step"] if options["delta"] else None,
+                'f_fsync': options["fsync"],
+                'meta_key': src_related.as_posix() if options["meta"] else None,
+                'pack_key': pack_key,
+                'shard_size': options["shard_mb"] << 20,
+            }
+        ))
+
+    # プログレスバーに表示する入力ファイルのパスの最大文字長を取得 -> 0埋め用
+    src_str_len = max(
+        (
+            sum(
+                2 if unicodedata.east_asian_width(c) in "FWA" else 1
+                for c in item[0][0].as_posix()
+            )
+            for item in args_kwargs_list
+        ),
+        default=None
+    )
+
+    for item in args_kwargs_list:
+        item[1]['src_str_len'] = src_str_len
+
+    # アプリケーションを実行
+    executor.execute(args_kwargs_list)
+
+    # 書き出したメタデータをサマリインデックスに反映
+    if options["meta"] and ns.landmarks[0][0].exists():
+        update_summary(
+            ns.landmarks[0][0],
+            sidecars=(metadata_path(args[2]) for args, kwargs in args_kwargs_list if kwargs['pack_key'] is None),
+            pack_keys=(kwargs['pack_key'] for _, kwargs in args_kwargs_list if kwargs['pack_key'] is not None),
+            fsync=options["fsync"]
+        )
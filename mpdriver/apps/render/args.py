@@ -0,0 +1,141 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+from typing import TypedDict
+
+from ...core.args_base import subparsers, get_help_action, textwrap, argparse, NArgsAction, AppArgs, HelpFormatter, Boolean
+from ..run.args import runarg_config_type, PathResoolved
+from .help import HELP
+
+command = Path(__file__).parent.name
+parser = subparsers.add_parser(command, add_help=False, formatter_class=HelpFormatter)
+parser.set_defaults(command=command)
+parser._add_action(get_help_action(
+    url='https://github.com/plumiume/MPDriver3/blob/main/mpdriver/apps/render/README.md'
+))
+"""
+    mpdriver run src -l path/to/lm npy raw=true
+    mpdriver render src -r path/to/lm -a path/to/ann mp4 -p 4
+    ==> 推論せずに raw ランドマークから描画
+"""
+
+class RenderArgs(AppArgs):
+    command = command
+    'コマンド名'
+    src: Path = parser.add_argument('src', type=PathResoolved, help=HELP['apps.render.args:src'])
+    '入力 動画ファイルまたは連続画像ディレクトリ'
+    raw: Path = parser.add_argument(
+        '--raw', '-r', type=PathResoolved, required=True,
+        help=HELP['apps.render.args:raw']
+    )
+    'raw ランドマークのディレクトリ'
+    class AnnotatedOptions(TypedDict):
+        overwrite: bool
+        fps: float
+        draw_lm: bool
+        draw_conn: bool
+        mask_face: bool
+        encoder: str
+        codec: str
+        preset: str
+        crf: int
+        threads: int
+        quality: int
+        compression: int
+        in_flight: int
+    annotated: tuple[tuple[Path | None, str], AnnotatedOptions] = parser.add_argument(
+        '--annotated', '-a',
+        type=(_type:=(
+            (PathResoolved, None),
+            {
+                'overwrite': Boolean, 'fps': float,
+                'draw_lm': Boolean, 'draw_conn': Boolean, 'mask_face': Boolean,
+                'encoder': str, 'codec': str, 'preset': str, 'crf': int, 'threads': int,
+                'quality': int, 'compression': int, 'in_flight': int
+            }
+        )),
+        default=(_default:=(
+            (None, '.mp4'),
+            {
+                'overwrite': False, 'fps': 30,
+                'draw_lm': True, 'draw_conn': True, 'mask_face': True,
+                'encoder': 'auto', 'codec': 'libx264', 'preset': 'veryfast', 'crf': 23, 'threads': 0,
+                'quality': 95, 'compression': 1, 'in_flight': 0
+            }
+        )),
+        action=NArgsAction, nargs='*',
+        help=textwrap.dedent(f'''
+            {HELP['apps.render.args:annotated_options_title']}
+            --annotated dst [ext] [optkey=optvalue]
+            positions:
+                    dst         {HELP['apps.render.args:annotated_options_dst'].format(
+                        type=_type[0][0], default=_default[0][0])}
+                    ext         {HELP['apps.render.args:annotated_options_ext'].format(
+                        type=_type[0][1], default=_default[0][1])}
+            options:
+                    overwrite   {HELP['apps.render.args:annotated_options_overwirte'].format(
+                        type=_type[1]['overwrite'], default=_default[1]['overwrite'])}
+                    fps         {HELP['apps.render.args:annotated_options_fps'].format(
+                        type=_type[1]['fps'], default=_default[1]['fps'])}
+                    draw_lm     {HELP['apps.render.args:annotated_options_draw_lm'].format(
+                        type=_type[1]['draw_lm'], default=_default[1]['draw_lm'])}
+                    draw_conn   {HELP['apps.render.args:annotated_options_draw_conn'].format(
+                        type=_type[1]['draw_conn'], default=_default[1]['draw_conn'])}
+                    mask_face   {HELP['apps.render.args:annotated_options_mask_face'].format(
+                        type=_type[1]['mask_face'], default=_default[1]['mask_face'])}
+                    encoder     {HELP['apps.render.args:annotated_options_encoder'].format(
+                        type=_type[1]['encoder'], default=_default[1]['encoder'])}
+                    codec       {HELP['apps.render.args:annotated_options_codec'].format(
+                        type=_type[1]['codec'], default=_default[1]['codec'])}
+                    preset      {HELP['apps.render.args:annotated_options_preset'].format(
+                        type=_type[1]['preset'], default=_default[1]['preset'])}
+                    crf         {HELP['apps.render.args:annotated_options_crf'].format(
+                        type=_type[1]['crf'], default=_default[1]['crf'])}
+                    threads     {HELP['apps.render.args:annotated_options_threads'].format(
+                        type=_type[1]['threads'], default=_default[1]['threads'])}
+                    quality     {HELP['apps.render.args:annotated_options_quality'].format(
+                        type=_type[1]['quality'], default=_default[1]['quality'])}
+                    compression {HELP['apps.render.args:annotated_options_compression'].format(
+                        type=_type[1]['compression'], default=_default[1]['compression'])}
+                    in_flight   {HELP['apps.render.args:annotated_options_in_flight'].format(
+                        type=_type[1]['in_flight'], default=_default[1]['in_flight'])}
+        ''').strip()
+    )
+    'アノテーション出力ディレクトリ'
+    cpu: int | None = parser.add_argument(
+        '--cpu', '-p', type=int, default=None,
+        help=HELP['apps.render.args:cpu']
+    )
+    threads: int = parser.add_argument(
+        '--threads', type=int, default=0,
+        help=HELP['apps.render.args:threads']
+    )
+    'ワーカあたりのスレッド数'
+    pin: bool = parser.add_argument(
+        '--pin', action=argparse._StoreTrueAction,
+        help=HELP['apps.render.args:pin']
+    )
+    'ワーカをコアに固定する'
+    add_ext: list[str] = parser.add_argument(
+        '--add-ext', type=str, action=argparse._AppendAction,
+        help=HELP['apps.render.args:add_ext'], default=list()
+    )
+    '入力動画ファイルの追加の拡張子'
+    config: list[tuple[str, str]] = parser.add_argument(
+        '--config', '-c', action=argparse._AppendAction,
+        type=runarg_config_type,
+        help=HELP['apps.render.args:config'], default=list()
+    )
+    '追加の設定'
@@ -0,0 +1,40 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+HELP = {
+    'apps.render.args:src': '描画する動画ファイルまたは連続画像ディレクトリ (mpdriver run の src と同じ)',
+    'apps.render.args:raw': 'mpdriver run -l dst ext raw=true の出力ディレクトリ (dst)．pack も指定できます',
+    'apps.render.args:annotated_options_title': 'アノテーション出力',
+    'apps.render.args:annotated_options_dst': 'アノテーション出力ディレクトリ',
+    'apps.render.args:annotated_options_ext': 'アノテーション出力の拡張子',
+    'apps.render.args:annotated_options_overwirte': '上書きする ({default})',
+    'apps.render.args:annotated_options_fps': '出力のフレームレート ({default})',
+    'apps.render.args:annotated_options_draw_lm': 'ランドマークの描画 ({default})',
+    'apps.render.args:annotated_options_draw_conn': 'ボーンの表示 ({default})',
+    'apps.render.args:annotated_options_mask_face': '顔のマスキング ({default})',
+    'apps.render.args:annotated_options_encoder': '動画のエンコーダ auto, ffmpeg, cv2．auto は ffmpeg があれば ffmpeg を使う ({default})',
+    'apps.render.args:annotated_options_codec': 'ffmpeg のビデオコーデック ({default})',
+    'apps.render.args:annotated_options_preset': 'ffmpeg のエンコーダのプリセット ({default})',
+    'apps.render.args:annotated_options_crf': 'ffmpeg の CRF．-1 なら指定しない ({default})',
+    'apps.render.args:annotated_options_threads': 'ffmpeg のエンコーダ，または連番画像の符号化のスレッド数．0 なら自動 ({default})',
+    'apps.render.args:annotated_options_quality': '連番画像 (JPEG, WebP) の品質 ({default})',
+    'apps.render.args:annotated_options_compression': '連番画像 (PNG) の圧縮レベル 0 ~ 9 ({default})',
+    'apps.render.args:annotated_options_in_flight': '同時に符号化中の連番画像の上限．0 ならスレッド数の2倍 ({default})',
+    'apps.render.args:cpu': 'マルチプロセスの数を設定する．指定しない場合は使えるコア数 (cgroup のクォータを含む) から決め，0 ならシングルプロセスで動作します (以前の既定のシングルプロセスは 0)',
+    'apps.render.args:threads': 'ワーカあたりの OpenCV，BLAS，デコーダのスレッド数．0 ならコア数をワーカで等分する (%(default)s)',
+    'apps.render.args:pin': 'ワーカを重ならないコアの組に固定する',
+    'apps.render.args:add_ext': '入力動画ファイルの追加の拡張子．',
+    'apps.render.args:config': '追加の設定．[confkey]=[confvalue]で設定ファイルの内容を上書きできます',
+}
@@ -0,0 +1,217 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+保存済みの raw ランドマークから描画だけを行うアプリ
+
+`mpdriver run -l dst ext raw=true` が書き出した正規化前のランドマーク (`*.raw.npy`，または pack の `<key>.raw`) を読み込み，
+推論せずに動画へ描画します．描画の設定を変えて作り直すときにモデルを読み込む必要はありません．
+"""
+
+from pathlib import Path
+from typing import *
+import mimetypes
+import unicodedata
+
+import numpy as np
+
+from ...utils import is_video, video_or_imgdir_pathes
+from ...utils.pack import load_pack_index, read_pack_clip
+from ...core.main_base import AppWorkerThread, AppExecutor, PROGRESS_DESC_PREFIX
+from ...core.progress import TqdmKwargs
+from ...core.threads import resolve_workers
+
+from ..run.main import RunApp, RAW_SUFFIX, raw_key, open_source, annotated_fourcc
+
+from .args import RenderArgs
+
+class RenderApp(RunApp):
+
+    def __init__(self, config: list[tuple[str, str]] = []):
+        # 推論しないのでモデルは読み込まない
+        super().__init__(config, load_model=False)
+
+    def run(
+        self,
+        src: Path,
+        raw: Path,
+        annotated: Path,
+        fps: float = 30,
+        f_draw_lm: bool = True,
+        f_draw_conn: bool = True,
+        f_mask_face: bool = False,
+        encoder: str = "auto",
+        vcodec: str = "libx264",
+        preset: str | None = "veryfast",
+        crf: int | None = 23,
+        threads: int = 0,
+        image_quality: int = 95,
+        image_compression: int = 1,
+        image_in_flight: int = 0,
+        pack_key: str | None = None,
+        tqdm_kwds: TqdmKwargs = {},
+        src_str_len: int | None = None
+        ):
+        """
+        Annotates `src` with landmarks saved by `mpdriver run ... raw=true`, without running inference.
+
+        Args:
+                src (Path): The input source, either a video file or a directory containing images.
+                raw (Path): The `.raw.npy` file, or the pack directory if `pack_key` is given.
+                annotated (Path): The path to save the annotated output.
+                pack_key (str | None): If given, the raw landmarks are read from the clip under this key in the pack `raw`.
+                Other arguments are the same as `RunApp.run`.
+        """
+
+        str_src = src.as_posix()
+        tqdm_handler = AppWorkerThread.get_thread().tqdm_handler
+
+        if pack_key is None:
+            raw_landmarks = np.load(raw, mmap_mode='r')
+        else:
+            raw_landmarks = read_pack_clip(raw, load_pack_index(raw)[pack_key])
+
+        if (source := open_source(src, fps)) is None:
+            return
+        frame_iter, total, fps, size, _ = source
+
+        if len(raw_landmarks) != total:
+            tqdm_handler.write(f'WARNNING: {src} has {total} frames but {len(raw_landmarks)} raw landmarks')
+
+        write, release, abort = self.open_annotated_output(
+            annotated, fps, size, annotated_fourcc(annotated), total, encoder, vcodec, preset, crf, threads,
+            image_quality, image_compression, image_in_flight
+        )
+
+        # np.Mat, raw -> np.Mat
+        tasks = (
+            self.mp.annotate(f, self.mp.from_raw(row), f_draw_conn, f_draw_lm, f_mask_face)
+            for f, row in zip(frame_iter, raw_landmarks)
+        )
+
+        total_str_len = max(4, len(str(total)))
+        tasks = tqdm_handler.tqdm(tasks, **({
+            "total": min(total, len(raw_landmarks)), "desc": str_src,
+            "bar_format": (
+                f"{{desc:{70 if src_str_len is None else src_str_len}}} "
+                f"{{percentage:6.2f}}%|"
+                f"{{bar}}|"
+                f"{{n:{total_str_len}d}}/{{total:{total_str_len}d}}|"
+                f"{{rate_fmt}}{{postfix}}"
+            ),
+            "priority": 0,
+            "unit": "f"
+        } | tqdm_kwds)) # プログレスバー
+
+        try:
+            for ann in tasks:
+                write(ann)
+        except BaseException:
+            abort()
+            raise
+        del tasks
+        release()
+
+class RenderExecutor(AppExecutor[RenderApp]): # 子プロセス上の実行クラス
+    app_type = RenderApp # AppExecutor で使用するので，必ず app_type を設定
+
+def app_main(ns: RenderArgs): # アプリケーションのコマンドラインツール用エントリーポイント
+
+    if ns.annotated[0][0] is None:
+        print('WARNNING:', 'nothing to do without --annotated')
+        return
+
+    for ext in ns.add_ext:
+        if ext.startswith('.'):
+            ext = ext[1:]
+        mimetypes.add_type(f'video/{ext}', f'.{ext}')
+
+    # --raw が pack ディレクトリの場合はインデックスからクリップを探す
+    use_pack = (ns.raw / 'pack.json').exists()
+    pack_keys = set(load_pack_index(ns.raw)) if use_pack else set()
+
+    executor = RenderExecutor(resolve_workers(ns.cpu, ns.threads), (ns.config,), threads=ns.threads, pin=ns.pin)
+
+    def job(src: Path, src_related: Path) -> tuple[tuple[Path, Path, Path], dict[str, Any]] | None:
+
+        annotated = (ns.annotated[0][0] / src_related).with_suffix(ns.annotated[0][1])
+        if not ns.annotated[1]["overwrite"] and annotated.exists():
+            return None
+
+        pack_key = None
+        if use_pack:
+            raw, pack_key = ns.raw, raw_key(src_related.as_posix())
+            found = pack_key in pack_keys
+        else:
+            raw = (ns.raw / src_related).with_suffix(RAW_SUFFIX)
+            found = raw.exists()
+
+        if not found:
+            print('WARNNING:', f'skip {src} because raw landmarks are not found')
+            return None
+
+        return (
+            (src, raw, annotated),
+            {
+                'fps': ns.annotated[1]["fps"],
+                'f_draw_lm': ns.annotated[1]["draw_lm"],
+                'f_draw_conn': ns.annotated[1]["draw_conn"],
+                'f_mask_face': ns.annotated[1]["mask_face"],
+                'encoder': ns.annotated[1]["encoder"],
+                'vcodec': ns.annotated[1]["codec"],
+                'preset': ns.annotated[1]["preset"] or None,
+                'crf': None if ns.annotated[1]["crf"] < 0 else ns.annotated[1]["crf"],
+                'threads': ns.annotated[1]["threads"],
+                'image_quality': ns.annotated[1]["quality"],
+                'image_compression': ns.annotated[1]["compression"],
+                'image_in_flight': ns.annotated[1]["in_flight"],
+                'pack_key': pack_key,
+            }
+        )
+
+    def args_kwargs_iter() -> Iterator[tuple[tuple[Path, Path, Path], dict[str, Any]]]:
+
+        if is_video(ns.src): # src が単一ファイル
+            if (item := job(ns.src, Path(ns.src.name))) is not None:
+                yield item
+            return
+
+        for src in video_or_imgdir_pathes(ns.src): # src がディレクトリ
+            src_related = src.relative_to(ns.src)
+            if (item := job(ns.src / src_related, src_related)) is not None:
+                yield item
+
+    args_kwargs_list = list(executor._tqdm_func(
+        args_kwargs_iter(),
+        desc = f'\033[46m{PROGRESS_DESC_PREFIX.format("Searching...")}\033[0m',
+        priority=1
+    )) # ファイルを探索
+
+    # プログレスバーに表示する入力ファイルのパスの最大文字長を取得 -> 0埋め用
+    src_str_len = max(
+        (
+            sum(
+                2 if unicodedata.east_asian_width(c) in "FWA" else 1
+                for c in item[0][0].as_posix()
+            )
+            for item in args_kwargs_list
+        ),
+        default=None
+    )
+
+    for item in args_kwargs_list:
+        item[1]['src_str_len'] = src_str_len
+
+    # アプリケーションを実行
+    executor.execute(args_kwargs_list)
@@ -15,7 +15,7 @@
 from pathlib import Path
 from typing import TypedDict, Any
 
-from ...core.args_base import subparsers, get_help_action, textwrap, argparse, NArgsAction, AppArgs, HelpFormatter, Boolean
+from ...core.args_base import subparsers, get_help_action, textwrap, argparse, NArgsAction, NArgsAppendAction, AppArgs, HelpFormatter, Boolean
 from .help import HELP
 
 command = Path(__file__).parent.name
@@ -51,6 +51,15 @@ class RunArgs(AppArgs):
         draw_conn: bool
         mask_face: bool
         fourcc: str | None
+        encoder: str
+        codec: str
+        preset: str
+        crf: int
+        threads: int
+        stdout: str
+        quality: int
+        compression: int
+        in_flight: int
     annotated: tuple[tuple[Path | None, str], AnnotatedOptions] = parser.add_argument(
         '--annotated', '-a',
         type=(_type:=(
@@ -58,7 +67,9 @@ class RunArgs(AppArgs):
             {
                 'show': Boolean,'overwrite': Boolean, 'fps': float,
                 'draw_lm': Boolean, 'draw_conn': Boolean, 'mask_face': Boolean,
-                'fourcc': str
+                'fourcc': str,
+                'encoder': str, 'codec': str, 'preset': str, 'crf': int, 'threads': int,
+                'stdout': str, 'quality': int, 'compression': int, 'in_flight': int
             }
         )),
         default=(_default:=(
@@ -66,7 +77,9 @@ class RunArgs(AppArgs):
             {
                 'show': False, 'overwrite': False, 'fps': 30,
                 'draw_lm': True, 'draw_conn': True, 'mask_face': True,
-                'fourcc': None
+                'fourcc': None,
+                'encoder': 'auto', 'codec': 'libx264', 'preset': 'veryfast', 'crf': 23, 'threads': 0,
+                'stdout': '', 'quality': 95, 'compression': 1, 'in_flight': 0
             }
         )),
         action=NArgsAction, nargs='*',
@@ -93,30 +106,129 @@ class RunArgs(AppArgs):
                         type=_type[1]['mask_face'], default=_default[1]['mask_face'])}
                     fourcc      {HELP['apps.run.args.annotated_options_fourcc'].format(
                         type=_type[1]['fourcc'], default=_default[1]['fourcc'])}
+                    encoder     {HELP['apps.run.args:annotated_options_encoder'].format(
+                        type=_type[1]['encoder'], default=_default[1]['encoder'])}
+                    codec       {HELP['apps.run.args:annotated_options_codec'].format(
+                        type=_type[1]['codec'], default=_default[1]['codec'])}
+                    preset      {HELP['apps.run.args:annotated_options_preset'].format(
+                        type=_type[1]['preset'], default=_default[1]['preset'])}
+                    crf         {HELP['apps.run.args:annotated_options_crf'].format(
+                        type=_type[1]['crf'], default=_default[1]['crf'])}
+                    threads     {HELP['apps.run.args:annotated_options_threads'].format(
+                        type=_type[1]['threads'], default=_default[1]['threads'])}
+                    stdout      {HELP['apps.run.args:annotated_options_stdout'].format(
+                        type=_type[1]['stdout'], default=_default[1]['stdout'])}
+                    quality     {HELP['apps.run.args:annotated_options_quality'].format(
+                        type=_type[1]['quality'], default=_default[1]['quality'])}
+                    compression {HELP['apps.run.args:annotated_options_compression'].format(
+                        type=_type[1]['compression'], default=_default[1]['compression'])}
+                    in_flight   {HELP['apps.run.args:annotated_options_in_flight'].format(
+                        type=_type[1]['in_flight'], default=_default[1]['in_flight'])}
                     
         ''').strip()
     )
     'アノテーション出力ディレクトリ'
+    class RenditionOptions(TypedDict):
+        overwrite: bool
+        size: str
+        fps: float
+        draw_lm: bool
+        draw_conn: bool
+        mask_face: bool
+        encoder: str
+        codec: str
+        preset: str
+        crf: int
+        threads: int
+        quality: int
+        compression: int
+        in_flight: int
+    rendition: list[tuple[tuple[Path, str], RenditionOptions]] = parser.add_argument(
+        '--rendition', '-A',
+        type=(_type:=(
+            (PathResoolved, None),
+            {
+                'overwrite': Boolean, 'size': str, 'fps': float,
+                'draw_lm': Boolean, 'draw_conn': Boolean, 'mask_face': Boolean,
+                'encoder': str, 'codec': str, 'preset': str, 'crf': int, 'threads': int,
+                'quality': int, 'compression': int, 'in_flight': int
+            }
+        )),
+        default=(_default:=(
+            (None, '.mp4'),
+            {
+                'overwrite': False, 'size': '', 'fps': 0,
+                'draw_lm': True, 'draw_conn': True, 'mask_face': True,
+                'encoder': 'auto', 'codec': 'libx264', 'preset': 'veryfast', 'crf': 23, 'threads': 0,
+                'quality': 95, 'compression': 1, 'in_flight': 0
+            }
+        )),
+        action=NArgsAppendAction, nargs='*',
+        help=textwrap.dedent(f'''
+            {HELP['apps.run.args:rendition_options_title']}
+            --rendition dst [ext] [optkey=optvalue]
+            positions:
+                    dst         {HELP['apps.run.args:annotated_options_dst'].format(
+                        type=_type[0][0], default=_default[0][0])}
+                    ext         {HELP['apps.run.args:annotated_options_ext'].format(
+                        type=_type[0][1], default=_default[0][1])}
+            options:
+                    overwrite   {HELP['apps.run.args:annotated_options_overwirte'].format(
+                        type=_type[1]['overwrite'], default=_default[1]['overwrite'])}
+                    size        {HELP['apps.run.args:rendition_options_size'].format(
+                        type=_type[1]['size'], default=_default[1]['size'])}
+                    fps         {HELP['apps.run.args:rendition_options_fps'].format(
+                        type=_type[1]['fps'], default=_default[1]['fps'])}
+                    draw_lm, draw_conn, mask_face, encoder, codec, preset, crf,
+                    threads, quality, compression, in_flight
+                                {HELP['apps.run.args:rendition_options_others']}
+        ''').strip()
+    )
+    '描画の追加出力 (複数指定できる)'
     class LandmarksOptions(TypedDict):
         overwrite: bool
         normalize: bool
         clip: bool
         flat: bool
         header: bool
+        sparse: bool
+        mirror: bool
+        raw: bool
+        shard_mb: int
+        precision: int
+        row_group: int
+        compress: bool
+        codec: str
+        level: int
+        chunk: int
+        delta: bool
+        step: float
+        fsync: bool
+        meta: bool
     landmarks: tuple[tuple[Path | None, str], LandmarksOptions] = parser.add_argument(
         '--landmarks', '-l', action=NArgsAction, nargs='*',
         type=(_type:=(
             (PathResoolved, None),
             {
                 'overwrite': Boolean, 'normalize': Boolean,
-                'clip': Boolean, 'flat': Boolean, 'header': Boolean
+                'clip': Boolean, 'flat': Boolean, 'header': Boolean,
+                'sparse': Boolean, 'mirror': Boolean, 'raw': Boolean, 'shard_mb': int,
+                'precision': int, 'row_group': int,
+                'compress': Boolean, 'codec': str, 'level': int, 'chunk': int,
+                'delta': Boolean, 'step': float, 'fsync': Boolean,
+                'meta': Boolean
             }
         )),
         default=(_default:=(
             (None, '.csv'),
             {
                 'overwrite': False, 'normalize': True,
-                'clip': True, 'flat': True, 'header': False
+                'clip': True, 'flat': True, 'header': False,
+                'sparse': False, 'mirror': False, 'raw': False, 'shard_mb': 2048,
+                'precision': 0, 'row_group': 0,
+                'compress': False, 'codec': 'zlib', 'level': -1, 'chunk': 256,
+                'delta': False, 'step': 1e-4, 'fsync': False,
+                'meta': False
             }
         )),
         help=textwrap.dedent(f'''
@@ -140,6 +252,34 @@ class RunArgs(AppArgs):
                         type=_type[1]['header'], default=_default[1]['header'])}
                                 {HELP['apps.run.args:landmarks_options_header_1'].format(
                                     type=_type[1]['header'], default=_default[1]['header'])}
+                    sparse      {HELP['apps.run.args:landmarks_options_sparse'].format(
+                        type=_type[1]['sparse'], default=_default[1]['sparse'])}
+                    mirror      {HELP['apps.run.args:landmarks_options_mirror'].format(
+                        type=_type[1]['mirror'], default=_default[1]['mirror'])}
+                    raw         {HELP['apps.run.args:landmarks_options_raw'].format(
+                        type=_type[1]['raw'], default=_default[1]['raw'])}
+                    shard_mb    {HELP['apps.run.args:landmarks_options_shard_mb'].format(
+                        type=_type[1]['shard_mb'], default=_default[1]['shard_mb'])}
+                    precision   {HELP['apps.run.args:landmarks_options_precision'].format(
+                        type=_type[1]['precision'], default=_default[1]['precision'])}
+                    row_group   {HELP['apps.run.args:landmarks_options_row_group'].format(
+                        type=_type[1]['row_group'], default=_default[1]['row_group'])}
+                    compress    {HELP['apps.run.args:landmarks_options_compress'].format(
+                        type=_type[1]['compress'], default=_default[1]['compress'])}
+                    codec       {HELP['apps.run.args:landmarks_options_codec'].format(
+                        type=_type[1]['codec'], default=_default[1]['codec'])}
+                    level       {HELP['apps.run.args:landmarks_options_level'].format(
+                        type=_type[1]['level'], default=_default[1]['level'])}
+                    chunk       {HELP['apps.run.args:landmarks_options_chunk'].format(
+                        type=_type[1]['chunk'], default=_default[1]['chunk'])}
+                    delta       {HELP['apps.run.args:landmarks_options_delta'].format(
+                        type=_type[1]['delta'], default=_default[1]['delta'])}
+                    step        {HELP['apps.run.args:landmarks_options_step'].format(
+                        type=_type[1]['step'], default=_default[1]['step'])}
+                    fsync       {HELP['apps.run.args:landmarks_options_fsync'].format(
+                        type=_type[1]['fsync'], default=_default[1]['fsync'])}
+                    meta        {HELP['apps.run.args:landmarks_options_meta'].format(
+                        type=_type[1]['meta'], default=_default[1]['meta'])}
         ''').strip()
     )
     'ランドマーク出力ディレクトリ'
@@ -147,6 +287,76 @@ class RunArgs(AppArgs):
         '--cpu', '-p', type=int, default=None,
         help=HELP['apps.run.args:cpu']
     )
+    threads: int = parser.add_argument(
+        '--threads', type=int, default=0,
+        help=HELP['apps.run.args:threads']
+    )
+    'ワーカあたりのスレッド数'
+    pin: bool = parser.add_argument(
+        '--pin', action=argparse._StoreTrueAction,
+        help=HELP['apps.run.args:pin']
+    )
+    'ワーカをコアに固定する'
+    max_tasks: int = parser.add_argument(
+        '--max-tasks', type=int, default=0,
+        help=HELP['apps.run.args:max_tasks']
+    )
+    'ワーカを入れ替えるまでのジョブ数'
+    memory_budget: int = parser.add_argument(
+        '--memory-budget', type=int, default=0,
+        help=HELP['apps.run.args:memory_budget']
+    )
+    '同時に実行するジョブの推定メモリの上限 [MiB]'
+    retries: int = parser.add_argument(
+        '--retries', type=int, default=0,
+        help=HELP['apps.run.args:retries']
+    )
+    '失敗したジョブを再実行する回数'
+    timeout: float = parser.add_argument(
+        '--timeout', type=float, default=0,
+        help=HELP['apps.run.args:timeout']
+    )
+    'ジョブの制限時間 [s]'
+    failure_report: Path | None = parser.add_argument(
+        '--failure-report', type=Path, default=None,
+        help=HELP['apps.run.args:failure_report']
+    )
+    '失敗したジョブの一覧 (JSON) の出力先'
+    ledger: Path | None = parser.add_argument(
+        '--ledger', type=Path, default=None,
+        help=HELP['apps.run.args:ledger']
+    )
+    'ジョブの台帳 (SQLite)'
+    hash_content: bool = parser.add_argument(
+        '--hash-content', action=argparse._StoreTrueAction,
+        help=HELP['apps.run.args:hash_content']
+    )
+    '台帳で入力の内容のハッシュも比較する'
+    raw_cache: Path | None = parser.add_argument(
+        '--raw-cache', type=PathResoolved, default=None,
+        help=HELP['apps.run.args:raw_cache']
+    )
+    '推論結果のキャッシュのディレクトリ'
+    serve_jobs: str | None = parser.add_argument(
+        '--serve-jobs', type=str, default=None, metavar='HOST:PORT',
+        help=HELP['apps.run.args:serve_jobs']
+    )
+    'ジョブを公開するアドレス'
+    lease: float = parser.add_argument(
+        '--lease', type=float, default=60,
+        help=HELP['apps.run.args:lease']
+    )
+    'ワーカに貸し出したジョブの期限 [s]'
+    authkey: str | None = parser.add_argument(
+        '--authkey', type=str, default=None,
+        help=HELP['apps.run.args:authkey']
+    )
+    'コーディネータとワーカの認証キー'
+    schedule: str = parser.add_argument(
+        '--schedule', type=str, default='longest', choices=['longest', 'walk'],
+        help=HELP['apps.run.args:schedule']
+    )
+    'ジョブの投入順'
     add_ext: list[str] = parser.add_argument(
         '--add-ext', type=str, action=argparse._AppendAction,
         help=HELP['apps.run.args:add_ext'], default=list()
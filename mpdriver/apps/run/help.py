@@ -24,16 +24,57 @@ HELP = {
     'apps.run.args:annotated_options_draw_conn': 'ボーンの表示 ({default})',
     'apps.run.args.annotated_options_fourcc': 'FOURCC文字列 ({default})',
     'apps.run.args:annotated_options_mask_face': '顔のマスキング ({default})',
+    'apps.run.args:annotated_options_encoder': '動画のエンコーダ auto, ffmpeg, cv2．auto は ffmpeg があれば ffmpeg を使う ({default})',
+    'apps.run.args:annotated_options_codec': 'ffmpeg のビデオコーデック ({default})',
+    'apps.run.args:annotated_options_preset': 'ffmpeg のエンコーダのプリセット ({default})',
+    'apps.run.args:annotated_options_crf': 'ffmpeg の CRF．-1 なら指定しない ({default})',
+    'apps.run.args:annotated_options_threads': 'ffmpeg のエンコーダ，または連番画像の符号化のスレッド数．0 なら自動 ({default})',
+    'apps.run.args:annotated_options_quality': '連番画像 (JPEG, WebP) の品質 ({default})',
+    'apps.run.args:annotated_options_compression': '連番画像 (PNG) の圧縮レベル 0 ~ 9 ({default})',
+    'apps.run.args:annotated_options_in_flight': '同時に符号化中の連番画像の上限．0 ならスレッド数の2倍 ({default})',
+    'apps.run.args:annotated_options_stdout': 'y4m または raw を指定すると，描画を標準出力へ書き出す ({default})',
+    'apps.run.args:rendition_options_title': '描画の追加出力．1回の推論から，解像度やフレームレートの異なる描画を書き出します (複数指定できる)',
+    'apps.run.args:rendition_options_size': '解像度．倍率 (0.5) または 幅x高さ (640x-1 は縦横比を保つ)．空なら入力と同じ ({default})',
+    'apps.run.args:rendition_options_fps': 'フレームレート．入力より低い場合はフレームを間引く．0 なら入力と同じ ({default})',
+    'apps.run.args:rendition_options_others': '--annotated と同じ',
     'apps.run.args:landmarks_options_title': 'ランドマーク出力',
     'apps.run.args:landmarks_options_dst': 'アノテーション出力ディレクトリ',
-    'apps.run.args:landmarks_options_ext': 'ランドマーク出力の拡張子',
+    'apps.run.args:landmarks_options_ext': 'ランドマーク出力の拡張子 (.csv, .npy, .npz, .lmz)．pack を指定すると dst に全てのクリップをまとめて追記します',
     'apps.run.args:landmarks_options_overwrite': '上書きする ({default})',
     'apps.run.args:landmarks_options_normalize': '正規化する ({default})',
     'apps.run.args:landmarks_options_clip': '値を -1 ~ 1 の範囲にする ({default})',
     'apps.run.args:landmarks_options_header_0': '.csvのヘッダをつける ({default})',
     'apps.run.args:landmarks_options_header_1': 'ヘッダー行を表す # が先頭に付加されます',
+    'apps.run.args:landmarks_options_sparse': '.npzで未検出のターゲットを省略した疎な形式で出力する ({default})',
+    'apps.run.args:landmarks_options_mirror': '左右反転したランドマークを *.mirror.<ext> に出力する ({default})',
+    'apps.run.args:landmarks_options_raw': '正規化前の全ランドマークを *.raw.npy に出力する (mpdriver render で使用) ({default})',
+    'apps.run.args:landmarks_options_shard_mb': 'pack のシャードを切り替えるサイズ [MiB] ({default})',
+    'apps.run.args:landmarks_options_precision': '.csvに出力する有効桁数．0 なら値を失わない桁数 ({default})',
+    'apps.run.args:landmarks_options_row_group': '.csvの行グループの行数．0 以外なら *.csv.rowgroups.npy に境界を出力する ({default})',
+    'apps.run.args:landmarks_options_compress': '.npzを圧縮して出力する ({default})',
+    'apps.run.args:landmarks_options_codec': '.lmzの圧縮方式 zlib, lzma, zstd ({default})',
+    'apps.run.args:landmarks_options_level': '.lmzの圧縮レベル．-1 なら圧縮方式の既定値 ({default})',
+    'apps.run.args:landmarks_options_chunk': '.lmzで1つのチャンクにまとめて圧縮するフレーム数 ({default})',
+    'apps.run.args:landmarks_options_delta': '.lmzで量子化した時間方向の差分を圧縮する (非可逆) ({default})',
+    'apps.run.args:landmarks_options_step': 'delta の量子化の刻み幅 ({default})',
+    'apps.run.args:landmarks_options_fsync': '出力を確定する前にディスクへ同期する ({default})',
+    'apps.run.args:landmarks_options_meta': '検出率などのメタデータ (<name>.meta.json) と summary.json を書き出す．出力のディレクトリの構成を変えないよう既定では書き出さない ({default})',
     'apps.run.args:landmarks_options_flat': 'フラットな形式で出力する ({default})',
-    'apps.run.args:cpu': 'マルチプロセスの数を設定する．指定しない場合はシングルプロセスで動作します',
+    'apps.run.args:cpu': 'マルチプロセスの数を設定する．指定しない場合は使えるコア数 (cgroup のクォータを含む) から決め，0 ならシングルプロセスで動作します (以前の既定のシングルプロセスは 0)',
+    'apps.run.args:threads': 'ワーカあたりの OpenCV，BLAS，デコーダのスレッド数．0 ならコア数をワーカで等分する (%(default)s)',
+    'apps.run.args:pin': 'ワーカを重ならないコアの組に固定する',
+    'apps.run.args:max_tasks': 'ワーカがこの数のジョブを実行したら新しいプロセスに入れ替える．0 なら入れ替えない (%(default)s)',
+    'apps.run.args:memory_budget': '同時に実行するジョブの推定メモリの合計の上限 [MiB]．0 なら制限しない (%(default)s)',
+    'apps.run.args:retries': '失敗したジョブを再実行する回数．待ち時間は1秒から倍になる (%(default)s)',
+    'apps.run.args:timeout': 'ジョブの制限時間 [s]．超えたジョブは強制終了して失敗とする．0 なら制限しない (%(default)s)',
+    'apps.run.args:failure_report': '失敗したジョブの一覧を JSON で書き出すパス (%(default)s)',
+    'apps.run.args:ledger': 'ジョブの台帳 (SQLite) のパス．出力の有無の代わりに，完了して入力，設定，出力が記録と一致するジョブを飛ばす (%(default)s)',
+    'apps.run.args:hash_content': '台帳で，サイズか更新時刻が変わった入力を内容のハッシュで比較する',
+    'apps.run.args:raw_cache': '推論結果 (正規化前の全ランドマーク) を入力の内容と holistic の設定毎にキャッシュするディレクトリ．mpdriver export で推論せずに出力を作り直せる (%(default)s)',
+    'apps.run.args:serve_jobs': 'このプロセスでは推論せず，ジョブを HOST:PORT (HOST を省略すると localhost だけで待ち受ける，PORT が 0 なら空いているポート) で mpdriver worker へ分配する (%(default)s)',
+    'apps.run.args:lease': '--serve-jobs: ワーカに貸し出したジョブの期限 [s]．ワーカは期限の 1/3 毎に延長し，延長されなかったジョブは他のワーカへ貸し出す (%(default)s)',
+    'apps.run.args:authkey': '--serve-jobs: ワーカとの認証キー．指定しない場合は環境変数 MPDRIVER_AUTHKEY，それもなければ乱数で作って表示する',
+    'apps.run.args:schedule': 'マルチプロセスでのジョブの投入順．longest はフレーム数 × 画素数の大きい順，walk は探索順 (%(default)s)',
     'apps.run.args:add_ext': '入力動画ファイルの追加の拡張子．',
     'apps.run.args:template': 'テンプレートファイルのパス',
     'apps.run.args:config': '追加の設定．[confkey]=[confvalue]で設定ファイルの内容を上書きできます',
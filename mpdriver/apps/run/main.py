@@ -13,54 +13,352 @@
 # limitations under the License.
 
 import os
-import shutil
+import sys
 from pathlib import Path
 from itertools import *
 from typing import *
+from threading import Event
 import json
-import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 import mimetypes
 import unicodedata
-from multiprocessing.synchronize import RLock
 
 import numpy as np
 import cv2
 
 from ...utils import FOURCC, VideoCapture, VideoWriter, VideoWriter_fourcc
+from ...utils import FFmpegWriter, FFMPEG_STDOUT, ffmpeg_available, ImageSequenceWriter
 from ...utils import is_image, is_video, cap_to_frame_iter, video_or_imgdir_pathes
-from ...core.config import decompose_keys
-from ...core.main_base import AppBase, AppWorkerThread, AppExecutor, PROGRESS_DESC_PREFIX
-from ...core.progress import TqdmKwargs
-
-from ...engine.mediapipe import MP, mediapipe_config
+from ...utils import LandmarkWriter, CsvWriter, NpzWriter, LmzWriter, ArrayWriter, open_writer
+from ...utils.pack import PackWriter, PACK_SUFFIX, DEFAULT_SHARD_SIZE, load_pack_index, clip_spool_path
+from ...utils.lmz import DEFAULT_CHUNK_FRAMES
+from ...utils.raw_cache import raw_cache_path, write_raw_cache_info
+from ...utils.atomic import temp_path, makedirs, atomic_replace, atomic_open, remove_temp_files
+from ...utils.meta import (
+    META_LAYOUT_VERSION, RunMetadata, StageTimer, DetectionStats,
+    engine_versions, source_info, metadata_path, write_metadata, update_summary
+)
+from ...core.config import decompose_keys, config_hash
+from ...core.ledger import JobLedger, InputIdentity, LedgerOutput, input_identity, content_hash, file_output, pack_output
+from ...core.main_base import AppBase, AppWorkerThread, AppExecutor, JobFailure, PROGRESS_DESC_PREFIX, cancellable
+from ...core.progress import TqdmKwargs, TqdmSingle
+from ...core.schedule import longest_first
+from ...core.distributed import JobBoard, serve_jobs, parse_address, resolve_authkey
+from ...core.threads import resolve_workers
+
+from ...engine.mediapipe import MP, RAW_TARGET_SIZES, mediapipe_config
 
 from .args import RunArgs
 
 os.environ['GRPC_VERBOSITY'] = 'ERROR'
 os.environ['GLOG_minloglevel'] = '2'
 
+RAW_SUFFIX = '.raw.npy'
+
+def mirrored_path(landmarks: Path) -> Path:
+    """左右反転したランドマークの出力先 (e.g. video.csv -> video.mirror.csv)"""
+    return landmarks.with_name(f'{landmarks.stem}.mirror{landmarks.suffix}')
+
+def raw_path(landmarks: Path) -> Path:
+    """正規化前の全ランドマークの出力先 (e.g. video.csv -> video.raw.npy)"""
+    return landmarks.with_name(f'{landmarks.stem}{RAW_SUFFIX}')
+
+def raw_key(pack_key: str) -> str:
+    return f'{pack_key}.raw'
+
+def annotated_fourcc(annotated: Path | None) -> int:
+    """描画の出力先の拡張子に対応する FOURCC"""
+
+    fourcc = VideoWriter_fourcc(*'h264')
+    if annotated is not None:
+        if annotated.suffix in FOURCC:
+            fourcc = VideoWriter_fourcc(*FOURCC[annotated.suffix])
+        elif not is_image(annotated.name): # 連続画像は FOURCC を使わない
+            print('WARNNING:', f'annotated .ext \'{annotated.suffix}\' is invalid. use \'.mp4\'', file=sys.stderr)
+    return fourcc
+
+class Source(NamedTuple):
+    frames: Iterator[cv2.Mat]
+    total: int
+    fps: float
+    size: tuple[int, int]
+    fourcc: int
+    "入力動画の FOURCC (連続画像は 0)"
+
+def open_source(src: Path, fps: float = 30) -> Source | None:
+    """動画，または連続画像のディレクトリを開きます．画像がない場合は None"""
+
+    # if is_video(src):
+    if src.is_file():
+
+        cap = VideoCapture(src.as_posix())
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        return Source(
+            cap_to_frame_iter(cap, end=total), total,
+            float(cap.get(cv2.CAP_PROP_FPS)),
+            (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))),
+            int(cap.get(cv2.CAP_PROP_FOURCC))
+        )
+
+    # elif is_frame_sequence(src):
+    img_pathes = list(p for p in src.iterdir() if is_image(p))
+    img_iter = (cv2.imread(f.as_posix(), cv2.IMREAD_COLOR) for f in img_pathes)
+    if (f0 := next(img_iter, None)) is None:
+        return None
+    return Source(chain((f0,), img_iter), len(img_pathes), fps, (f0.shape[1], f0.shape[0]), 0)
+
+# ジョブのメモリの推定に使う値
+JOB_MEMORY_BASE = 64 << 20
+"デコーダ，エンコーダなどの，解像度によらない分 [byte]"
+RAW_ROW_BYTES = sum(RAW_TARGET_SIZES.values()) * 4 * 4
+"メモリ上に保持するランドマークの1フレームの上限 [byte]"
+
+class Probe(NamedTuple):
+    frames: int
+    width: int
+    height: int
+
+def probe_source(src: Path) -> Probe:
+    """入力のフレーム数と解像度．動画はヘッダだけを読みます (読めない場合は 0)"""
+
+    if src.is_file():
+        cap = VideoCapture(src.as_posix())
+        try:
+            return Probe(
+                max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0),
+                int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            )
+        finally:
+            cap.release()
+
+    img_pathes = [p for p in src.iterdir() if is_image(p)]
+    if not img_pathes:
+        return Probe(0, 0, 0)
+    if (f0 := cv2.imread(img_pathes[0].as_posix(), cv2.IMREAD_REDUCED_GRAYSCALE_8)) is None:
+        return Probe(0, 0, 0)
+    return Probe(len(img_pathes), f0.shape[1] * 8, f0.shape[0] * 8)
+
+def estimate_cost(probe: Probe) -> float:
+    """ジョブの実行時間の見積もり (フレーム数 × 画素数)"""
+    return float(probe.frames * probe.width * probe.height)
+
+def estimate_footprint(probe: Probe, kwargs: Mapping[str, Any]) -> float:
+    """
+    ジョブのメモリの推定 [byte] (`RunApp.run` の引数から)
+
+    同時に存在するフレーム (デコード，推論用の RGB，描画，符号化待ちの連続画像) と，
+    メモリ上に保持するランドマークの合計です．ワーカ自体 (MediaPipe のモデル) の分は含みません．
+    """
+
+    frame = probe.width * probe.height * 3
+    frames_alive = 3
+    outputs = [kwargs] if kwargs.get('annotated') is not None or kwargs.get('annotated_stdout') else []
+    outputs += [r._asdict() for r in kwargs.get('renditions', ())]
+    for output in outputs:
+        frames_alive += 2 + (output.get('image_in_flight') or 8)
+    if kwargs.get('show_annotated'):
+        frames_alive += 1
+
+    landmarks = probe.frames * RAW_ROW_BYTES * (1 + bool(kwargs.get('f_mirror')) + bool(kwargs.get('f_raw')))
+    in_memory_landmarks = landmarks if kwargs.get('return_landmarks') else 0
+
+    return JOB_MEMORY_BASE + frame * frames_alive + in_memory_landmarks
+
+class Rendition(NamedTuple):
+    """1回の推論から追加で書き出す描画 (`--rendition`)"""
+    annotated: Path
+    size: str = ''
+    "`rendition_size` の指定"
+    fps: float = 0
+    "0 (または入力以上) なら入力と同じ"
+    f_draw_lm: bool = True
+    f_draw_conn: bool = True
+    f_mask_face: bool = False
+    encoder: str = "auto"
+    vcodec: str = "libx264"
+    preset: str | None = "veryfast"
+    crf: int | None = 23
+    threads: int = 0
+    image_quality: int = 95
+    image_compression: int = 1
+    image_in_flight: int = 0
+
+def rendition_size(size: tuple[int, int], spec: str) -> tuple[int, int]:
+    """
+    描画の追加出力の解像度
+
+    '' は入力と同じ，'0.5' は倍率，'640x360' は幅と高さで，片方を -1 にすると縦横比を保ちます．
+    動画の符号化のため，入力と異なる場合は偶数に丸めます．
+    """
+
+    if not spec:
+        return size
+
+    width, height = size
+    if 'x' not in spec:
+        scale = float(spec)
+        w, h = width * scale, height * scale
+    else:
+        w, h = (float(v) for v in spec.split('x'))
+        if w < 0: w = width * h / height
+        if h < 0: h = height * w / width
+
+    return max(2, round(w / 2) * 2), max(2, round(h / 2) * 2)
+
+def mirrored_key(pack_key: str) -> str:
+    """左右反転したランドマークの pack 内のキー"""
+    return f'{pack_key}.mirror'
+
+def apply_config(config: Iterable[tuple[str, str]]):
+    """追加の設定 (--config) を mediapipe の設定 (モジュール変数) に反映します"""
+
+    for ck, cv in config:
+        cfile, *keys = ck.split('.')
+        if cfile != 'mediapipe':
+            continue
+        obj_prev, obj_temp, k = decompose_keys(mediapipe_config, keys)
+        obj_prev[k] = json.loads(cv)
+
+def holistic_hash() -> str:
+    """推論結果のキャッシュのキー (holistic の設定のハッシュ)．`apply_config` の後に呼び出す"""
+    return config_hash(mediapipe_config['holistic'])
+
 class RunApp(AppBase):
 
     def __init__(
         self,
-        config: list[tuple[str, str]] = []
+        config: list[tuple[str, str]] = [],
+        load_model: bool = True
         ):
 
         # Apply additional configuration
-        for ck, cv in config:
-            cfile, *keys = ck.split('.')
-            if cfile != 'mediapipe':
-                continue
-            obj_prev, obj_temp, k = decompose_keys(mediapipe_config, keys)
-            obj_prev[k] = json.loads(cv)
+        apply_config(config)
 
-        self.mp = MP()
+        self.mp = MP(load_model=load_model)
+        self.pack_writers = dict[Path, PackWriter]()
 
-    def __del__(self):
-        try:
-            shutil.rmtree(self.tmpdir)
-        except:
-            pass
+    def get_pack_writer(self, root: Path, shard_size: int = DEFAULT_SHARD_SIZE, fsync: bool = False) -> PackWriter:
+        """プロセス毎に1つの PackWriter を使い回す"""
+        if root not in self.pack_writers:
+            self.pack_writers[root] = PackWriter(root, shard_size, fsync=fsync)
+        return self.pack_writers[root]
+
+    def open_landmarks_writer(
+        self,
+        landmarks: Path,
+        total: int,
+        f_header: bool = False,
+        f_sparse: bool = False,
+        precision: int | None = None,
+        row_group: int = 0,
+        compress: bool = False,
+        codec: str = "zlib",
+        level: int | None = None,
+        chunk_size: int = DEFAULT_CHUNK_FRAMES,
+        delta_step: float | None = None,
+        f_fsync: bool = False
+        ) -> LandmarkWriter:
+
+        # 出力は同じディレクトリの一時ファイルに書き込み，完成してから置き換える
+        if landmarks.suffix == ".csv": # CSVで出力
+            return CsvWriter(
+                landmarks, total, header=self.mp.get_header() if f_header else "",
+                precision=precision, row_group=row_group, fsync=f_fsync
+            )
+
+        elif landmarks.suffix == ".npz": # NumPy.npz形式で出力
+            # f_sparse: 検出されたフレームの値と存在ビットマスクのみ
+            return NpzWriter(
+                landmarks, total, sparse=f_sparse,
+                target_sizes=self.mp.get_target_sizes(), n_dims=len(self.mp.dimension_targets),
+                compress=compress, fsync=f_fsync
+            )
+
+        elif landmarks.suffix == ".lmz": # チャンク毎に圧縮したコンテナで出力
+            # delta_step: 量子化した時間方向の差分を圧縮 (チャンクの先頭がキーフレーム)
+            return LmzWriter(
+                landmarks, total, codec=codec, level=level, chunk_size=chunk_size,
+                delta_step=delta_step, fsync=f_fsync
+            )
+
+        else: # NumPy.npy形式で出力
+            return open_writer(landmarks, total, fsync=f_fsync)
+
+    def open_video_writer(
+        self,
+        annotated: Path,
+        fps: float,
+        size: tuple[int, int],
+        fourcc: int,
+        encoder: str = "auto",
+        vcodec: str = "libx264",
+        preset: str | None = "veryfast",
+        crf: int | None = 23,
+        threads: int = 0,
+        stdout_format: str = "y4m"
+        ) -> FFmpegWriter | VideoWriter:
+
+        if encoder == "auto":
+            encoder = "ffmpeg" if ffmpeg_available() else "cv2"
+
+        if encoder == "ffmpeg": # ffmpeg のサブプロセスで符号化
+            return FFmpegWriter(
+                annotated, fps, size, codec=vcodec, preset=preset, crf=crf,
+                threads=threads, stdout_format=stdout_format
+            )
+        elif encoder == "cv2":
+            return VideoWriter(annotated.as_posix(), fourcc, fps, size)
+        else:
+            raise ValueError(f"unknown encoder '{encoder}' (auto, ffmpeg or cv2)")
+
+    def open_annotated_output(
+        self,
+        annotated: Path,
+        fps: float,
+        size: tuple[int, int],
+        fourcc: int,
+        total: int,
+        encoder: str = "auto",
+        vcodec: str = "libx264",
+        preset: str | None = "veryfast",
+        crf: int | None = 23,
+        threads: int = 0,
+        image_quality: int = 95,
+        image_compression: int = 1,
+        image_in_flight: int = 0
+        ) -> tuple[Callable[[cv2.Mat], Any], Callable[[], None], Callable[[], None]]:
+        """描画の保存先 (動画，または連続画像) を開き，(write, release, abort) を返します"""
+
+        stem_ext = annotated.name
+
+        if is_video(stem_ext): # 描画を動画で保存する場合
+            # 出力先と同じディレクトリの一時ファイルへ直接書き込み，完成後に置き換える (コピーしない)
+            makedirs(annotated)
+            tmp_video = temp_path(annotated, annotated.suffix)
+            video_writer = self.open_video_writer(
+                tmp_video, fps, size, fourcc, encoder, vcodec, preset, crf, threads
+            ) # 描画したものを保存（to動画）
+            def release_video():
+                video_writer.release()
+                atomic_replace(tmp_video, annotated)
+            def abort_video():
+                if isinstance(video_writer, FFmpegWriter): video_writer.kill()
+                else: video_writer.release()
+                tmp_video.unlink(missing_ok=True)
+            return video_writer.write, release_video, abort_video
+
+        elif is_image(stem_ext): # 描画を連続画像で保存する場合
+            # スレッドプールで符号化して書き出す
+            image_writer = ImageSequenceWriter(
+                annotated.parent / annotated.stem, annotated.suffix, max(4, len(str(total))),
+                quality=image_quality, compression=image_compression,
+                threads=threads, max_pending=image_in_flight
+            ) # 描画したものを保存（to連続画像）
+            return image_writer.write, image_writer.release, image_writer.kill
+
+        else:
+            raise AssertionError(f"may be unreach (type of stem_ext '({stem_ext}: {stem_ext.__class__})')")
 
     def run(
         self,
@@ -73,14 +371,41 @@ class RunApp(AppBase):
         f_draw_conn: bool = True, 
         f_mask_face: bool = False, 
         fourcc: str | None = None,
+        encoder: str = "auto",
+        vcodec: str = "libx264",
+        preset: str | None = "veryfast",
+        crf: int | None = 23,
+        threads: int = 0,
+        image_quality: int = 95,
+        image_compression: int = 1,
+        image_in_flight: int = 0,
+        annotated_stdout: str | None = None,
+        renditions: Sequence[Rendition] = (),
         f_normalize: bool = True, 
         f_clip: bool = True, 
         f_flat: bool = True,
         f_header: bool = False, 
+        f_sparse: bool = False,
+        f_mirror: bool = False,
+        f_raw: bool = False,
+        precision: int | None = None,
+        row_group: int = 0,
+        compress: bool = False,
+        codec: str = "zlib",
+        level: int | None = None,
+        chunk_size: int = DEFAULT_CHUNK_FRAMES,
+        delta_step: float | None = None,
+        f_fsync: bool = False,
+        pack_key: str | None = None,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        meta_key: str | None = None,
+        raw_cache: Path | None = None,
+        return_landmarks: bool = False,
+        out: np.ndarray | None = None,
+        cancel_event: Event | None = None,
         tqdm_kwds: TqdmKwargs = {},
-        rlock: RLock | None = None,
         src_str_len: int | None = None
-        ):
+        ) -> tuple[np.ndarray, RunMetadata] | None:
         """
         This method processes the input source (video or image sequence) to perform pose estimation
         using MediaPipe. It can annotate the frames, save the results, and output landmarks in CSV
@@ -97,117 +422,197 @@ class RunApp(AppBase):
                 f_draw_conn (bool): Whether to draw connections between landmarks.
                 f_mask_face (bool): Whether to mask the face in the annotation.
                 fourcc (str | None): FourCC code for video encoding. If None, default is used.
+                encoder (str): Video encoder backend: "ffmpeg" pipes frames to an ffmpeg subprocess, "cv2" uses cv2.VideoWriter, "auto" picks ffmpeg if it is installed.
+                vcodec (str): ffmpeg video codec.
+                preset (str | None): ffmpeg encoder preset.
+                crf (int | None): ffmpeg constant rate factor.
+                threads (int): ffmpeg encoder threads, or image encoding threads for image sequences. 0 picks automatically.
+                image_quality (int): JPEG/WebP quality of image sequences.
+                image_compression (int): PNG compression level of image sequences.
+                image_in_flight (int): Maximum number of image frames being encoded at once. 0 means twice the threads.
+                annotated_stdout (str | None): If "y4m" or "raw", annotated frames are written to stdout by ffmpeg instead of a file.
+                renditions (Sequence[Rendition]): Additional annotated outputs written from the same decode and inference pass,
+                    each with its own size, fps, drawing options and encoder. Smaller renditions are drawn on downscaled frames.
                 f_normalize (bool): Whether to normalize the landmarks.
                 f_clip (bool): Whether to clip the landmarks.
                 f_flat (bool): Whether to flatten the landmark matrix.
                 f_header (bool): Whether to include header in CSV output.
+                f_sparse (bool): Whether to store only detected targets with a presence bitmask in NPZ output.
+                f_mirror (bool): Whether to write a horizontally mirrored companion output computed from the landmarks.
+                f_raw (bool): Whether to also write all landmarks as detected (not normalized, not clipped) to a `.raw.npy`
+                    companion output, which `mpdriver render` can annotate without running inference again.
+                precision (int | None): Significant digits in CSV output. If None, enough digits to round-trip the values.
+                row_group (int): If positive, rows per CSV row group whose byte offsets are written to a sidecar.
+                compress (bool): Whether to compress NPZ output.
+                codec (str): Compression codec of LMZ output (zlib, lzma or zstd).
+                level (int | None): Compression level of LMZ output. If None, the codec default is used.
+                chunk_size (int): Number of frames compressed together in each LMZ chunk.
+                delta_step (float | None): If given, LMZ chunks are quantized to this step and delta-encoded along time before compression.
+                f_fsync (bool): Whether to fsync each landmarks output before it is moved to its final name.
+                pack_key (str | None): If given, `landmarks` is a pack directory and the clip is appended under this key.
+                shard_size (int): Size in bytes at which pack shards roll over.
+                meta_key (str | None): If given, run metadata (source info, detection rates, timings) is written under this key
+                    to a `<landmarks>.meta.json` sidecar, or embedded in the pack index entry.
+                raw_cache (Path | None): If given, all landmarks as detected are cached under this directory, keyed by the holistic
+                    options and the content hash of `src`, for `mpdriver export`. An existing cache entry is kept.
+                return_landmarks (bool): Whether to keep the landmarks in memory and return them instead of writing them to `landmarks`.
+                out (np.ndarray | None): With `return_landmarks`, an array (e.g. in shared memory) to write the landmarks into.
+                cancel_event (Event | None): If set while running, the job is aborted with `JobCancelled` and partial outputs are discarded.
                 tqdm_kwds (TqdmKwargs): Additional arguments for tqdm progress bar.
-                rlock (RLock | None): A lock for thread safety when writing files.
                 src_str_len (int | None): Length of the source string for progress bar formatting.
+
+        Returns:
+                tuple[np.ndarray, RunMetadata] | None: With `return_landmarks`, the landmarks (T, ...) and the run metadata.
+                    None if nothing was processed or `return_landmarks` is False.
         """
 
+        if return_landmarks and landmarks is not None:
+            raise ValueError("return_landmarks cannot be used with landmarks")
+
         str_src = src.as_posix()
         imshow_winname = str(id(self))
-        stem_ext = None if annotated is None else annotated.name
 
         current_thread = AppWorkerThread.get_thread()
         tqdm_handler = current_thread.tqdm_handler
+        timer = StageTimer() # 段階毎の所要時間
+
+        # 推論結果のキャッシュ (既にあれば書き出さない)
+        cache_file = None
+        if raw_cache is not None:
+            cache_file = raw_cache_path(raw_cache, holistic_hash(), content_hash(src))
+            if cache_file.exists():
+                cache_file = None
+                if annotated is None and landmarks is None and not show_annotated and not annotated_stdout and not renditions and not return_landmarks:
+                    return
+
+        # 動画，または連続画像 (fps は引数の値)
+        if (source := open_source(src, fps)) is None:
+            # raise ValueError
+            return
+        frame_iter, total, fps, size, source_fourcc = source
+        fourcc = annotated_fourcc(annotated)
 
-        # if is_video(src):
-        if src.is_file():
-
-            cap = VideoCapture(str_src)
-            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            fourcc = VideoWriter_fourcc(*'h264')
-            if annotated is not None:
-                if annotated.suffix in FOURCC:
-                    fourcc = VideoWriter_fourcc(*FOURCC[annotated.suffix])
-                else:
-                    print('WARNNING:', f'annotated .ext \'{annotated.suffix}\' is invalid. use \'.mp4\'')
-            fps = float(cap.get(cv2.CAP_PROP_FPS))
-            size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
-            frame_iter = cap_to_frame_iter(cap, end=total)
-
-        # elif is_frame_sequence(src):
-        else:
-
-            img_pathes = list(p for p in src.iterdir() if is_image(p))
-            total = len(img_pathes)
-            fourcc = VideoWriter_fourcc(*'h264')
-            if annotated is not None:
-                if annotated.suffix in FOURCC:
-                    fourcc = VideoWriter_fourcc(*FOURCC[annotated.suffix])
-                else:
-                    print('WARNNING:', f'annotated .ext \'{annotated.suffix}\' is invalid. use \'.mp4\'')
-            # fps = fps
-            img_iter = (cv2.imread(f.as_posix(), cv2.IMREAD_COLOR) for f in img_pathes)
-            if (f0 := next(img_iter, None)) is None:
-                # raise ValueError
-                return
-            size = (f0.shape[1], f0.shape[0])
-            frame_iter = chain((f0,), img_iter)
+        if cancel_event is not None: # フレーム毎に外部からの取り消しを確認
+            frame_iter = cancellable(frame_iter, cancel_event)
 
         total_str_len = max(4, len(str(total)))
         on_completed_tasks = list[Callable[[], None]]()
+        on_aborted_tasks = list[Callable[[], None]]()
 
-        # np.Mat -> np.Mat, MPD (=MediaPipeDict)
-        tasks = ((f, self.mp.detect(f)) for f in frame_iter) # 姿勢推定
+        stats = DetectionStats(self.mp.get_target_sizes().keys()) # 検出率など
+        detect = timer.wrap("detect", self.mp.detect)
+        def detect_and_count(f: cv2.Mat):
+            mpd = detect(f)
+            stats.update(mpd)
+            return mpd
 
-        if annotated is not None or show_annotated: # 描画する場合
+        # np.Mat -> np.Mat, MPD (=MediaPipeDict)
+        tasks = ((f, detect_and_count(f)) for f in timer.wrap_iter("decode", frame_iter)) # 姿勢推定
+
+        annotate = timer.wrap("annotate", self.mp.annotate)
+
+        if renditions: # 描画の追加出力 (解像度の低いものは縮小したフレームに描画する)
+            resize = timer.wrap("annotate", cv2.resize)
+            rendition_writers = list[tuple[Rendition, tuple[int, int], float, Callable[[cv2.Mat], Any]]]()
+            for rendition in renditions:
+                r_size = rendition_size(size, rendition.size)
+                r_fps = rendition.fps if 0 < rendition.fps < fps else fps
+                write_rendition, release_rendition, abort_rendition = self.open_annotated_output(
+                    rendition.annotated, r_fps, r_size, annotated_fourcc(rendition.annotated), total,
+                    rendition.encoder, rendition.vcodec, rendition.preset, rendition.crf, rendition.threads,
+                    rendition.image_quality, rendition.image_compression, rendition.image_in_flight
+                )
+                on_completed_tasks.append(release_rendition)
+                on_aborted_tasks.append(abort_rendition)
+                rendition_writers.append((rendition, r_size, r_fps / fps, timer.wrap("encode", write_rendition)))
+
+            def render_renditions(n: int, f: cv2.Mat, mpd: Mapping[str, np.ndarray]):
+                for rendition, r_size, step, write_rendition in rendition_writers:
+                    if n and int(n * step) == int((n - 1) * step): continue # fps を下げる場合はフレームを間引く
+                    r_frame = f if r_size == size else resize(f, r_size, interpolation=cv2.INTER_AREA)
+                    write_rendition(annotate(r_frame, mpd, rendition.f_draw_conn, rendition.f_draw_lm, rendition.f_mask_face))
+
+            # np.Mat, MPD -> np.Mat, MPD
+            # （変化しない）
+            tasks = ((f, mpd, render_renditions(n, f, mpd))[:2] for n, (f, mpd) in enumerate(tasks))
+
+        if annotated is not None or show_annotated or annotated_stdout: # 描画する場合
             # np.Mat, MPD -> MPD, np.Mat
-            tasks = ((mpd, self.mp.annotate(f, mpd, f_draw_conn, f_draw_lm, f_mask_face)) for f, mpd in tasks) # 関節点の描画
+            tasks = ((mpd, annotate(f, mpd, f_draw_conn, f_draw_lm, f_mask_face)) for f, mpd in tasks) # 関節点の描画
 
             if show_annotated:
                 # MPD, np.Mat -> MPD, np.Mat
                 # （変化しない）
                 tasks = (((mpd, ann), cv2.imshow(imshow_winname, ann), cv2.waitKey(1))[0] for mpd, ann in tasks) # 描画したものを表示
 
-            if annotated is None: # 描画を保存しない
+            if annotated_stdout: # 描画を標準出力へ書き出す場合
+                stdout_writer = FFmpegWriter(FFMPEG_STDOUT, fps, size, stdout_format=annotated_stdout)
+                encode = timer.wrap("encode", stdout_writer.write)
+                # MPD, np.Mat -> MPD
+                tasks = ((mpd, encode(ann))[0] for mpd, ann in tasks)
+                on_completed_tasks.append(stdout_writer.release)
+                on_aborted_tasks.append(stdout_writer.kill)
+
+            elif annotated is None: # 描画を保存しない
                 # Nothing to do
                 # MPD, np.Mat -> MPD
                 tasks = (mpd for mpd, ann in tasks)
 
-            elif stem_ext and is_video(stem_ext): # 描画を動画で保存する場合
-                tmp_video = (self.tmpdir / f'{hash(annotated)}.{annotated.suffix}').as_posix()
-                video_writer = VideoWriter(tmp_video, fourcc, fps, size) # 描画したものを保存（to動画）
-                # MPD, np.Mat -> MPD
-                tasks = ((mpd, video_writer.write(ann))[0] for mpd, ann in tasks)
-                def release_video():
-                    video_writer.release()
-                    shutil.copy(tmp_video, annotated.as_posix())
-                    os.remove(tmp_video)
-                on_completed_tasks.append(release_video)
-
-            elif stem_ext and is_image(stem_ext): # 描画を連続画像で保存する場合
+            else: # 描画を動画，または連続画像で保存する場合
+                write_annotated, release_annotated, abort_annotated = self.open_annotated_output(
+                    annotated, fps, size, fourcc, total, encoder, vcodec, preset, crf, threads,
+                    image_quality, image_compression, image_in_flight
+                )
+                encode = timer.wrap("encode", write_annotated)
                 # MPD, np.Mat -> MPD
-                tasks = (
-                    (mpd, cv2.imwrite(
-                        (annotated.parent / annotated.stem / f"{{:0{total_str_len}}}{{}}".format(idx, annotated.suffix)),
-                        ann
-                    ))[0]
-                    for idx, (mpd, ann) in enumerate(tasks)
-                ) # 描画したものを保存（to連続画像）
-
-            else:
-                raise AssertionError(f"may be unreach (type of stem_ext '({stem_ext}: {stem_ext.__class__})')")
+                tasks = ((mpd, encode(ann))[0] for mpd, ann in tasks)
+                on_completed_tasks.append(release_annotated)
+                on_aborted_tasks.append(abort_annotated)
 
         else:
             # np.Mat, MPD -> MPD
             tasks = (mpd for f, mpd in tasks) # イテレータの整形
 
 
+        # mirror
+        if f_mirror and landmarks is not None:
+            # MPD -> (MPD, MPD)
+            tasks = ((mpd, self.mp.mirror(mpd)) for mpd in tasks) # 推論せずに左右反転
+        else:
+            # MPD -> (MPD,)
+            tasks = ((mpd,) for mpd in tasks)
+
+        # raw: 正規化前の全ランドマークを残す (キャッシュにも)
+        f_raw = f_raw and landmarks is not None
+        n_raw = f_raw + (cache_file is not None)
+        if n_raw:
+            # (MPD, ...) -> (MPD, ...), np.float
+            tasks = ((mpds, self.mp.to_raw(mpds[0])) for mpds in tasks)
+        else:
+            # (MPD, ...) -> (MPD, ...), None
+            tasks = ((mpds, None) for mpds in tasks)
+
+        if landmarks is None and not return_landmarks: # キャッシュだけ書き出す
+            # (MPD, ...), raw -> (), raw
+            tasks = (((), raw) for mpds, raw in tasks)
+
         # normalize and clip
-        if f_normalize:
-            # MPD -> MPD
-            tasks = (self.mp.normalize(mpd, clip=f_clip) for mpd in tasks)
+        elif f_normalize:
+            # (MPD, ...), raw -> (MPD, ...), raw
+            tasks = ((tuple(self.mp.normalize(mpd, clip=f_clip) for mpd in mpds), raw) for mpds, raw in tasks)
 
         # flatten
-        if f_flat:
-            # MPD -> np.float
-            tasks = (self.mp.flatten(mpd) for mpd in tasks)
+        if landmarks is None and not return_landmarks:
+            pass
+        elif f_flat:
+            # (MPD, ...), raw -> (np.float, ...), raw
+            tasks = ((tuple(self.mp.flatten(mpd) for mpd in mpds), raw) for mpds, raw in tasks)
         else:
-            # MPD -> np.float
-            tasks = (self.mp.flatten(mpd, as_3d=True) for mpd in tasks)
+            # (MPD, ...), raw -> (np.float, ...), raw
+            tasks = ((tuple(self.mp.flatten(mpd, as_3d=True) for mpd in mpds), raw) for mpds, raw in tasks)
+
+        # (np.float, ...), raw -> (np.float, ..., raw, ...)
+        tasks = (rows if raw is None else (*rows, *(raw,) * n_raw) for rows, raw in tasks)
 
         # 表示する文字幅を設定
         src_str_len = 70 if src_str_len is None else src_str_len
@@ -225,45 +630,161 @@ class RunApp(AppBase):
             "unit": "f"
         } | tqdm_kwds)) # プログレスバー
 
-        if landmarks is None: # 関節点の出力なし
-            for _ in tasks: pass # 実行
-            tasks.update(total - tasks.last_print_n)
+        if landmarks is None and not return_landmarks and cache_file is None: # 関節点の出力なし
+            try:
+                for _ in tasks: pass # 実行
+            except BaseException:
+                for task in on_aborted_tasks:
+                    task()
+                raise
+            tasks.update(max(0, total - stats.frames))
             del tasks
+            for task in on_completed_tasks: # 描画の書き出しを確定
+                task()
             return
 
-        # Check that result is empty 
-        if not bool(matrix := list(tasks)):
-            tqdm_handler.write(f'skip at {src} because it isn\'t detected from src')
-            return
-        tasks.update(total - tasks.last_print_n)
-        del tasks
+        # 1フレームずつディスクへ書き出す
+        if return_landmarks: # ディスクへ書き出さずにメモリ上の配列へ
+            writers: list[LandmarkWriter] = [ArrayWriter(total, out)]
+        elif landmarks is None: # キャッシュだけ
+            writers = []
+        elif pack_key is not None: # pack のシャードに追記
+            pack = self.get_pack_writer(landmarks, shard_size, f_fsync)
+            landmarks_config_hash = config_hash(mediapipe_config, f_normalize, f_clip, f_flat)
+            writers = [pack.open_clip(pack_key, str_src, total, fps, landmarks_config_hash)]
+            if f_mirror:
+                writers.append(pack.open_clip(mirrored_key(pack_key), str_src, total, fps, landmarks_config_hash))
+            if f_raw:
+                writers.append(pack.open_clip(raw_key(pack_key), str_src, total, fps, config_hash(mediapipe_config)))
+        else:
+            writer_options = (f_header, f_sparse, precision, row_group, compress, codec, level, chunk_size, delta_step, f_fsync)
+            writers = [self.open_landmarks_writer(landmarks, total, *writer_options)]
+            if f_mirror:
+                writers.append(self.open_landmarks_writer(mirrored_path(landmarks), total, *writer_options))
+            if f_raw:
+                writers.append(open_writer(raw_path(landmarks), total, fsync=f_fsync))
+        if cache_file is not None:
+            writers.append(open_writer(cache_file, total, fsync=f_fsync))
+
+        try:
+            for rows in tasks:
+                write_start = time.perf_counter()
+                for writer, row in zip(writers, rows):
+                    writer.write(row)
+                timer.add("write", time.perf_counter() - write_start)
+        except BaseException:
+            for writer in writers:
+                writer.abort()
+            for task in on_aborted_tasks:
+                task()
+            raise
+
+        if meta_key is not None or return_landmarks: # メタデータ: サイドカー，または pack のインデックスに埋め込む
+            meta = RunMetadata(
+                version=META_LAYOUT_VERSION,
+                key=str_src if meta_key is None else meta_key,
+                source=source_info(src, size[0], size[1], fps, total, source_fourcc),
+                frames=stats.frames,
+                **stats.metadata(),
+                config_hash=config_hash(mediapipe_config, f_normalize, f_clip, f_flat),
+                engine=engine_versions(),
+                timings=timer.timings,
+                created=time.time()
+            )
+            if pack_key is not None:
+                writers[0].meta = meta
+
+        close_start = time.perf_counter()
+        counts = [writer.close() for writer in writers]
+        timer.add("write", time.perf_counter() - close_start)
+
+        if cache_file is not None and (cached := counts.pop()):
+            write_raw_cache_info(cache_file, source_info(src, size[0], size[1], fps, total, source_fourcc), cached, f_fsync)
+
+        if meta_key is not None and landmarks is not None and pack_key is None and counts[0]:
+            write_metadata(metadata_path(landmarks), meta, f_fsync)
 
         # Execute all on_completed_tasks
+        # 描画の書き出しは関節点の検出の有無に関わらず確定する
         for task in on_completed_tasks:
             task()
 
-        matrix = np.stack(matrix)
-
-        if landmarks.suffix == ".csv": # CSVで出力
-
-            header = self.mp.get_header() if f_header else ""
+        # Check that result is empty 
+        if (landmarks is not None or return_landmarks) and not any(counts):
+            tqdm_handler.write(f'skip at {src} because it isn\'t detected from src')
+            return
+        tasks.update(max(0, total - stats.frames))
+        del tasks
 
-            if matrix.ndim != 2:
-                raise ValueError(f"matrix.ndim != 2 ({matrix.ndim})")
+        if return_landmarks:
+            return writers[0].array, meta
+        return
 
-            if rlock is not None: rlock.acquire()
-            os.makedirs(landmarks.parent, exist_ok=True)
-            np.savetxt(landmarks, matrix, delimiter=",", header=header)
-            if rlock is not None: rlock.release()
+    @classmethod
+    def cleanup(
+        cls,
+        src: Path,
+        annotated: Path | None = None,
+        landmarks: Path | None = None,
+        renditions: Sequence[Rendition] = (),
+        f_mirror: bool = False,
+        f_raw: bool = False,
+        pack_key: str | None = None,
+        **kwargs: Any
+        ):
 
-        elif landmarks.suffix == ".npy": # NumPy.npy形式で出力
+        paths = [annotated, *(rendition.annotated for rendition in renditions)]
+        if landmarks is not None:
+            if pack_key is not None:
+                keys = [pack_key, *([mirrored_key(pack_key)] if f_mirror else []), *([raw_key(pack_key)] if f_raw else [])]
+                paths += [clip_spool_path(landmarks, key) for key in keys]
+            else:
+                paths += [landmarks, mirrored_path(landmarks), raw_path(landmarks), metadata_path(landmarks)]
+        for path in paths:
+            if path is not None:
+                remove_temp_files(path)
+
+def ledger_config(ns: RunArgs) -> str:
+    """台帳のキーにする設定のハッシュ (出力に影響しないオプションを除く)"""
+
+    def outputs(options: Mapping[str, Any]) -> dict[str, Any]:
+        return {k: v for k, v in options.items() if k not in ("overwrite", "show")}
+
+    return config_hash(
+        mediapipe_config, ns.config,
+        ns.landmarks[0], outputs(ns.landmarks[1]),
+        ns.annotated[0], outputs(ns.annotated[1]),
+        [(dst, outputs(options)) for dst, options in ns.rendition]
+    )
 
-            if rlock is not None: rlock.acquire()
-            os.makedirs(landmarks.parent, exist_ok=True)
-            np.save(landmarks, matrix)
-            if rlock is not None: rlock.release()
+def job_outputs(kwargs: Mapping[str, Any]) -> list[LedgerOutput]:
+    """ジョブが書き出した出力 (検出がなく書き出さなかったものは除く)"""
 
-        return
+    paths = [kwargs["annotated"], *(rendition.annotated for rendition in kwargs["renditions"])]
+    outputs = list[LedgerOutput]()
+    if (landmarks := kwargs["landmarks"]) is not None:
+        if (pack_key := kwargs["pack_key"]) is not None:
+            # キーの有無は is_done が起動時に読んだインデックスで確かめる (検出がなかったクリップはやり直しになる)
+            keys = [pack_key, *([mirrored_key(pack_key)] if kwargs["f_mirror"] else []), *([raw_key(pack_key)] if kwargs["f_raw"] else [])]
+            outputs += [pack_output(landmarks, key) for key in keys]
+        else:
+            paths += [
+                landmarks,
+                mirrored_path(landmarks) if kwargs["f_mirror"] else None,
+                raw_path(landmarks) if kwargs["f_raw"] else None,
+                metadata_path(landmarks) if kwargs["meta_key"] is not None else None
+            ]
+    return outputs + [file_output(path) for path in paths if path is not None and path.exists()]
+
+def write_failure_report(path: Path, failures: Iterable[JobFailure]):
+    """失敗したジョブの一覧 ({src, attempts, error} のリスト) を JSON で書き出します"""
+
+    makedirs(path)
+    with atomic_open(path, "w", encoding="utf-8") as fp:
+        json.dump([
+            {"src": str(next(iter(failure.args_kwargs[0]))), "attempts": failure.attempts, "error": failure.error}
+            for failure in sorted(failures, key=lambda f: f.index)
+        ], fp, ensure_ascii=False, indent=1)
 
 class RunExecutor(AppExecutor[RunApp]): # 子プロセス上の実行クラス
     app_type = RunApp # AppExecutor で使用するので，必ず app_type を設定
@@ -275,111 +796,163 @@ def app_main(ns: RunArgs): # アプリケーションのコマンドラインツ
     if ns.template is not None:
         config
 
-    executor = RunExecutor(ns.cpu, (ns.config,))
+    # -a stdout=y4m: 描画を標準出力へ書き出す (クリップが混ざらないようにシングルプロセスで実行)
+    annotated_stdout = ns.annotated[1]["stdout"] or None
+    if annotated_stdout is not None:
+        if ns.cpu:
+            print('WARNNING:', 'annotated stdout=... runs in a single process', file=sys.stderr)
+        ns.cpu = 0
+
+    # sparse=true は .npz だけが対応する (他の形式では黙って密な出力になる)
+    if ns.landmarks[0][0] is not None and ns.landmarks[1]["sparse"] and ns.landmarks[0][1] != '.npz':
+        print('ERROR:', f'landmarks sparse=true requires the .npz suffix (got {ns.landmarks[0][1]})', file=sys.stderr)
+        return
+
+    # --cpu を指定しない場合は使えるコア数 (cgroup のクォータを含む) から決める
+    ns.cpu = resolve_workers(ns.cpu, ns.threads)
+
+    # --serve-jobs: ジョブを mpdriver worker へ分配する (このプロセスでは推論しない)
+    serve_address = None if ns.serve_jobs is None else parse_address(ns.serve_jobs)
+    if serve_address is not None and (annotated_stdout or ns.annotated[1]["show"]):
+        print('ERROR:', '--serve-jobs cannot be used with annotated show=true or stdout=...', file=sys.stderr)
+        return
+
+    executor = None if serve_address is not None else RunExecutor(
+        ns.cpu, (ns.config,), threads=ns.threads, pin=ns.pin,
+        max_tasks=ns.max_tasks or None, memory_budget=(ns.memory_budget << 20) or None,
+        retries=ns.retries, job_timeout=ns.timeout or None
+    )
+    tqdm_func = TqdmSingle.tqdm if executor is None else executor._tqdm_func
 
     for ext in ns.add_ext:
         if ext.startswith('.'):
             ext = ext[1:]
         mimetypes.add_type(f'video/{ext}', f'.{ext}')
 
-    def args_kwargs_iter() -> Iterator[tuple[tuple[Path, Path | None, Path | None, bool, float, bool], dict]]:
+    # --landmarks dst pack: 1つの pack ディレクトリにまとめて追記
+    use_pack = ns.landmarks[0][0] is not None and ns.landmarks[0][1] == PACK_SUFFIX
+    pack_keys = set(load_pack_index(ns.landmarks[0][0])) if use_pack else set()
 
-        if is_video(ns.src): # src が単一ファイル
+    # --ledger: 出力の有無ではなく，台帳で完了した (入力，設定，出力が一致する) ジョブを飛ばす
+    ledger = None if ns.ledger is None else JobLedger(ns.ledger)
+    ledger_key = ledger_config(ns)
+    ledger_pack_keys = {ns.landmarks[0][0].resolve().as_posix(): pack_keys} if use_pack else {}
+    identities = dict[Path, InputIdentity]()
+
+    def job(src: Path, src_related: Path) -> tuple[tuple[Path], dict[str, Any]] | None:
 
-            if ns.annotated[0][0] is None: # 描画なし
+        pack_key = None
+
+        if ns.annotated[0][0] is None or annotated_stdout: # 描画なし (または標準出力)
+            annotated = None
+        else:                          # 描画あり
+            annotated = (ns.annotated[0][0] / src_related).with_suffix(ns.annotated[0][1])
+            if ledger is None and not ns.annotated[1]["overwrite"] and annotated.exists():
                 annotated = None
-            else:                          # 描画あり
-                annotated = (ns.annotated[0][0] / ns.src.name).with_suffix(ns.annotated[0][1])
-                if not ns.annotated[1]["overwrite"] and annotated.exists():
-                    annotated = None
 
-            if ns.landmarks[0][0] is None: # 関節点の出力なし
+        if ns.landmarks[0][0] is None: # 関節点の出力なし
+            landmarks = None
+        elif use_pack:                 # 関節点の出力あり (pack)
+            landmarks = ns.landmarks[0][0]
+            pack_key = src_related.as_posix()
+            if ledger is None and not ns.landmarks[1]["overwrite"] and pack_key in pack_keys:
+                landmarks = pack_key = None
+        else:                          # 関節点の出力あり
+            landmarks = (ns.landmarks[0][0] / src_related).with_suffix(ns.landmarks[0][1])
+            if ledger is None and not ns.landmarks[1]["overwrite"] and landmarks.exists():
                 landmarks = None
-            else:                          # 関節点の出力あり
-                landmarks = (ns.landmarks[0][0] / ns.src.name).with_suffix(ns.landmarks[0][1])
-                if not ns.landmarks[1]["overwrite"] and landmarks.exists():
-                    landmarks = None
 
-            if annotated is None and landmarks is None and not ns.annotated[1]["show"]:
-                # mediapipeの姿勢推定が必要ない状態
-                return
+        renditions = list[Rendition]()
+        for (r_dst, r_ext), r_opt in ns.rendition: # 描画の追加出力
+            r_annotated = (r_dst / src_related).with_suffix(r_ext)
+            if ledger is None and not r_opt["overwrite"] and r_annotated.exists():
+                continue
+            renditions.append(Rendition(
+                r_annotated, r_opt["size"], r_opt["fps"],
+                r_opt["draw_lm"], r_opt["draw_conn"], r_opt["mask_face"],
+                r_opt["encoder"], r_opt["codec"], r_opt["preset"] or None,
+                None if r_opt["crf"] < 0 else r_opt["crf"], r_opt["threads"],
+                r_opt["quality"], r_opt["compression"], r_opt["in_flight"]
+            ))
+
+        if annotated is None and landmarks is None and not ns.annotated[1]["show"] and not annotated_stdout and not renditions and ns.raw_cache is None:
+            # mediapipeの姿勢推定が必要ない状態
+            return None
+
+        if ledger is not None and not ns.annotated[1]["show"] and not annotated_stdout:
+            identity = identities[src] = input_identity(src)
+            if ledger.is_done(identity, ledger_key, ledger_pack_keys, ns.hash_content):
+                return None
+
+        return (
+            (
+                src, # src: Path,
+            ),
+            {
+                'annotated': annotated,  # annotated: Path | None = None,
+                'landmarks': landmarks,  # landmarks: Path | None = None,
+                'show_annotated': ns.annotated[1]["show"],  # show_annotated: bool = False,
+                'fps': ns.annotated[1]["fps"],  # fps: float = 30,
+                'f_draw_lm': ns.annotated[1]["draw_lm"],  # f_draw_lm: bool = True,
+                'f_draw_conn': ns.annotated[1]["draw_conn"],  # f_draw_conn: bool = True,
+                'f_mask_face': ns.annotated[1]["mask_face"],  # f_mask_face: bool = False,
+                'fourcc': ns.annotated[1]["fourcc"],  # fourcc: str | None = None,
+                'encoder': ns.annotated[1]["encoder"],  # encoder: str = "auto",
+                'vcodec': ns.annotated[1]["codec"],  # vcodec: str = "libx264",
+                'preset': ns.annotated[1]["preset"] or None,  # preset: str | None = "veryfast",
+                'crf': None if ns.annotated[1]["crf"] < 0 else ns.annotated[1]["crf"],  # crf: int | None = 23,
+                'threads': ns.annotated[1]["threads"],  # threads: int = 0,
+                'image_quality': ns.annotated[1]["quality"],  # image_quality: int = 95,
+                'image_compression': ns.annotated[1]["compression"],  # image_compression: int = 1,
+                'image_in_flight': ns.annotated[1]["in_flight"],  # image_in_flight: int = 0,
+                'annotated_stdout': annotated_stdout,  # annotated_stdout: str | None = None,
+                'renditions': renditions,  # renditions: Sequence[Rendition] = (),
+                'f_normalize': ns.landmarks[1]["normalize"],  # f_normalize: bool = True,
+                'f_clip': ns.landmarks[1]["clip"],  # f_clip: bool = True,
+                'f_flat': ns.landmarks[1]["flat"],  # f_flat: bool = True,
+                'f_header': ns.landmarks[1]["header"],  # f_header: bool = False,
+                'f_sparse': ns.landmarks[1]["sparse"],  # f_sparse: bool = False,
+                'f_mirror': ns.landmarks[1]["mirror"],  # f_mirror: bool = False,
+                'f_raw': ns.landmarks[1]["raw"],  # f_raw: bool = False,
+                'precision': ns.landmarks[1]["precision"] or None,  # precision: int | None = None,
+                'row_group': ns.landmarks[1]["row_group"],  # row_group: int = 0,
+                'compress': ns.landmarks[1]["compress"],  # compress: bool = False,
+                'codec': ns.landmarks[1]["codec"],  # codec: str = "zlib",
+                'level': None if ns.landmarks[1]["level"] < 0 else ns.landmarks[1]["level"],  # level: int | None = None,
+                'chunk_size': ns.landmarks[1]["chunk"],  # chunk_size: int = DEFAULT_CHUNK_FRAMES,
+                'delta_step': ns.landmarks[1]["step"] if ns.landmarks[1]["delta"] else None,  # delta_step: float | None = None,
+                'f_fsync': ns.landmarks[1]["fsync"],  # f_fsync: bool = False,
+                'pack_key': pack_key,  # pack_key: str | None = None,
+                'shard_size': ns.landmarks[1]["shard_mb"] << 20,  # shard_size: int = DEFAULT_SHARD_SIZE,
+                'meta_key': src_related.as_posix() if landmarks is not None and ns.landmarks[1]["meta"] else None,  # meta_key: str | None = None,
+                'raw_cache': ns.raw_cache,  # raw_cache: Path | None = None,
+                # tqdm_kwds: TqdmKwargs = {},
+                # src_str_len: int | None = None
+            }
+        )
+
+    def args_kwargs_iter() -> Iterator[tuple[tuple[Path], dict[str, Any]]]:
 
-            yield (
-                (
-                    ns.src # src: Path,
-                ),
-                {
-                    'annotated': annotated,  # annotated: Path | None = None,
-                    'landmarks': landmarks,  # landmarks: Path | None = None,
-                    'show_annotated': ns.annotated[1]["show"],  # show_annotated: bool = False,
-                    'fps': ns.annotated[1]["fps"],  # fps: float = 30,
-                    'f_draw_lm': ns.annotated[1]["draw_lm"],  # f_draw_lm: bool = True,
-                    'f_draw_conn': ns.annotated[1]["draw_conn"],  # f_draw_conn: bool = True,
-                    'f_mask_face': ns.annotated[1]["mask_face"],  # f_mask_face: bool = False,
-                    'fourcc': ns.annotated[1]["fourcc"],  # fourcc: str | None = None,
-                    'f_normalize': ns.landmarks[1]["normalize"],  # f_normalize: bool = True,
-                    'f_clip': ns.landmarks[1]["clip"],  # f_clip: bool = True,
-                    'f_flat': ns.landmarks[1]["flat"],  # f_flat: bool = True,
-                    'f_header': ns.landmarks[1]["header"],  # f_header: bool = False,
-                    # tqdm_kwds: TqdmKwargs = {},
-                    # rlock: RLock | None = None,
-                    # src_str_len: int | None = None
-                }
-            
-            )
+        if is_video(ns.src): # src が単一ファイル
+            if (item := job(ns.src, Path(ns.src.name))) is not None:
+                yield item
             return
 
         for src in video_or_imgdir_pathes(ns.src): # src がディレクトリ
-
             src_related = src.relative_to(ns.src)
+            if (item := job(ns.src / src_related, src_related)) is not None:
+                yield item
 
-            if ns.annotated[0][0] is None: # 描画なし
-                annotated = None
-            else:                          # 描画あり
-                annotated = (ns.annotated[0][0] / src_related).with_suffix(ns.annotated[0][1])
-                if not ns.annotated[1]["overwrite"] and annotated.exists():
-                    annotated = None
-
-            if ns.landmarks[0][0] is None: # 関節点の出力なし
-                landmarks = None
-            else:                          # 関節点の出力あり
-                landmarks = (ns.landmarks[0][0] / src_related).with_suffix(ns.landmarks[0][1])
-                if not ns.landmarks[1]["overwrite"] and landmarks.exists():
-                    landmarks = None
-
-            if annotated is None and landmarks is None and not ns.annotated[1]["show"]:
-                # mediapipeの姿勢推定が必要ない状態
-                continue
-
-            yield (
-                (
-                    ns.src / src_related,  # src: Path,
-                ),
-                {
-                    'annotated': annotated,  # annotated: Path | None = None,
-                    'landmarks': landmarks,  # landmarks: Path | None = None,
-                    'show_annotated': ns.annotated[1]["show"],  # show_annotated: bool = False,
-                    'fps': ns.annotated[1]["fps"],  # fps: float = 30,
-                    'f_draw_lm': ns.annotated[1]["draw_lm"],  # f_draw_lm: bool = True,
-                    'f_draw_conn': ns.annotated[1]["draw_conn"],  # f_draw_conn: bool = True,
-                    'f_mask_face': ns.annotated[1]["mask_face"],  # f_mask_face: bool = False,
-                    'fourcc': ns.annotated[1]["fourcc"],  # fourcc: str | None = None,
-                    'f_normalize': ns.landmarks[1]["normalize"],  # f_normalize: bool = True,
-                    'f_clip': ns.landmarks[1]["clip"],  # f_clip: bool = True,
-                    'f_flat': ns.landmarks[1]["flat"],  # f_flat: bool = True,
-                    'f_header': ns.landmarks[1]["header"],  # f_header: bool = False,
-                    # tqdm_kwds: TqdmKwargs = {},
-                    # rlock: RLock | None = None,
-                    # src_str_len: int | None = None
-                }
-            )
-
-    args_kwargs_list = list(executor._tqdm_func(
+    args_kwargs_list = list(tqdm_func(
         args_kwargs_iter(),
         desc = f'\033[46m{PROGRESS_DESC_PREFIX.format("Searching...")}\033[0m',
         priority=1
     )) # ファイルを探索
 
+    if annotated_stdout and len(args_kwargs_list) > 1: # クリップ毎のストリームが連結されて読めなくなる
+        print('ERROR:', f'annotated stdout=... takes a single input, but {len(args_kwargs_list)} were found in {ns.src}', file=sys.stderr)
+        return
+
     # プログレスバーに表示する入力ファイルのパスの最大文字長を取得 -> 0埋め用
     src_str_len = max(
         (
@@ -395,5 +968,67 @@ def app_main(ns: RunArgs): # アプリケーションのコマンドラインツ
     for item in args_kwargs_list:
         item[1]['src_str_len'] = src_str_len
 
+    # 長いジョブから順に，メモリの予算に収まる分だけ投入する (マルチプロセスか，分配する場合のみ)
+    costs = footprints = None
+    if executor is None or (ns.cpu is not None and (ns.schedule == 'longest' or ns.memory_budget)):
+        with ThreadPoolExecutor(max_workers=8) as probe_pool:
+            probes = list(probe_pool.map(probe_source, (item[0][0] for item in args_kwargs_list)))
+        if ns.schedule == 'longest':
+            costs = [estimate_cost(probe) for probe in probes]
+        if ns.memory_budget or executor is None: # ワーカは自分の予算を持てる
+            footprints = [estimate_footprint(probe, item[1]) for probe, item in zip(probes, args_kwargs_list)]
+
+    # 台帳: 投入したジョブは完了を記録するまで pending (中断した場合は次の実行でやり直す)
+    on_complete = None
+    if ledger is not None:
+
+        # 内容のハッシュは投入前にまとめて求める (完了の通知はスケジューラのスレッドで受けるため)
+        if ns.hash_content:
+            hashed = [src for (src,), _ in args_kwargs_list if src in identities]
+            with ThreadPoolExecutor(max_workers=8) as hash_pool:
+                for src, digest in zip(hashed, hash_pool.map(content_hash, hashed)):
+                    identities[src] = identities[src]._replace(content_hash=digest)
+
+        for (src,), _ in args_kwargs_list:
+            if src in identities:
+                ledger.pending(identities[src], ledger_key)
+
+        def on_complete(i: int, outcome: tuple[Any, float] | JobFailure):
+            (src,), kwargs = args_kwargs_list[i]
+            if (identity := identities.get(src)) is None: return
+            if isinstance(outcome, JobFailure):
+                ledger.failed(identity, ledger_key, outcome.error, outcome.attempts)
+                return
+            ledger.done(identity, ledger_key, outcome[1], job_outputs(kwargs))
+
     # アプリケーションを実行
-    executor.execute(args_kwargs_list)
+    try:
+        if executor is None: # ワーカが全てのジョブを終えるまで待つ
+            board = JobBoard(
+                args_kwargs_list, None if costs is None else longest_first(costs), (ns.config,),
+                lease=ns.lease, retries=ns.retries, footprints=footprints,
+                job_timeout=ns.timeout or None, memory_budget=(ns.memory_budget << 20) or None
+            )
+            failures = serve_jobs(board, serve_address, resolve_authkey(ns.authkey), on_complete)
+        else:
+            executor.execute(args_kwargs_list, costs=costs, footprints=footprints, on_complete=on_complete)
+            failures = executor.failures
+    finally:
+        if ledger is not None:
+            ledger.close()
+        if executor is not None: # 強制終了したワーカがあると，プログレスバーより先にマネージャが終了することがある
+            executor.shutdown()
+
+    # 失敗したジョブの一覧
+    if ns.failure_report is not None and failures:
+        write_failure_report(ns.failure_report, failures)
+
+    # 実行したジョブのメタデータをサマリインデックスに反映
+    if ns.landmarks[0][0] is not None and ns.landmarks[1]["meta"] and ns.landmarks[0][0].exists():
+        meta_jobs = [kwargs for _, kwargs in args_kwargs_list if kwargs['meta_key'] is not None]
+        update_summary(
+            ns.landmarks[0][0],
+            sidecars=(metadata_path(kwargs['landmarks']) for kwargs in meta_jobs if kwargs['pack_key'] is None),
+            pack_keys=(kwargs['pack_key'] for kwargs in meta_jobs if kwargs['pack_key'] is not None),
+            fsync=ns.landmarks[1]["fsync"]
+        )
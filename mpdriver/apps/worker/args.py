@@ -0,0 +1,83 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+
+from ...core.args_base import subparsers, get_help_action, argparse, AppArgs, HelpFormatter
+from .help import HELP
+
+command = Path(__file__).parent.name
+parser = subparsers.add_parser(command, add_help=False, formatter_class=HelpFormatter)
+parser.set_defaults(command=command)
+parser._add_action(get_help_action(
+    url='https://github.com/plumiume/MPDriver3/blob/main/mpdriver/apps/worker/README.md'
+))
+"""
+    mpdriver run src -l path/to/lm --serve-jobs 0.0.0.0:50000 --authkey KEY
+    mpdriver worker --connect host:50000 --authkey KEY -p 8
+    ==> コーディネータのジョブを借りて実行
+"""
+
+class WorkerArgs(AppArgs):
+    command = command
+    'コマンド名'
+    connect: str = parser.add_argument(
+        '--connect', '-C', type=str, required=True, metavar='HOST:PORT',
+        help=HELP['apps.worker.args:connect']
+    )
+    'コーディネータのアドレス'
+    cpu: int | None = parser.add_argument(
+        '--cpu', '-p', type=int, default=None,
+        help=HELP['apps.worker.args:cpu']
+    )
+    threads: int = parser.add_argument(
+        '--threads', type=int, default=0,
+        help=HELP['apps.worker.args:threads']
+    )
+    'ワーカあたりのスレッド数'
+    pin: bool = parser.add_argument(
+        '--pin', action=argparse._StoreTrueAction,
+        help=HELP['apps.worker.args:pin']
+    )
+    'ワーカをコアに固定する'
+    max_tasks: int = parser.add_argument(
+        '--max-tasks', type=int, default=0,
+        help=HELP['apps.worker.args:max_tasks']
+    )
+    'ワーカを入れ替えるまでのジョブ数'
+    timeout: float | None = parser.add_argument(
+        '--timeout', type=float, default=None,
+        help=HELP['apps.worker.args:timeout']
+    )
+    'ジョブの制限時間 [s] (None ならコーディネータの値)'
+    memory_budget: int | None = parser.add_argument(
+        '--memory-budget', type=int, default=None,
+        help=HELP['apps.worker.args:memory_budget']
+    )
+    'メモリの予算 [MiB] (None ならコーディネータの値)'
+    authkey: str | None = parser.add_argument(
+        '--authkey', type=str, default=None,
+        help=HELP['apps.worker.args:authkey']
+    )
+    'コーディネータとの認証キー'
+    name: str | None = parser.add_argument(
+        '--name', type=str, default=None,
+        help=HELP['apps.worker.args:name']
+    )
+    'ワーカの名前'
+    wait: float = parser.add_argument(
+        '--wait', type=float, default=60,
+        help=HELP['apps.worker.args:wait']
+    )
+    'コーディネータの起動を待つ時間 [s]'
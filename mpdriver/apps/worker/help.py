@@ -0,0 +1,27 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+HELP = {
+    'apps.worker.args:connect': 'コーディネータ (mpdriver run --serve-jobs) のアドレス HOST:PORT',
+    'apps.worker.args:cpu': 'マルチプロセスの数を設定する．指定しない場合は使えるコア数 (cgroup のクォータを含む) から決め，0 ならシングルプロセスで動作します',
+    'apps.worker.args:threads': 'ワーカあたりの OpenCV，BLAS，デコーダのスレッド数．0 ならコア数をワーカで等分する (%(default)s)',
+    'apps.worker.args:pin': 'ワーカを重ならないコアの組に固定する',
+    'apps.worker.args:max_tasks': 'ワーカがこの数のジョブを実行したら新しいプロセスに入れ替える．0 なら入れ替えない (%(default)s)',
+    'apps.worker.args:timeout': 'この時間 [s] を超えたジョブのワーカを強制終了し，失敗として報告する．0 なら制限しない．指定しない場合はコーディネータの --timeout',
+    'apps.worker.args:memory_budget': '推定メモリの合計がこの値 [MiB] に収まる分だけジョブを借りる．0 なら制限しない．指定しない場合はコーディネータの --memory-budget',
+    'apps.worker.args:authkey': 'コーディネータとの認証キー．指定しない場合は環境変数 MPDRIVER_AUTHKEY (どちらかが必要)',
+    'apps.worker.args:name': 'コーディネータに表示するワーカの名前．指定しない場合はホスト名',
+    'apps.worker.args:wait': 'コーディネータの起動を待つ時間 [s] (%(default)s)',
+}
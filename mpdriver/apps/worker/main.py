@@ -0,0 +1,52 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+コーディネータ (`mpdriver run --serve-jobs`) からジョブを借りて実行するアプリ
+
+自分のプロセスプールの空きの分だけジョブを借り，実行中は lease を延長します．
+全てのジョブが終わるか，コーディネータとの接続が切れたら終了します．
+"""
+
+import socket
+import sys
+from multiprocessing import AuthenticationError
+
+from ...core.distributed import connect_board, run_worker, parse_address, resolve_authkey
+from ...core.threads import resolve_workers
+
+from ..run.main import RunExecutor
+
+from .args import WorkerArgs
+
+def app_main(ns: WorkerArgs): # アプリケーションのコマンドラインツール用エントリーポイント
+
+    if (authkey := resolve_authkey(ns.authkey)) is None:
+        print('ERROR:', '--authkey or MPDRIVER_AUTHKEY is required (the key printed by mpdriver run --serve-jobs)')
+        return
+
+    address = parse_address(ns.connect)
+    try:
+        board = connect_board(address, authkey, timeout=ns.wait)
+    except (ConnectionError, AuthenticationError) as e:
+        print('ERROR:', f'cannot connect to the coordinator at {ns.connect}: {e}')
+        return
+
+    completed, failed = run_worker(
+        RunExecutor, board, ns.name or socket.gethostname(),
+        resolve_workers(ns.cpu, ns.threads), threads=ns.threads, pin=ns.pin, max_tasks=ns.max_tasks or None,
+        job_timeout=ns.timeout, memory_budget=None if ns.memory_budget is None else ns.memory_budget << 20
+    )
+
+    print(f"worker: {completed} jobs completed, {failed} failed", file=sys.stderr)
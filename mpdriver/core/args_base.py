@@ -46,6 +46,7 @@ class NArgsAction(argparse.Action):
         self.type_functions = (iter(type[0]), type[1])
         self.type_args_cache = list[Callable[[str], Any]]()
         self.default: tuple[Iterable[Any], Mapping[str, Any]] = default
+        self.item_default = default
 
     def __call__(
         self,
@@ -55,13 +56,22 @@ class NArgsAction(argparse.Action):
         option_strings: list[str]
         ):
 
+        pos_opt: tuple[tuple[Any], dict[str, Any]] | None = getattr(namespace, self.dest, None)
+        setattr(namespace, self.dest, self.parse_values(values, pos_opt))
+
+    def parse_values(
+        self,
+        values: str | list[str],
+        pos_opt: tuple[tuple[Any], dict[str, Any]] | None = None
+        ) -> tuple[tuple[Any], dict[str, Any]]:
+        """`pos_opt` (None の場合は既定値) に `values` を反映した (位置引数, オプション) を返します"""
+
         if isinstance(values, str):
             values = [values]
 
-        pos_opt: tuple[tuple[Any], dict[str, Any]] | None = getattr(namespace, self.dest, None)
         if pos_opt is None:
-            pos = dict(enumerate(self.default[0]))
-            opt = dict(self.default[1])
+            pos = dict(enumerate(self.item_default[0]))
+            opt = dict(self.item_default[1])
         else:
             pos = dict(enumerate(pos_opt[0]))
             opt = pos_opt[1]
@@ -83,7 +93,30 @@ class NArgsAction(argparse.Action):
                 self.type_args_cache.append(tf)
             pos[next(type_kwargs_idx)] = tf(v)
 
-        setattr(namespace, self.dest, (tuple(pos.values()), opt))
+        return tuple(pos.values()), opt
+
+class NArgsAppendAction(NArgsAction):
+    """
+    オプションが現れる毎に，既定値から始めた (位置引数, オプション) をリストに追加します
+
+        -A dst1 mp4 size=640x-1 -A dst2 webm  ->  [((dst1, '.mp4'), {...}), ((dst2, '.webm'), {...})]
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default = list[tuple[tuple[Any], dict[str, Any]]]()
+
+    def __call__(
+        self,
+        parser: argparse.ArgumentParser,
+        namespace: argparse.Namespace,
+        values: str | list[str],
+        option_strings: list[str]
+        ):
+
+        items = list(getattr(namespace, self.dest, None) or [])
+        items.append(self.parse_values(values))
+        setattr(namespace, self.dest, items)
 
 class HelpFormatter(argparse.RawTextHelpFormatter, argparse.RawDescriptionHelpFormatter):
 
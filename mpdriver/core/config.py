@@ -14,6 +14,7 @@
 
 from typing import Iterable, Literal, Callable, TypeVar, overload, Any
 from pathlib import Path
+import hashlib
 import json
 
 _T = TypeVar('_T')
@@ -92,3 +93,8 @@ def decompose_keys(obj_temp, keys: list[str]) -> tuple[dict, Any, int] | tuple[l
         else:
             raise KeyError(f'refered object do not have any children: {obj_temp}')
     return obj_prev, obj_temp, k
+
+def config_hash(*objs: Any, length: int = 16) -> str:
+    '''設定の内容から決まるハッシュ値 (JSONのキー順に依存しない)'''
+    dumped = json.dumps(objs, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(dumped.encode('utf-8')).hexdigest()[:length]
@@ -0,0 +1,542 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+複数のマシンへのジョブの分配 (コーディネータとワーカ)
+
+    coordinator: mpdriver run src -l dst --serve-jobs 0.0.0.0:50000 --authkey KEY
+    worker     : mpdriver worker --connect host:50000 --authkey KEY -p 8   # 何台でも
+
+コーディネータはジョブの一覧を `JobBoard` に載せ，`BaseManager` のサーバプロセスで TCP に公開します．
+ワーカは自分のプロセスプールの空きの分だけジョブを借り (lease)，結果を報告し，実行中は lease を延長 (heartbeat) します．
+期限までに延長されなかった lease (ワーカのマシンが落ちた，ネットワークが切れた) のジョブは他のワーカへ再び貸し出します．
+
+ジョブの引数 (入力と出力のパス) はそのまま送るため，全てのマシンで同じパスに同じストレージをマウントしておきます．
+通信は pickle なので，信頼できるネットワークでだけ使ってください．
+認証キーを知っていれば任意のコードを実行できるため，既定のキーは持たず，指定がなければコーディネータが乱数で作ります．
+"""
+
+import os
+import secrets
+import socket
+import sys
+import time
+from concurrent.futures import Future, wait, FIRST_COMPLETED, process
+from multiprocessing.managers import BaseManager
+from threading import Condition, Event, Thread
+from typing import Any, Callable, Iterable, Iterator, Mapping, MutableMapping, Sequence
+
+from .main_base import AppExecutor, JobFailure, JobTimeout, PROGRESS_DESC_PREFIX, describe_error, format_failures, kill_process
+from .progress import TqdmSingle
+
+DEFAULT_LEASE = 60.
+CONNECT_TIMEOUT = 60.
+DONE_GRACE = 2.
+"全てのジョブが終わってから，コーディネータを止めるまでの時間 [s]"
+
+ArgsKwargs = tuple[Iterable[Any], Mapping[str, Any]]
+
+def parse_address(address: str, default_host: str = "localhost") -> tuple[str, int]:
+    """"host:port" (host は省略できる) を (host, port) にします"""
+
+    host, sep, port = address.rpartition(":")
+    if not sep:
+        raise ValueError(f"invalid address '{address}' (host:port)")
+    return host.strip("[]") or default_host, int(port)
+
+def resolve_authkey(authkey: str | None) -> str | None:
+    """認証キー: 引数，環境変数 MPDRIVER_AUTHKEY の順 (どちらもなければ None)"""
+    return authkey or os.environ.get("MPDRIVER_AUTHKEY") or None
+
+class JobBoard:
+    """
+    コーディネータのジョブの一覧と lease
+
+    メソッドはマネージャのスレッドからワーカ毎に並行して呼ばれるため，全て `condition` の下で状態を変更します．
+    サーバプロセスへは pickle で渡すため，`condition` は渡した先で作り直します．
+    """
+
+    def __init__(
+        self,
+        jobs: Sequence[ArgsKwargs],
+        order: Sequence[int] | None = None,
+        appbase_args: Iterable[Any] = (),
+        lease: float = DEFAULT_LEASE,
+        retries: int = 0,
+        retry_backoff: float = 1.,
+        footprints: Sequence[float] | None = None,
+        job_timeout: float | None = None,
+        memory_budget: float | None = None
+        ):
+        """
+        Args:
+            footprints: ジョブ毎の推定メモリ [byte]
+            job_timeout, memory_budget: ワーカが指定しなかった場合の制限時間 [s] とメモリの予算 [byte]
+        """
+
+        self.jobs = list(jobs)
+        self.appbase_args = tuple(appbase_args)
+        self.lease = lease
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.footprints = [0.] * len(self.jobs) if footprints is None else list(footprints)
+        self.job_timeout = job_timeout
+        self.memory_budget = memory_budget
+
+        self.condition = Condition()
+        self.pending = list(range(len(self.jobs)) if order is None else order)
+        self.ready_at = dict[int, float]()
+        self.leases = dict[int, tuple[str, float]]()
+        "ジョブ毎の (ワーカ, 期限)"
+        self.attempts = dict[int, int]()
+        self.finished = set[int]()
+        self.failures = list[JobFailure]()
+        self.outcomes = list[tuple[int, tuple[Any, float] | JobFailure]]()
+        "まだ `drain` していない結果"
+        self.workers = dict[str, float]()
+        "ワーカ毎の最後の通信の時刻"
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["condition"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]):
+        self.__dict__.update(state)
+        self.condition = Condition()
+
+    # ワーカから呼ばれるメソッド
+
+    def register(self, name: str) -> str:
+        with self.condition:
+            worker_id = f"{name}#{len(self.workers)}"
+            self.workers[worker_id] = time.monotonic()
+            return worker_id
+
+    def spec(self) -> dict[str, Any]:
+        """ワーカがアプリを作成するための引数，lease の期間，既定の制限時間とメモリの予算"""
+        return {
+            "appbase_args": self.appbase_args, "lease": self.lease,
+            "job_timeout": self.job_timeout, "memory_budget": self.memory_budget
+        }
+
+    def acquire(self, worker_id: str, n: int, budget: float = float("inf"), idle: bool = False) -> list[tuple[int, ArgsKwargs, float]]:
+        """
+        推定メモリの合計が `budget` に収まる最大 `n` 個のジョブを (インデックス, 引数, 推定メモリ) で借ります
+
+        先頭のジョブが収まらない場合は，後ろの収まるジョブを先に貸します．`idle` (何も実行していない) なら予算を超えるジョブでも1つは貸します．
+        """
+
+        with self.condition:
+            now = time.monotonic()
+            self.workers[worker_id] = now
+            leased = list[tuple[int, ArgsKwargs, float]]()
+            for i in self.pending:
+                if len(leased) >= n: break
+                if self.ready_at.get(i, 0.) > now: continue
+                if self.footprints[i] > budget and not (idle and not leased): continue
+                leased.append((i, self.jobs[i], self.footprints[i]))
+                budget -= self.footprints[i]
+            for i, _, _ in leased:
+                self.pending.remove(i)
+                self.leases[i] = (worker_id, now + self.lease)
+            return leased
+
+    def heartbeat(self, worker_id: str, indices: Iterable[int]) -> list[int]:
+        """
+        実行中のジョブの lease を延長します
+
+        Returns:
+            list[int]: 延長できなかった (期限切れで他のワーカへ貸し出した，または終わった) ジョブ
+        """
+
+        with self.condition:
+            now = time.monotonic()
+            self.workers[worker_id] = now
+            lost = list[int]()
+            for i in indices:
+                if self.leases.get(i, (None,))[0] == worker_id:
+                    self.leases[i] = (worker_id, now + self.lease)
+                else:
+                    lost.append(i)
+            return lost
+
+    def complete(self, worker_id: str, i: int, seconds: float):
+        with self.condition:
+            self.workers[worker_id] = time.monotonic()
+            if i in self.finished: return # 期限切れの後に他のワーカも実行した
+            self._release(i)
+            self.finished.add(i)
+            self.outcomes.append((i, (None, seconds)))
+            self.condition.notify_all()
+
+    def fail(self, worker_id: str, i: int, error: str):
+        with self.condition:
+            self.workers[worker_id] = time.monotonic()
+            if self.leases.get(i, (None,))[0] != worker_id: return # 期限切れで他のワーカへ貸し出した
+            self._release(i)
+            self.attempts[i] = self.attempts.get(i, 0) + 1
+            if self.attempts[i] <= self.retries: # 待ち時間を倍にしながら再び貸し出す
+                self.ready_at[i] = time.monotonic() + self.retry_backoff * 2 ** (self.attempts[i] - 1)
+                self.pending.insert(0, i)
+                return
+            failure = JobFailure(i, self.jobs[i], self.attempts[i], error)
+            self.failures.append(failure)
+            self.finished.add(i)
+            self.outcomes.append((i, failure))
+            self.condition.notify_all()
+
+    def done(self) -> bool:
+        """全てのジョブが終わった (ワーカは終了してよい)"""
+        with self.condition:
+            return len(self.finished) == len(self.jobs)
+
+    # コーディネータで呼ぶメソッド
+
+    def _release(self, i: int):
+        self.leases.pop(i, None)
+        if i in self.pending:
+            self.pending.remove(i)
+
+    def expire(self) -> list[int]:
+        """期限切れの lease のジョブを先頭に戻します (回数には数えない)"""
+
+        with self.condition:
+            now = time.monotonic()
+            expired = [i for i, (_, deadline) in self.leases.items() if deadline < now]
+            for i in expired:
+                del self.leases[i]
+            self.pending[:0] = sorted(expired)
+            return expired
+
+    def drain(self, timeout: float) -> list[tuple[int, tuple[Any, float] | JobFailure]]:
+        """前回から終わったジョブの (インデックス, 結果と所要時間，または `JobFailure`) を返します"""
+
+        with self.condition:
+            if not self.outcomes:
+                self.condition.wait(timeout)
+            outcomes, self.outcomes = self.outcomes, []
+            return outcomes
+
+    def active_workers(self) -> int:
+        with self.condition:
+            deadline = time.monotonic() - self.lease
+            return sum(seen >= deadline for seen in self.workers.values())
+
+    def failed(self) -> list[JobFailure]:
+        """再実行しても失敗したジョブ"""
+        with self.condition:
+            return list(self.failures)
+
+_board: JobBoard | None = None
+"サーバプロセスの `JobBoard`"
+
+def _set_board(board: JobBoard):
+    global _board
+    _board = board
+
+def _get_board() -> JobBoard:
+    assert _board is not None
+    return _board
+
+_BOARD_METHODS = ("register", "spec", "acquire", "heartbeat", "complete", "fail", "done")
+
+class _BoardServer(BaseManager): pass
+_BoardServer.register("board", callable=_get_board, exposed=(*_BOARD_METHODS, "expire", "drain", "active_workers", "failed"))
+
+class _BoardClient(BaseManager): pass
+_BoardClient.register("board", exposed=_BOARD_METHODS)
+
+def serve_jobs(
+    board: JobBoard,
+    address: tuple[str, int],
+    authkey: str | None,
+    on_complete: Callable[[int, tuple[Any, float] | JobFailure], None] | None = None
+    ) -> list[JobFailure]:
+    """
+    `board` のジョブを `address` で公開し，全てのジョブが終わるまで進捗を表示します
+
+    `board` はマネージャのサーバプロセスへ複製して公開し，このプロセスからはプロキシで結果を受け取ります．
+    `authkey` が None の場合は乱数で作り，ワーカに渡せるように表示します．
+
+    Returns:
+        list[JobFailure]: 再実行しても失敗したジョブ
+    """
+
+    if authkey is None:
+        authkey = secrets.token_hex(16)
+        print(f"authkey: {authkey} (give it to workers with --authkey or MPDRIVER_AUTHKEY)", file=sys.stderr)
+
+    manager = _BoardServer(address, authkey.encode("utf-8"))
+    manager.start(_set_board, (board,))
+    total = len(board.jobs)
+
+    try:
+        served = manager.board()
+        host, port = manager.address
+        if host in ("", "0.0.0.0", "::"):
+            host = socket.gethostname()
+        print(f"serving {total} jobs at {host}:{port} (lease {board.lease:g}s)", file=sys.stderr, flush=True)
+
+        def outcomes() -> Iterator[tuple[int, tuple[Any, float] | JobFailure]]:
+            remaining = total
+            while remaining:
+                served.expire()
+                for outcome in served.drain(1.):
+                    remaining -= 1
+                    yield outcome
+                progress.set_postfix_str(f"{served.active_workers()} workers", refresh=False)
+
+        progress = TqdmSingle.tqdm(
+            outcomes(),
+            total=total,
+            desc=f'\033[46m{PROGRESS_DESC_PREFIX.format("Serving...")}\033[0m',
+            bar_format="{desc}: {percentage:6.2f}%|{bar}{r_bar}\033[0J",
+            colour="cyan"
+        )
+
+        try:
+            for i, outcome in progress:
+                if on_complete is not None:
+                    on_complete(i, outcome)
+        finally:
+            failures, done = served.failed(), served.done()
+            if failures:
+                progress.colour = "yellow"
+                progress.set_description_str(f'\033[43m{PROGRESS_DESC_PREFIX.format(f"{len(failures)} failed")}\033[0m')
+            elif done:
+                progress.colour = "green"
+                progress.set_description_str(f'\033[42m{PROGRESS_DESC_PREFIX.format("Completed")}\033[0m')
+            progress.close()
+            if done:
+                time.sleep(DONE_GRACE) # 待機中のワーカが終了を知るまで待つ
+
+    finally:
+        manager.shutdown() # 残りのワーカは接続が切れたら終了する
+
+    if failures:
+        print(file=sys.stderr)
+        print(format_failures(failures, total), file=sys.stderr)
+
+    return failures
+
+def connect_board(address: tuple[str, int], authkey: str, timeout: float = CONNECT_TIMEOUT) -> Any:
+    """コーディネータに接続し，`JobBoard` のプロキシを返します (起動を `timeout` 秒まで待つ)"""
+
+    deadline = time.monotonic() + timeout
+    while True:
+        client = _BoardClient(address, authkey.encode("utf-8"))
+        try:
+            client.connect()
+            return client.board()
+        except ConnectionError:
+            if time.monotonic() > deadline: raise
+            time.sleep(1.)
+
+def _reply(value: Any) -> Any:
+    """停止したマネージャは新しい接続に None を返すことがあるため，コーディネータの終了として扱います"""
+    if value is None:
+        raise EOFError("the coordinator has stopped")
+    return value
+
+def _run_in_thread(fn: Callable[..., Any], *args: Any) -> Future[Any]:
+    """`fn` をデーモンスレッドで実行します (制限時間を超えて止められないジョブが，終了を妨げないように)"""
+
+    future = Future[Any]()
+    def target():
+        if not future.set_running_or_notify_cancel(): return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+    Thread(target=target, daemon=True).start()
+    return future
+
+def run_worker(
+    executor_type: type[AppExecutor[Any]],
+    board: Any,
+    name: str,
+    cpu: int | None,
+    job_timeout: float | None = None,
+    memory_budget: float | None = None,
+    **executor_kwargs: Any
+    ) -> tuple[int, int]:
+    """
+    コーディネータからジョブを借りて実行し，結果を報告します．全てのジョブが終わるか，接続が切れたら戻ります
+
+    - `cpu` 個のワーカのプール (None ならこのプロセスの1つのスレッド) が空いていて，推定メモリの合計が
+      `memory_budget` [byte] に収まる分だけ借ります．何も実行していない場合は，予算を超えるジョブでも1つは借ります．
+    - 制限時間 `job_timeout` [s] を超えたジョブは失敗として報告し，プールのワーカを強制終了して作り直します．
+      巻き込まれた他のジョブは，このワーカで回数に数えずに再実行します．
+      スレッドで実行している場合は強制終了できないため，lease の延長をやめて失敗を報告し，終わるまで次のジョブを借りません．
+    - ワーカが原因不明で終了した場合は，実行中だったジョブを1つずつ単独で再実行し，単独で終了させたジョブだけを失敗として報告します．
+
+    `job_timeout` と `memory_budget` が None の場合はコーディネータの値を使います (0 なら制限しない)．
+
+    Returns:
+        tuple[int, int]: このワーカで完了したジョブと失敗したジョブの数
+    """
+
+    spec = board.spec()
+    job_timeout = (spec["job_timeout"] if job_timeout is None else job_timeout) or None
+    budget = (spec["memory_budget"] if memory_budget is None else memory_budget) or float("inf")
+    worker_id = board.register(name)
+    executor = executor_type(cpu, spec["appbase_args"], job_timeout=job_timeout, **executor_kwargs)
+    local = executor.multi_process_dict is None
+    started: MutableMapping[int, tuple[int | None, float]] = {} if local else executor.multi_process_dict["manager"].dict()
+    "実行中のジョブ毎の (ワーカの pid, 開始時刻)"
+    slots = cpu or 1
+
+    Job = tuple[int, ArgsKwargs, float]
+    running = dict[Future[tuple[Any, float]], Job]()
+    in_use = 0.
+    queued = list[Job]()
+    "借りたが，まだ投入していないジョブ (他のジョブの強制終了に巻き込まれたジョブを含む)"
+    suspects = list[Job]()
+    "プールが原因不明で壊れたときに実行中だったジョブ (1つずつ単独で再実行する)"
+    timed_out = set[int]()
+    abandoned = set[Future[tuple[Any, float]]]()
+    "制限時間を超えたが，スレッドなので止められないジョブ"
+    crashed: int | None = None
+    "プールが壊れたときに実行中だったジョブの数"
+    holding = list[int]()
+    "lease を延長するジョブ (メインのスレッドで作り直す)"
+    stop = Event()
+
+    def submit(job: Job):
+        nonlocal in_use
+        if local:
+            future = _run_in_thread(executor._timed_job, job[1])
+            started[job[0]] = (None, time.time())
+        else:
+            future = executor._submit(executor._tracked_job, job[0], job[1], started)
+        running[future] = job
+        in_use += job[2]
+
+    def report_failure(i: int, error: BaseException):
+        nonlocal failed
+        board.fail(worker_id, i, describe_error(error))
+        failed += 1
+
+    def heartbeat(): # 実行中は lease の期間の 1/3 毎に延長する
+        while not stop.wait(spec["lease"] / 3):
+            try:
+                for i in _reply(board.heartbeat(worker_id, holding)):
+                    print(f"lease of job {i} expired; it may run on another worker too", file=sys.stderr)
+            except (ConnectionError, EOFError):
+                return
+
+    (heartbeat_thread := Thread(target=heartbeat, daemon=True)).start()
+    completed = failed = 0
+
+    try:
+        while True:
+
+            room = slots - len(running)
+            if not local:
+                if not running and executor._pool_room() <= 0: # ワーカの入れ替え
+                    executor._renew_pool()
+                room = min(room, executor._pool_room())
+            killing = any(job[0] in timed_out for job in running.values())
+            if crashed is None and not killing and not abandoned and room > 0:
+                try:
+                    if suspects:
+                        if not running:
+                            submit(suspects[0])
+                            suspects.pop(0)
+                    else:
+                        if len(queued) < room:
+                            queued += _reply(board.acquire(worker_id, room - len(queued), budget - in_use, not running))
+                        while queued and room > 0:
+                            submit(queued[0])
+                            queued.pop(0)
+                            room -= 1
+                except process.BrokenProcessPool: # ワーカが終了して，既にプールが壊れていた
+                    crashed = len(running)
+            holding = [job[0] for job in (*running.values(), *queued, *suspects) if job[0] not in timed_out]
+
+            if not running:
+                if _reply(board.done()): break
+                if not abandoned:
+                    time.sleep(1.) # 他のワーカが実行中，または再実行の待ち時間
+                    continue
+
+            done, _ = wait(
+                {*running, *abandoned},
+                timeout=1. if job_timeout is None else min(1., job_timeout),
+                return_when=FIRST_COMPLETED
+            )
+            abandoned -= done
+
+            # プールが壊れると，実行中と待ち行列のジョブは全て BrokenProcessPool になる
+            if crashed is None and any(isinstance(future.exception(), process.BrokenProcessPool) for future in done & running.keys()):
+                crashed = len(running)
+            killed = set(timed_out)
+            for future in done & running.keys():
+                job = running.pop(future)
+                in_use -= job[2]
+                started.pop(job[0], None)
+                try:
+                    _, seconds = future.result()
+                    timed_out.discard(job[0]) # 強制終了の直前に終わっていた
+                except process.BrokenProcessPool as e:
+                    executor.app_type.cleanup(*job[1][0], **job[1][1]) # 強制終了したワーカの一時ファイル
+                    if job[0] in killed: # 制限時間を超えて強制終了したジョブ
+                        report_failure(job[0], JobTimeout(f"exceeded {job_timeout}s"))
+                    elif killed: # 他のジョブの強制終了に巻き込まれた
+                        queued.append(job)
+                    elif crashed is not None and crashed > 1: # どのジョブが原因か分からない
+                        suspects.append(job)
+                    else:
+                        report_failure(job[0], e)
+                except Exception as e:
+                    timed_out.discard(job[0])
+                    report_failure(job[0], e)
+                else:
+                    board.complete(worker_id, job[0], seconds)
+                    completed += 1
+
+            # 制限時間を超えたジョブ: プロセスは強制終了し，スレッドは諦めて次のジョブを借りない
+            if job_timeout is not None:
+                deadline = time.time() - job_timeout
+                for future, job in list(running.items()):
+                    if job[0] in timed_out or (entry := started.get(job[0])) is None or entry[1] >= deadline:
+                        continue
+                    if local:
+                        running.pop(future)
+                        in_use -= job[2]
+                        started.pop(job[0], None)
+                        abandoned.add(future)
+                        report_failure(job[0], JobTimeout(f"exceeded {job_timeout}s"))
+                        continue
+                    timed_out.add(job[0])
+                    kill_process(entry[0])
+
+            if crashed is not None and not running: # 壊れたプールを作り直す
+                timed_out.clear()
+                started.clear()
+                crashed = None
+                executor._renew_pool()
+
+    except (ConnectionError, EOFError): # コーディネータが終了した
+        pass
+
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+        for future in running:
+            future.cancel()
+        executor.shutdown()
+
+    return completed, failed
@@ -0,0 +1,230 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+ジョブの台帳 (SQLite)
+
+入力 (パス，サイズ，更新時刻，任意で内容のハッシュ) と設定のハッシュをキーに，ジョブの状態，所要時間，出力を記録します．
+再実行では，完了していて入力と出力が記録と一致するジョブだけを飛ばします．中断したジョブ (pending) はやり直します．
+
+台帳はメインプロセスだけが読み書きします．
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Literal, NamedTuple, TypedDict
+
+LEDGER_VERSION = 1
+HASH_CHUNK = 1 << 20
+
+JobStatus = Literal["pending", "done", "failed"]
+
+class InputIdentity(NamedTuple):
+    path: str
+    "絶対パス"
+    size: int
+    "バイト数 (連続画像の場合はファイルの合計)"
+    mtime: float
+    content_hash: str | None = None
+
+class LedgerOutput(TypedDict):
+    path: str
+    "ファイル，ディレクトリ，または pack のディレクトリ"
+    size: int | None
+    "ファイルのバイト数 (ディレクトリは None)"
+    key: str | None
+    "pack のキー"
+
+class LedgerEntry(NamedTuple):
+    identity: InputIdentity
+    config: str
+    status: JobStatus
+    attempts: int
+    seconds: float | None
+    error: str | None
+    outputs: list[LedgerOutput]
+    updated: float
+
+def _files(src: Path) -> list[Path]:
+    return [src] if src.is_file() else sorted(p for p in src.iterdir() if p.is_file())
+
+def content_hash(src: Path) -> str:
+    """入力の内容の SHA-1 (連続画像の場合はファイル名と内容を順に)"""
+
+    digest = hashlib.sha1()
+    for path in _files(src):
+        if path != src:
+            digest.update(path.name.encode("utf-8"))
+        with open(path, "rb") as fp:
+            while chunk := fp.read(HASH_CHUNK):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def input_identity(src: Path, hash_content: bool = False) -> InputIdentity:
+
+    stats = [p.stat() for p in _files(src)]
+    return InputIdentity(
+        src.resolve().as_posix(),
+        sum(s.st_size for s in stats),
+        max((s.st_mtime for s in stats), default=0.),
+        content_hash(src) if hash_content else None
+    )
+
+def file_output(path: Path) -> LedgerOutput:
+    return LedgerOutput(path=path.resolve().as_posix(), size=path.stat().st_size if path.is_file() else None, key=None)
+
+def pack_output(root: Path, key: str) -> LedgerOutput:
+    return LedgerOutput(path=root.resolve().as_posix(), size=None, key=key)
+
+class JobLedger:
+    """
+    ジョブの台帳
+
+        ledger = JobLedger("runs.sqlite")
+        if not ledger.is_done(identity, config, pack_keys):
+            ledger.pending(identity, config)
+            ... # 実行
+            ledger.done(identity, config, seconds, outputs)
+    """
+
+    def __init__(self, path: Path):
+
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] == 0:
+            with self.connection:
+                self.connection.execute("""
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        path TEXT NOT NULL,
+                        config TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        mtime REAL NOT NULL,
+                        content_hash TEXT,
+                        status TEXT NOT NULL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        seconds REAL,
+                        error TEXT,
+                        outputs TEXT NOT NULL DEFAULT '[]',
+                        updated REAL NOT NULL,
+                        PRIMARY KEY (path, config)
+                    )
+                """)
+                self.connection.execute(f"PRAGMA user_version = {LEDGER_VERSION}")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get(self, path: str, config: str) -> LedgerEntry | None:
+
+        row = self.connection.execute(
+            "SELECT path, size, mtime, content_hash, config, status, attempts, seconds, error, outputs, updated "
+            "FROM jobs WHERE path = ? AND config = ?",
+            (path, config)
+        ).fetchone()
+        if row is None:
+            return None
+        return LedgerEntry(InputIdentity(*row[:4]), *row[4:9], json.loads(row[9]), row[10])
+
+    def entries(self, status: JobStatus | None = None) -> list[LedgerEntry]:
+
+        rows = self.connection.execute("SELECT path, config FROM jobs" + ("" if status is None else " WHERE status = ?"), () if status is None else (status,)).fetchall()
+        return [entry for path, config in rows if (entry := self.get(path, config)) is not None]
+
+    def content_hashes(self) -> dict[tuple[str, int, float], str]:
+        """記録した内容のハッシュ ((パス，サイズ，更新時刻) 毎)．同じ入力を読み直さずに内容のハッシュを求めるために使います"""
+
+        rows = self.connection.execute("SELECT path, size, mtime, content_hash FROM jobs WHERE content_hash IS NOT NULL").fetchall()
+        return {(path, size, mtime): digest for path, size, mtime, digest in rows}
+
+    def _write(self, identity: InputIdentity, config: str, status: JobStatus, **values: object):
+
+        columns = {
+            "path": identity.path, "config": config,
+            "size": identity.size, "mtime": identity.mtime, "content_hash": identity.content_hash,
+            "status": status, "updated": time.time()
+        } | values
+        with self.connection:
+            self.connection.execute(
+                f"INSERT INTO jobs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT (path, config) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in columns)}",
+                tuple(columns.values())
+            )
+
+    def pending(self, identity: InputIdentity, config: str):
+        """ジョブの投入を記録します．完了の記録がなければ，次の実行でやり直します"""
+        self._write(identity, config, "pending", seconds=None, error=None, outputs="[]")
+
+    def done(self, identity: InputIdentity, config: str, seconds: float, outputs: Iterable[LedgerOutput]):
+        self._write(identity, config, "done", seconds=seconds, error=None, outputs=json.dumps(list(outputs)))
+
+    def failed(self, identity: InputIdentity, config: str, error: str, attempts: int):
+        self._write(identity, config, "failed", attempts=attempts, error=error)
+
+    def is_done(
+        self,
+        identity: InputIdentity,
+        config: str,
+        pack_keys: dict[str, set[str]] = {},
+        hash_content: bool = False
+        ) -> bool:
+        """
+        完了していて，入力と出力が記録と一致するかを返します
+
+        入力はサイズと更新時刻で比較し，一致しない場合は `hash_content` なら内容のハッシュで比較します．
+        出力は全てのファイルのサイズ (pack はインデックスのキー) を確認します．
+
+        Args:
+            pack_keys: pack のディレクトリ (絶対パス) 毎のキー
+        """
+
+        if (entry := self.get(identity.path, config)) is None or entry.status != "done":
+            return False
+
+        if (entry.identity.size, entry.identity.mtime) != (identity.size, identity.mtime):
+            if not hash_content or entry.identity.content_hash is None:
+                return False
+            if entry.identity.content_hash != (identity.content_hash or content_hash(Path(identity.path))):
+                return False
+            touched = True
+        else:
+            touched = False
+
+        for output in entry.outputs:
+            path = Path(output["path"])
+            if output["key"] is not None:
+                if output["key"] not in pack_keys.get(output["path"], ()): return False
+            elif not path.exists():
+                return False
+            elif output["size"] is not None and (not path.is_file() or path.stat().st_size != output["size"]):
+                return False
+
+        if touched: # 内容が同じなので，次からはサイズと更新時刻で比較できるようにする
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE jobs SET size = ?, mtime = ? WHERE path = ? AND config = ?",
+                    (identity.size, identity.mtime, identity.path, config)
+                )
+
+        return True
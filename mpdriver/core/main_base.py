@@ -12,19 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import sys
+import time
 from typing import *
 from types import FrameType
 from itertools import *
+from collections import Counter, deque
 import warnings
 import signal
-from threading import Thread, main_thread, Event
+from threading import Thread, current_thread, main_thread, Event
 from multiprocessing.managers import SyncManager as Manager      # static analysis
-from multiprocessing.synchronize import RLock                    # static analysis
-from multiprocessing import Manager as _Manager, RLock as _RLock # actual import
-from concurrent.futures import ProcessPoolExecutor, InvalidStateError, process
+from multiprocessing import Manager as _Manager                  # actual import
+from multiprocessing.context import BaseContext
+from multiprocessing.util import Finalize
+from concurrent.futures import ProcessPoolExecutor, InvalidStateError, Future, process, as_completed, wait, FIRST_COMPLETED
 
 from .progress import TqdmKwargs, Tqdm, TqdmSingle, TqdmHost, TqdmClient
+from .schedule import ScheduleReport, plan_schedule, schedule_report
+from .threads import ThreadBudget, plan_thread_budgets, apply_thread_budget
 
 _T = TypeVar("_T")
 _P = ParamSpec("_P")
@@ -80,6 +86,10 @@ class Verbose:
 class SharedDict(TypedDict): # For All Process
     tqdm_clients: list[TqdmClient]
     sigint_event: Event
+    thread_budgets: list[ThreadBudget]
+    recycle: bool
+    workers: dict[int, None]
+    "現在のプールで起動しているワーカの pid"
 
 class MultiProcessDict(TypedDict): # For Main Process
     manager: Manager
@@ -87,6 +97,59 @@ class MultiProcessDict(TypedDict): # For Main Process
     shared: SharedDict
     pool: ProcessPoolExecutor
 
+class JobCancelled(Exception):
+    """ジョブが外部から (`cancel_event` で) 取り消された"""
+
+class JobTimeout(Exception):
+    """ジョブが制限時間 (`job_timeout`) を超えた"""
+
+class JobFailure(NamedTuple):
+    """再実行しても失敗したジョブ"""
+    index: int
+    "投入順のインデックス"
+    args_kwargs: tuple[Iterable[Any], Mapping[str, Any]]
+    attempts: int
+    error: str
+    "例外の型とメッセージ"
+
+def describe_error(error: BaseException) -> str:
+    return f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+
+def format_failures(failures: Sequence[JobFailure], total: int) -> str:
+    """失敗したジョブの一覧 (ジョブの最初の引数，試行回数，例外)"""
+
+    lines = [f"{len(failures)} of {total} jobs failed:"]
+    for failure in sorted(failures, key=lambda f: f.index):
+        args = list(failure.args_kwargs[0])
+        lines.append(f"  {args[0] if args else failure.index}")
+        lines.append(f"    {failure.error} (attempts: {failure.attempts})")
+    return "\n".join(lines)
+
+def _give_back(shared_list: list[_T], item: _T):
+    """終了するワーカが借りていたものを返します (マネージャが先に終了している場合は何もしない)"""
+    try:
+        shared_list.append(item)
+    except Exception:
+        pass
+
+def _forget_worker(workers: dict[int, None], pid: int):
+    try:
+        workers.pop(pid, None)
+    except Exception:
+        pass
+
+def kill_process(pid: int):
+    """プロセスを強制終了します (既に終了している場合は何もしない)"""
+    try: os.kill(pid, signal.SIGKILL if hasattr(signal, "SIGKILL") else signal.SIGTERM)
+    except OSError: pass
+
+def cancellable(iterable: Iterable[_T], event: Event) -> Iterator[_T]:
+    """要素を取り出す前に `event` を確認し，セットされていれば `JobCancelled` を送出します"""
+    for item in iterable:
+        if event.is_set():
+            raise JobCancelled
+        yield item
+
 class AppBase:
 
     def __init__(self, *args, **kwargs):
@@ -95,6 +158,11 @@ class AppBase:
     def run(self, *args, **kwargs):
         raise NotImplementedError
 
+    @classmethod
+    def cleanup(cls, *args, **kwargs):
+        """強制終了した (後片付けをせずに終わった) `run` の一時ファイルを，同じ引数で削除します"""
+        pass
+
 _AB = TypeVar("_AB", bound=AppBase)
 
 class AppWorkerThread(Thread, Generic[_AB]): # For Sub Process
@@ -102,7 +170,6 @@ class AppWorkerThread(Thread, Generic[_AB]): # For Sub Process
     app_process: _AB
     tqdm_handler: TqdmSingle | TqdmClient
     sigint_event: Event
-    rlock: RLock
 
     @classmethod
     def get_thread(cls) -> Self:
@@ -120,7 +187,7 @@ class AppExecutor(Generic[_AB]): # For Main Process
     def _sigint_handler(thread: AppWorkerThread[_AB]):
 
         def handler(signum: int, frame: FrameType):
-            thread.rlock.acquire()
+            # 出力は一時ファイルへ書いてから置き換えるため，書き込み途中で終了しても不完全なファイルは残らない
             thread.sigint_event.set()
 
         return handler
@@ -130,69 +197,170 @@ class AppExecutor(Generic[_AB]): # For Main Process
         if self.multi_process_dict is None: return
 
         shared = self.multi_process_dict["shared"]
-        pool = self.multi_process_dict["pool"]
 
         shared["sigint_event"].wait()
+        if not shared["sigint_kill"]: return # 正常に終わった
 
-        if pool._processes is None: return
-        for p in pool._processes.values():
-            if p.is_alive():
-                p.kill()
+        for pid in list(shared["workers"].keys()): # プールを作り直している場合があるため，その時点のワーカ
+            kill_process(pid)
     
-    def _sigint_deleter(self):
+    def _sigint_reset(self):
+
+        if self.multi_process_dict is None: return
+
+        shared = self.multi_process_dict["shared"]
+        shared["sigint_kill"] = True
+        shared["sigint_event"].clear()
+
+    def _sigint_deleter(self, kill: bool):
+        """`_sigint_manager` を終了します．`kill` ならワーカを強制終了し，そうでなければプールを次の `execute` で使えるように残します"""
 
         if self.multi_process_dict is None: return
 
-        self.multi_process_dict["shared"]["sigint_event"].set()
+        shared = self.multi_process_dict["shared"]
+        shared["sigint_kill"] = kill
+        shared["sigint_event"].set()
     
     @classmethod
-    def _signle_init(cls, io_rock: RLock, appbase_args: Iterable[Any] = (), appbase_kwargs: Mapping[str, Any] = {}):
+    def _signle_init(cls, appbase_args: Iterable[Any] = (), appbase_kwargs: Mapping[str, Any] = {}):
 
         thread = AppWorkerThread[_AB].get_thread()
         thread.app_process = cls.app_type(*appbase_args, **appbase_kwargs)
-        thread.rlock = io_rock
         thread.tqdm_handler = TqdmSingle
     
     @classmethod
-    def _multi_init(cls, io_lock: RLock, shared: SharedDict, appbase_args: Iterable[Any] = (), appbase_kwargs: Mapping[str, Any] = {}):
+    def _multi_init(cls, shared: SharedDict, appbase_args: Iterable[Any] = (), appbase_kwargs: Mapping[str, Any] = {}):
 
         warnings.filterwarnings("ignore", category=UserWarning)
 
+        # スレッド数とアフィニティはアプリ (MediaPipe のグラフ) を作る前に設定する
+        budget = shared["thread_budgets"].pop()
+        apply_thread_budget(budget)
+
         thread = AppWorkerThread[_AB].get_thread()
         thread.app_process = cls.app_type(*appbase_args, **appbase_kwargs)
         thread.sigint_event = shared["sigint_event"]
-        thread.rlock = io_lock
         thread.tqdm_handler = shared["tqdm_clients"].pop()
         signal.signal(signal.SIGINT, cls._sigint_handler(thread))
 
-    def __init__(self, cpu: int | None = None, appbase_args: Iterable[Any] = (), appbase_kwargs: Mapping[str, Any] = {}):
+        workers = shared["workers"]
+        workers[os.getpid()] = None
+        Finalize(thread, _forget_worker, (workers, os.getpid()), exitpriority=10)
 
-        self.io_lock = _RLock()
+        if shared["recycle"]: # 入れ替わりで起動するワーカのために，終了時に返す
+            Finalize(thread, _give_back, (shared["thread_budgets"], budget), exitpriority=10)
+            Finalize(thread, _give_back, (shared["tqdm_clients"], thread.tqdm_handler), exitpriority=10)
+
+    def __init__(
+        self,
+        cpu: int | None = None,
+        appbase_args: Iterable[Any] = (),
+        appbase_kwargs: Mapping[str, Any] = {},
+        mp_context: BaseContext | None = None,
+        threads: int = 0,
+        pin: bool = False,
+        max_tasks: int | None = None,
+        memory_budget: float | None = None,
+        retries: int = 0,
+        retry_backoff: float = 1.,
+        job_timeout: float | None = None
+        ):
+        """
+        Args:
+            cpu: ワーカのプロセス数．None ならこのプロセスで実行する
+            threads: ワーカあたりの OpenCV，BLAS，デコーダのスレッド数．0 ならコア数をワーカで等分する
+            pin: ワーカを重ならないコアの組に固定する
+            max_tasks: ワーカがこの数のジョブを実行したら，新しいプロセス (`_multi_init` から) に入れ替える
+            memory_budget: 同時に投入するジョブの推定メモリ [byte] の合計の上限 (`execute` の `footprints`)
+            retries: 失敗したジョブを再実行する回数
+            retry_backoff: 再実行までの待ち時間 [s]．再実行毎に2倍になる
+            job_timeout: ジョブの制限時間 [s]．超えたジョブのワーカは強制終了して入れ替える
+        """
+
+        self.cpu = cpu
+        self.max_tasks = max_tasks
+        self.memory_budget = memory_budget
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.job_timeout = job_timeout
+        self.schedule_report: ScheduleReport | None = None
+        self.failures = list[JobFailure]()
+        self._pool_jobs = 0
+        "現在のプールへ投入したジョブの数"
 
         if cpu is None:
 
-            self.multi_process_dict = self._signle_init(self.io_lock, appbase_args, appbase_kwargs)
+            if threads > 0:
+                apply_thread_budget(ThreadBudget(threads, None))
+            self.multi_process_dict = self._signle_init(appbase_args, appbase_kwargs)
             self._map_func = map
             self._tqdm_func = TqdmSingle.tqdm
 
         else:
 
+            self._pool_options = (appbase_args, appbase_kwargs, mp_context, threads, pin)
             self.multi_process_dict = MultiProcessDict({
                 "manager": (manager := _Manager()),
                 "tqdm_host": (tqdm_host := TqdmHost(manager)),
-                "shared": (shared := manager.dict({
-                    "tqdm_clients": manager.list([tqdm_host.client() for _ in range(cpu)]),
-                    "sigint_event": manager.Event()
-                })),
-                "pool": (pool := ProcessPoolExecutor(
-                    max_workers = cpu,
-                    initializer = self._multi_init,
-                    initargs = (self.io_lock, shared, appbase_args, appbase_kwargs)
-                ))
+                "shared": manager.dict({
+                    "sigint_event": manager.Event(),
+                    "sigint_kill": True,
+                    "recycle": bool(max_tasks)
+                })
             })
-            self._map_func = pool.map
+            self._new_pool()
             self._tqdm_func = tqdm_host.tqdm
 
+    def _new_pool(self) -> ProcessPoolExecutor:
+        """ワーカのプールを作成します．プログレスバーのクライアントとスレッド数の割り当ても作り直します"""
+
+        appbase_args, appbase_kwargs, mp_context, threads, pin = self._pool_options
+        manager = self.multi_process_dict["manager"]
+        shared = self.multi_process_dict["shared"]
+
+        # 入れ替え中は終了するワーカと新しいワーカが同時に存在するため，予備を用意する
+        slots = self.cpu * 2 if self.max_tasks else self.cpu
+        shared["tqdm_clients"] = manager.list([self.multi_process_dict["tqdm_host"].client() for _ in range(slots)])
+        shared["thread_budgets"] = manager.list(plan_thread_budgets(self.cpu, threads, pin) * (slots // self.cpu))
+        shared["workers"] = manager.dict()
+        self._pool_jobs = 0
+
+        pool = ProcessPoolExecutor(
+            max_workers = self.cpu,
+            initializer = self._multi_init,
+            initargs = (shared, appbase_args, appbase_kwargs),
+            mp_context = mp_context,
+            max_tasks_per_child = self.max_tasks or None # fork 以外 (既定は spawn) で起動する
+        )
+        self.multi_process_dict["pool"] = pool
+        self._map_func = pool.map
+        return pool
+
+    def _submit(self, fn: Callable[..., _T], *args: Any) -> Future[_T]:
+        """現在のプールへジョブを投入します (`_pool_room` のために数える)"""
+
+        self._pool_jobs += 1
+        return self.multi_process_dict["pool"].submit(fn, *args)
+
+    def _pool_room(self) -> float:
+        """
+        現在のプールへ投入できる残りのジョブの数 (`max_tasks` で入れ替えない場合は inf)
+
+        プールは，アイドルのワーカの数え方の都合で `max_tasks_per_child` で終了したワーカを補充しないことがあり，
+        全てのワーカが終了するとジョブが残ったまま止まります．最初のワーカだけで実行できる `cpu * max_tasks` 個まで
+        投入したら，終わるのを待って `_renew_pool` で作り直します．
+        """
+
+        if not self.max_tasks:
+            return float("inf")
+        return self.cpu * self.max_tasks - self._pool_jobs
+
+    def _renew_pool(self) -> ProcessPoolExecutor:
+        """実行中のジョブがないプールを終了し，新しいプールを作成します"""
+
+        self.multi_process_dict["pool"].shutdown(wait=True, cancel_futures=True)
+        return self._new_pool()
+
     @staticmethod
     def _map_job(args_kwargs: tuple[Iterable[Any], Mapping[str, Any]]) -> Any:
 
@@ -200,21 +368,291 @@ class AppExecutor(Generic[_AB]): # For Main Process
 
         except process.BrokenProcessPool: pass
         except InvalidStateError: pass
+
+    @staticmethod
+    def _timed_job(args_kwargs: tuple[Iterable[Any], Mapping[str, Any]]) -> tuple[Any, float]:
+        """`_map_job` の結果と，ワーカ上での所要時間 [s]"""
+
+        start = time.perf_counter()
+        result = AppExecutor._map_job(args_kwargs)
+        return result, time.perf_counter() - start
+
+    @staticmethod
+    def _tracked_job(key: int, args_kwargs: tuple[Iterable[Any], Mapping[str, Any]], started: MutableMapping[int, tuple[int, float]]) -> tuple[Any, float]:
+        """`_timed_job` の実行中，`started` に (ワーカの pid, 開始時刻) を登録します (制限時間の監視用)"""
+
+        started[key] = (os.getpid(), time.time())
+        try:
+            return AppExecutor._timed_job(args_kwargs)
+        finally:
+            started.pop(key, None)
     
+    def as_completed(
+        self,
+        args_kwargs_iter: Iterable[tuple[Iterable[Any], Mapping[str, Any]]]
+        ) -> Iterator[tuple[tuple[Iterable[Any], Mapping[str, Any]], Any]]:
+        """
+        ジョブを投入し，終わった順に (引数, 結果) を返します
+
+        シングルプロセスの場合は順に実行します．途中でイテレータを閉じると，未着手のジョブは取り消されます．
+        """
+
+        if self.multi_process_dict is None:
+            for args_kwargs in args_kwargs_iter:
+                yield args_kwargs, self._map_job(args_kwargs)
+            return
+
+        futures: dict[Future[Any], tuple[Iterable[Any], Mapping[str, Any]]] = {
+            self._submit(self._map_job, args_kwargs): args_kwargs
+            for args_kwargs in args_kwargs_iter
+        }
+
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def create_event(self) -> Event:
+        """ワーカへ渡せるイベントを作成します (マルチプロセスの場合は Manager 経由)"""
+
+        if self.multi_process_dict is None:
+            return Event()
+        return self.multi_process_dict["manager"].Event()
+
+    def shutdown(self):
+        """プロセスプールとプログレスバーのプロセスを終了します"""
+
+        if self.multi_process_dict is None: return
+
+        self.multi_process_dict["pool"].shutdown(wait=True, cancel_futures=True)
+        self.multi_process_dict["tqdm_host"].close()
+        self.multi_process_dict["manager"].shutdown()
+
+    def _retry_or_fail(
+        self,
+        jobs: Sequence[tuple[Iterable[Any], Mapping[str, Any]]],
+        i: int,
+        error: BaseException,
+        attempts: Counter[int],
+        retry_at: dict[int, float]
+        ) -> JobFailure | None:
+        """失敗したジョブを再実行の待ちに入れます．再実行の回数を使い切った場合は `JobFailure` を返します"""
+
+        attempts[i] += 1
+        if attempts[i] <= self.retries:
+            retry_at[i] = time.monotonic() + self.retry_backoff * 2 ** (attempts[i] - 1)
+            return None
+
+        failure = JobFailure(i, jobs[i], attempts[i], describe_error(error))
+        self.failures.append(failure)
+        return failure
+
+    def _run_isolated(
+        self,
+        jobs: Sequence[tuple[Iterable[Any], Mapping[str, Any]]],
+        order: Sequence[int]
+        ) -> Iterator[tuple[int, tuple[Any, float] | JobFailure]]:
+        """
+        シングルプロセスで順に実行し，(インデックス, 結果または `JobFailure`) を返します
+
+        制限時間は SIGALRM が使える場合 (Unix のメインスレッド) だけ有効です．
+        """
+
+        attempts = Counter[int]()
+        retry_at = dict[int, float]()
+        use_alarm = bool(self.job_timeout) and hasattr(signal, "SIGALRM") and current_thread() is main_thread()
+        if self.job_timeout and not use_alarm:
+            print("WARNING:", "job_timeout needs SIGALRM on the main thread; jobs run without a time limit", file=sys.stderr)
+
+        def on_alarm(signum: int, frame: FrameType | None):
+            raise JobTimeout(f"exceeded {self.job_timeout}s")
+
+        pending = deque(order)
+        while pending:
+            i = pending.popleft()
+            if (delay := retry_at.pop(i, 0.) - time.monotonic()) > 0:
+                time.sleep(delay)
+
+            if use_alarm:
+                previous = signal.signal(signal.SIGALRM, on_alarm)
+                signal.setitimer(signal.ITIMER_REAL, self.job_timeout)
+            try:
+                result = self._timed_job(jobs[i])
+            except Exception as e:
+                if (failure := self._retry_or_fail(jobs, i, e, attempts, retry_at)) is not None:
+                    yield i, failure
+                else:
+                    pending.append(i)
+                continue
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+                    signal.signal(signal.SIGALRM, previous)
+
+            yield i, result
+
+    def _schedule(
+        self,
+        jobs: Sequence[tuple[Iterable[Any], Mapping[str, Any]]],
+        order: Sequence[int],
+        footprints: Sequence[float],
+        budget: float
+        ) -> Iterator[tuple[int, tuple[Any, float] | JobFailure]]:
+        """
+        ジョブを `order` の順に投入し，終わった順に (インデックス, 結果または `JobFailure`) を返します
+
+        - 推定メモリの合計が `budget` に収まるジョブだけを投入します．先頭のジョブが収まらない場合は，
+          後ろの収まるジョブを先に投入します．何も実行していない場合は，予算を超えるジョブでも1つは投入します．
+        - 失敗したジョブは待ち時間を倍にしながら `retries` 回まで再実行し，それでも失敗したら記録して続けます．
+        - 制限時間を超えたジョブのワーカは強制終了します．プールは壊れるため作り直し，
+          巻き込まれた他のジョブは回数に数えずに再投入します．
+        - ワーカが原因不明で終了した (e.g. OOM killer) 場合は，実行中だったジョブを回数に数えずに1つずつ単独で再実行し，
+          単独で終了させたジョブだけを失敗と数えます．
+        - `max_tasks` の場合は `_pool_room` の分だけプールへ投入し，実行中のジョブが終わったら作り直します．
+        """
+
+        started: MutableMapping[int, tuple[int, float]] = self.multi_process_dict["manager"].dict()
+        pending = list(order)
+        running = dict[Future[tuple[Any, float]], int]()
+        in_use = 0.
+        attempts = Counter[int]()
+        retry_at = dict[int, float]()
+        timed_out = set[int]()
+        suspects = set[int]() # 原因不明の終了に居合わせたジョブ (単独で実行する)
+        crashed: set[int] | None = None # プールが壊れたときに実行中だったジョブ
+
+        try:
+            while pending or running:
+
+                now = time.monotonic()
+                if crashed is None and not timed_out.intersection(running.values()) and not suspects.intersection(running.values()):
+                    admitted = set[int]()
+                    try:
+                        for i in pending:
+                            if len(running) >= self.cpu * 2: break # プールの待ち行列を長くしても速くならない
+                            if self._pool_room() <= 0: break
+                            if retry_at.get(i, 0.) > now: continue
+                            if i in suspects:
+                                if running: continue
+                                running[self._submit(self._tracked_job, i, jobs[i], started)] = i
+                                in_use += footprints[i]
+                                admitted.add(i)
+                                break
+                            if running and in_use + footprints[i] > budget: continue
+                            running[self._submit(self._tracked_job, i, jobs[i], started)] = i
+                            in_use += footprints[i]
+                            admitted.add(i)
+                    except process.BrokenProcessPool: # ワーカが終了して，既にプールが壊れていた
+                        crashed = set(running.values())
+                    if admitted:
+                        pending = [i for i in pending if i not in admitted]
+
+                if not running and self._pool_room() <= 0: # ワーカの入れ替え
+                    self._renew_pool()
+                    continue
+
+                if not running: # 再実行の待ち時間
+                    time.sleep(max(0., min(retry_at.get(i, 0.) for i in pending) - now) if pending else 0.)
+                    continue
+
+                done, _ = wait(running, timeout=1. if self.job_timeout is None else min(1., self.job_timeout), return_when=FIRST_COMPLETED)
+
+                # プールが壊れると，実行中と待ち行列のジョブは全て BrokenProcessPool になる
+                if crashed is None and any(isinstance(future.exception(), process.BrokenProcessPool) for future in done):
+                    crashed = set(running.values())
+                for future in done:
+                    i = running.pop(future)
+                    in_use -= footprints[i]
+                    try:
+                        result = future.result()
+                        timed_out.discard(i) # 強制終了の直前に終わっていた
+                    except process.BrokenProcessPool as e:
+                        self.app_type.cleanup(*jobs[i][0], **jobs[i][1]) # 強制終了したワーカの一時ファイル
+                        if i in timed_out: # 制限時間を超えて強制終了したジョブ
+                            timed_out.discard(i)
+                            failure = self._retry_or_fail(jobs, i, JobTimeout(f"exceeded {self.job_timeout}s"), attempts, retry_at)
+                        elif timed_out: # 他のジョブの強制終了に巻き込まれた
+                            failure = None
+                        elif crashed is not None and len(crashed) > 1: # どのジョブが原因か分からない
+                            suspects.add(i)
+                            failure = None
+                        else: # 単独で実行してワーカが異常終了した
+                            failure = self._retry_or_fail(jobs, i, e, attempts, retry_at)
+                    except Exception as e:
+                        timed_out.discard(i)
+                        failure = self._retry_or_fail(jobs, i, e, attempts, retry_at)
+                    else:
+                        yield i, result
+                        continue
+                    if failure is None:
+                        pending.insert(0, i)
+                    else:
+                        yield i, failure
+
+                # 制限時間を超えたジョブのワーカを強制終了する
+                if self.job_timeout is not None:
+                    deadline = time.time() - self.job_timeout
+                    for key, (pid, start) in list(started.items()):
+                        if start < deadline and key in running.values():
+                            timed_out.add(key)
+                            started.pop(key, None)
+                            kill_process(pid)
+
+                if crashed is not None and not running: # 壊れたプールを作り直す
+                    timed_out.clear()
+                    started.clear()
+                    crashed = None
+                    self._renew_pool()
+
+        finally:
+            for future in running:
+                future.cancel()
+
     def execute(
         self,
         args_kwargs_iter: Iterable[tuple[Iterable[Any], Mapping[str, Any]]],
-        tqdm_kwargs: TqdmKwargs = {}
+        tqdm_kwargs: TqdmKwargs = {},
+        costs: Sequence[float] | None = None,
+        footprints: Sequence[float] | None = None,
+        on_complete: Callable[[int, tuple[Any, float] | JobFailure], None] | None = None
         ) -> list[Any]:
-
+        """
+        全てのジョブを実行し，結果を投入順に返します
+
+        ジョブの失敗は他のジョブに影響しません．失敗したジョブの結果は None で，`failures` に記録して最後に表示します．
+        `costs` (ジョブ毎の実行時間の見積もり) を渡した場合，マルチプロセスではコストの大きい順に投入し，
+        順序が変わった場合は投入前の予測と実際の makespan を `schedule_report` に記録して表示します．
+        `footprints` (ジョブ毎の推定メモリ [byte]) と `memory_budget` がある場合は，実行中のジョブの合計が
+        予算に収まる間だけ投入します．
+        `on_complete` はジョブが終わる (または失敗が確定する) 毎に，このプロセスで (インデックス, 結果と所要時間，または `JobFailure`) を受け取ります．
+        """
+
+        self._sigint_reset()
         (sigint_manager := Thread(target=self._sigint_manager)).start()
 
-        executor = self._map_func(self._map_job, args_kwargs_iter)
+        self.schedule_report = None
+        self.failures = []
+
+        jobs = list(args_kwargs_iter)
+        # ワーカは空いた順に次のジョブを取り出すので，大きい順に並べるだけで動的に割り当てられる
+        plan = plan_schedule(costs, self.cpu) if costs is not None and self.multi_process_dict is not None else None
+        order = list(range(len(jobs))) if plan is None else plan.order
+        executor: Iterator[tuple[int, tuple[Any, float] | JobFailure]]
+        if self.multi_process_dict is None:
+            executor = self._run_isolated(jobs, order)
+        else:
+            executor = self._schedule(
+                jobs, order,
+                [0.] * len(jobs) if footprints is None else footprints,
+                self.memory_budget or float("inf")
+            )
 
         progress = self._tqdm_func(
             executor,
             **({
-                "total": len(args_kwargs_iter) if isinstance(args_kwargs_iter, Sized) else None,
+                "total": len(jobs),
                 "desc": f'\033[46m{PROGRESS_DESC_PREFIX.format("Processing...")}\033[0m',
                 "bar_format": "{desc}: {percentage:6.2f}%|{bar}{r_bar}\033[0J",
                 "colour": "cyan",
@@ -226,11 +664,24 @@ class AppExecutor(Generic[_AB]): # For Main Process
 
         exception: Exception | None = None
         result: list[Any] | None = None
+        interrupted = False
+
+        start = time.perf_counter()
 
         try:
-            result = list(progress)
+            # 元の順に戻し，所要時間から makespan を求める
+            durations = [0.] * len(jobs)
+            result = [None] * len(jobs)
+            for i, outcome in progress:
+                if on_complete is not None:
+                    on_complete(i, outcome)
+                if not isinstance(outcome, JobFailure):
+                    result[i], durations[i] = outcome
+            if plan is not None and plan.order != sorted(plan.order): # 並べ替えた場合だけ
+                self.schedule_report = schedule_report(plan, durations, self.cpu, time.perf_counter() - start)
         
         except KeyboardInterrupt:
+            interrupted = True
             progress.colour = "yellow"
             progress.set_description_str(f'\033[43m{PROGRESS_DESC_PREFIX.format("^C")}\033[0m')
         
@@ -239,13 +690,17 @@ class AppExecutor(Generic[_AB]): # For Main Process
             progress.set_description_str(f'\033[41m{PROGRESS_DESC_PREFIX.format("Aborted")}\033[0m')
             exception = e
 
-        else: # Completed with no Error
-            progress.colour = "green"
-            progress.set_description_str(f'\033[42m{PROGRESS_DESC_PREFIX.format("Completed")}\033[0m')
+        else: # Completed (失敗したジョブがあれば黄色)
+            if self.failures:
+                progress.colour = "yellow"
+                progress.set_description_str(f'\033[43m{PROGRESS_DESC_PREFIX.format(f"{len(self.failures)} failed")}\033[0m')
+            else:
+                progress.colour = "green"
+                progress.set_description_str(f'\033[42m{PROGRESS_DESC_PREFIX.format("Completed")}\033[0m')
         
         finally:
 
-            self._sigint_deleter()
+            self._sigint_deleter(interrupted or exception is not None)
             sigint_manager.join()
 
             progress.close()
@@ -254,4 +709,12 @@ class AppExecutor(Generic[_AB]): # For Main Process
                 print(file=sys.stderr)
                 raise exception
 
+            if self.schedule_report is not None:
+                print(file=sys.stderr)
+                print(self.schedule_report.format(), file=sys.stderr)
+
+            if self.failures:
+                print(file=sys.stderr)
+                print(format_failures(self.failures, len(jobs)), file=sys.stderr)
+
             return result
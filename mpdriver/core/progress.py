@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import sys
 import traceback
 from typing import TypedDict, NamedTuple, TextIO
 from typing import Sized, Iterable, Iterator, Container, Sequence, Mapping
@@ -215,8 +216,9 @@ class TqdmProcess(Process):
                     # non proxy operate
                     if op == "EXIT":
                         break
-                    elif op == "write":
-                        response = Tqdm.write(*request["args"], request["kwargs"])
+                    elif op == "write": # 標準出力は -a stdout=... が使うため，既定はプログレスバーと同じ標準エラー出力
+                        s, file, end = request["args"]
+                        response = Tqdm.write(s, sys.stderr if file is None else file, end, request["kwargs"])
 
                     # proxy operate
                     elif op == "tqdm":
@@ -234,7 +236,7 @@ class TqdmProcess(Process):
                         self._loop_pipe.append(request)
 
                     else:
-                        if isinstance(progress := self._progresses.get(proxy_id), Tqdm):
+                        if isinstance(progress := self._progresses.get(request["proxy_id"]), Tqdm):
                             response = progress._getattr(op)(*request["args"], **request["kwargs"])
                         else:
                             self._loop_pipe.append(request)
@@ -346,7 +348,7 @@ class TqdmSingle:
         return Tqdm(iterable, **(tqdm_kwargs | {"total": total}))
     @classmethod
     def write(cls, s: str, file: TextIO | None = None, end: str = "\n"):
-        Tqdm.write(s, file, end)
+        Tqdm.write(s, sys.stderr if file is None else file, end)
 
 class TqdmHost:
 
@@ -389,6 +391,7 @@ class TqdmHost:
         self._id = state["_id"]
         self.to_host_q = state["to_host_q"]
         self.to_client_qs = state["to_client_qs"]
+        self._closed = True # 複製 (ワーカ側) はプログレスバーのプロセスを終了しない
 
     def client(self):
         return TqdmClient(self)
@@ -400,12 +403,17 @@ class TqdmHost:
     def tqdm(self, iterable: Iterable[_T], **tqdm_proxy_kwargs: Unpack[TqdmProxyKwargs]):
         return TqdmProxy[_T](self, None, iterable, tqdm_proxy_kwargs)
 
-    def __del__(self):
+    def close(self):
+        """プログレスバーのプロセスを終了します (2回目以降は何もしない)"""
 
-        if parent_process() is None:
+        if parent_process() is None and not getattr(self, "_closed", False):
+            self._closed = True
             self.to_host_q.put(TqdmRequest(op="EXIT"))
             self.tqdm_process.join()
 
+    def __del__(self):
+        self.close()
+
     def get_sync_manager(self):
         if parent_process() is None:
             return self.sync_manager
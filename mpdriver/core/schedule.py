@@ -0,0 +1,98 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+ジョブの実行順序 (Longest Processing Time first) と makespan の見積もり
+
+ジョブのコスト (e.g. フレーム数 × 画素数) が大きい順にプールへ投入します．
+ワーカは空いた順に次のジョブを取り出すため，長いジョブが最後に残って他のワーカが遊ぶことを防げます．
+"""
+
+import heapq
+from typing import Iterable, NamedTuple, Sequence
+
+class SchedulePlan(NamedTuple):
+    """投入前にコストの見積もりから決めた順序と makespan の予測 (コストの単位)"""
+    order: list[int]
+    predicted: float
+    "大きい順に投入した場合の makespan"
+    predicted_unsorted: float
+    "投入順を変えなかった場合の makespan"
+    lower_bound: float
+    "全ワーカが最後まで埋まった場合の makespan"
+
+class ScheduleReport(NamedTuple):
+    workers: int
+    jobs: int
+    plan: SchedulePlan
+    actual: float
+    "実際の makespan [s]"
+    actual_lower_bound: float
+    "実際の所要時間で，全ワーカが最後まで埋まった場合の makespan [s]"
+
+    def format(self) -> str:
+        plan = self.plan
+        scale = 1. / plan.lower_bound if plan.lower_bound > 0 else 0.
+        return (
+            f"makespan: actual {self.actual:.1f}s (lower bound {self.actual_lower_bound:.1f}s from the job durations) "
+            f"for {self.jobs} jobs on {self.workers} workers; "
+            f"predicted {plan.predicted * scale:.2f}x the lower bound (unsorted {plan.predicted_unsorted * scale:.2f}x)"
+        )
+
+def longest_first(costs: Sequence[float]) -> list[int]:
+    """コストの大きい順のインデックス (同じコストは元の順)"""
+    return sorted(range(len(costs)), key=lambda i: -costs[i])
+
+def simulate_makespan(costs: Iterable[float], workers: int) -> float:
+    """`costs` の順に，最初に空いたワーカへ割り当てた場合の makespan"""
+
+    finish = [0.] * max(workers, 1)
+    for cost in costs:
+        heapq.heapreplace(finish, finish[0] + cost)
+    return max(finish)
+
+def lower_bound(costs: Sequence[float], workers: int) -> float:
+    return max(sum(costs) / max(workers, 1), max(costs, default=0.))
+
+def plan_schedule(costs: Sequence[float], workers: int) -> SchedulePlan:
+    """コストの大きい順の投入順序と，その時点の見積もりによる makespan の予測"""
+
+    order = longest_first(costs)
+    return SchedulePlan(
+        order=order,
+        predicted=simulate_makespan((costs[i] for i in order), workers),
+        predicted_unsorted=simulate_makespan(costs, workers),
+        lower_bound=lower_bound(costs, workers)
+    )
+
+def schedule_report(
+    plan: SchedulePlan,
+    durations: Sequence[float],
+    workers: int,
+    actual: float
+    ) -> ScheduleReport:
+    """
+    投入前の予測と，実行後の makespan をまとめます
+
+    予測はコストの単位のため，下限に対する比で実際の makespan と比べます．実際と予測の比の差は，
+    コストの見積もりの誤差とワーカ間の干渉 (CPU, I/O の競合) を表します．
+    """
+
+    return ScheduleReport(
+        workers=workers,
+        jobs=len(durations),
+        plan=plan,
+        actual=actual,
+        actual_lower_bound=lower_bound(durations, workers)
+    )
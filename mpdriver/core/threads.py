@@ -0,0 +1,137 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+ワーカ毎のスレッド数と CPU アフィニティ
+
+ワーカのプロセス毎に OpenCV，BLAS，動画のデコーダがそれぞれスレッドプールを作るため，
+`--cpu` を大きくするとコア数を大きく超えるスレッドが動きます．
+利用できるコア (アフィニティと cgroup の CPU クォータ) をワーカで分け合うように，スレッド数を制限します．
+"""
+
+import math
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+from threadpoolctl import threadpool_limits
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+# ライブラリの読み込み時に参照されるスレッド数の環境変数
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS",
+)
+
+def affinity_cores() -> list[int]:
+    """このプロセスが実行できるコアの番号"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def cgroup_cpu_limit(root: Path = CGROUP_ROOT) -> float | None:
+    """cgroup の CPU クォータ (コア数換算)．制限がない場合や cgroup がない環境では None"""
+
+    try: # cgroup v2: "<quota> <period>" または "max <period>"
+        quota, period = (root / "cpu.max").read_text().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    for controller in ("cpu", "cpu,cpuacct"): # cgroup v1 (ディストリビューションによってマウント先が異なる)
+        try:
+            quota = int((root / controller / "cpu.cfs_quota_us").read_text())
+            period = int((root / controller / "cpu.cfs_period_us").read_text())
+            return None if quota <= 0 else quota / period
+        except (OSError, ValueError):
+            continue
+    return None
+
+def available_cpus() -> int:
+    """アフィニティと cgroup のクォータから，実際に使えるコア数"""
+
+    cores = len(affinity_cores())
+    if (limit := cgroup_cpu_limit()) is not None:
+        cores = min(cores, max(1, math.floor(limit)))
+    return cores
+
+def auto_workers(threads: int = 1) -> int | None:
+    """1ワーカあたり `threads` コアとしたワーカ数．1つしか動かせない場合は None (シングルプロセス)"""
+
+    workers = available_cpus() // max(threads, 1)
+    return workers if workers > 1 else None
+
+class ThreadBudget(NamedTuple):
+    threads: int
+    "ワーカあたりのスレッド数"
+    cores: list[int] | None
+    "ワーカを固定するコア (None なら固定しない)"
+
+def plan_thread_budgets(workers: int, threads: int = 0, pin: bool = False) -> list[ThreadBudget]:
+    """
+    ワーカ毎のスレッド数とコアを決めます
+
+    `threads` が 0 の場合は，使えるコア数をワーカ数で割った値 (最低1) にします．
+    `pin` の場合は，アフィニティのコアを重ならないように連続した組に分けます．
+    ワーカがコアより多い場合は同じコアを複数のワーカで共有します．
+    """
+
+    cores = affinity_cores()
+    if threads <= 0:
+        threads = max(1, available_cpus() // max(workers, 1))
+
+    if not pin:
+        return [ThreadBudget(threads, None) for _ in range(workers)]
+
+    if workers >= len(cores):
+        return [ThreadBudget(threads, [cores[i % len(cores)]]) for i in range(workers)]
+
+    per_worker, extra = divmod(len(cores), workers)
+    budgets = list[ThreadBudget]()
+    start = 0
+    for i in range(workers):
+        stop = start + per_worker + (i < extra)
+        budgets.append(ThreadBudget(threads, cores[start:stop]))
+        start = stop
+    return budgets
+
+def apply_thread_budget(budget: ThreadBudget):
+    """
+    このプロセスのスレッド数とアフィニティを設定します (ワーカの初期化時，アプリを作る前に呼び出す)
+
+    OpenCV (`cv2.setNumThreads`)，デコーダ (FFmpeg のキャプチャのオプション)，BLAS と OpenMP を制限します．
+    ワーカでは numpy を既に読み込んでいるため，BLAS は環境変数ではなく threadpoolctl で制限します
+    (環境変数はこの後に読み込むライブラリと子プロセスのため)．MediaPipe のグラフのスレッドはアフィニティでのみ制限されます．
+    """
+
+    if budget.cores is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, budget.cores)
+
+    threads = str(budget.threads)
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = threads
+    os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = f"threads;{threads}"
+
+    import cv2
+    cv2.setNumThreads(budget.threads)
+
+    threadpool_limits(budget.threads)
+
+def resolve_workers(cpu: int | None, threads: int = 0) -> int | None:
+    """`--cpu` の値からワーカ数を決めます．None なら使えるコア数から，0 以下ならシングルプロセス (None)"""
+
+    if cpu is None:
+        return auto_workers(threads or 1)
+    return cpu if cpu > 0 else None
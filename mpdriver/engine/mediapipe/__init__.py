@@ -26,6 +26,8 @@ from mediapipe.python.solutions import drawing_utils, drawing_styles
 from ...core.utils import raise_exception
 from ...core.config import load_config
 from ...core import index
+from .mirror import FACEMESH_MIRROR
+from .render import AnnotationRenderer
 
 _T = TypeVar("_T")
 NDArray = np.ndarray[Any, np.dtype[_T]]
@@ -108,6 +110,11 @@ class Hand(IntEnum):
 
 Face = tuple(range(face_mesh.FACEMESH_NUM_LANDMARKS))
 
+def _mirror_name(name: str) -> str:
+    return name.replace("LEFT", "\0").replace("RIGHT", "LEFT").replace("\0", "RIGHT")
+
+POSE_MIRROR = tuple(Pose[_mirror_name(p.name)].value for p in Pose)
+
 INDEXINGS = MediaPipeDict[type[IntEnum] | Sequence[int]](
     face = Face,
     left_hand = Hand,
@@ -115,6 +122,26 @@ INDEXINGS = MediaPipeDict[type[IntEnum] | Sequence[int]](
     pose = Pose
 )
 
+MIRROR_TARGETS = MediaPipeDict[TARGET_NAMES](
+    face = "face",
+    left_hand = "right_hand",
+    right_hand = "left_hand",
+    pose = "pose"
+)
+"左右反転したときに値を取り出すターゲット"
+
+MIRROR_INDICES = MediaPipeDict[NDArray[np.intp]](
+    face = np.array(FACEMESH_MIRROR, dtype=np.intp),
+    left_hand = np.arange(len(Hand), dtype=np.intp),
+    right_hand = np.arange(len(Hand), dtype=np.intp),
+    pose = np.array(POSE_MIRROR, dtype=np.intp)
+)
+"左右反転したときに値を取り出すランドマークのインデックス"
+
+RAW_TARGET_SIZES = MediaPipeDict[int]({target: len(indexing) for target, indexing in INDEXINGS.items()})
+"正規化前の全ランドマーク (raw) の並びと，ターゲット毎のランドマーク数 (計 543)"
+RAW_SPLITS = np.cumsum(list(RAW_TARGET_SIZES.values()))[:-1]
+
 
 ### Mediapipe result
 
@@ -224,13 +251,15 @@ class MP:
         dimension_targets: MediaPipeDimensionTargetsOptions | None = None,
         connections: MediaPipeDict[set[tuple[int, int]]] | None = None,
         landmark_drawing_spec: MediaPipeDict[Mapping[int, drawing_utils.DrawingSpec]] | None = None,
-        connection_drawing_spec: MediaPipeDict[Mapping[tuple[int, int], drawing_utils.DrawingSpec]] | None = None
+        connection_drawing_spec: MediaPipeDict[Mapping[tuple[int, int], drawing_utils.DrawingSpec]] | None = None,
+        load_model: bool = True
         ):
 
         self.header_cache = ''
         self.dims_cache: list[int] | None = None
 
-        self.holistic = holistic.Holistic(**(holistic_options or mediapipe_config['holistic']))
+        # load_model=False: 推論せずに描画や正規化だけを行う (モデルを読み込まない)
+        self.holistic = holistic.Holistic(**(holistic_options or mediapipe_config['holistic'])) if load_model else None
         self.landmark_indices = MediaPipeDict({
             target: index.to_landmark_indices(INDEXINGS[target], indices)
             for target, indices in (landmarks_indices or mediapipe_config['landmark_indices']).items()
@@ -249,6 +278,10 @@ class MP:
         self.connections = connections or DEFAULT_CONNECTIONS
         self.landmark_drawing_spec = landmark_drawing_spec or DEFAULT_LANDMARK_DRAWING_SPEC
         self.connection_drawing_spec = connection_drawing_spec or DEFAULT_CONNECTION_DRAWING_SPEC
+        self.renderer = AnnotationRenderer(
+            self.annotate_targets, self.connections,
+            self.connection_drawing_spec, self.landmark_drawing_spec
+        ) # DrawingSpec 毎にまとめて描画
 
     def detect_landmarks2ndarray(self, landmark_list: LandmarkList | None, landmark_index: Sized) -> NDArray[np.float32]:
 
@@ -259,6 +292,9 @@ class MP:
 
     def detect(self, img: cv2.Mat) -> MediaPipeDict[NDArray[np.float32]]:
 
+        if self.holistic is None:
+            raise RuntimeError("the model is not loaded (MP(load_model=False))")
+
         solution_outputs: SolutionOutputs = self.holistic.process(img)
 
         return MediaPipeDict(
@@ -268,6 +304,36 @@ class MP:
             pose=self.detect_landmarks2ndarray(solution_outputs.pose_landmarks, Pose)
         )
 
+    def mirror(self, mp_dict: MediaPipeDict[NDArray[np.float32]]) -> MediaPipeDict[NDArray[np.float32]]:
+        """
+        Compute the landmarks of the horizontally flipped image without inference.
+
+        Left and right hands are swapped, pose and face mesh indices are remapped
+        to their symmetric counterparts, and x is reflected.
+
+        Args:
+            mp_dict (MediaPipeDict[NDArray[np.float32]]): The dictionary of raw landmarks from `detect`.
+        """
+
+        mirrored = MediaPipeDict[NDArray[np.float32]]()
+
+        for target in mp_dict:
+            landmark_array = mp_dict[MIRROR_TARGETS[target]][MIRROR_INDICES[target]] # gather (copy)
+            landmark_array[..., X] = 1 - landmark_array[..., X]
+            mirrored[target] = landmark_array
+
+        return mirrored
+
+    def to_raw(self, mp_dict: MediaPipeDict[NDArray[np.float32]]) -> NDArray[np.float32]:
+        """`detect` の結果を，正規化せずに全ランドマークの (543, 4) の配列にします"""
+
+        return np.concatenate([mp_dict[target][:size] for target, size in RAW_TARGET_SIZES.items()])
+
+    def from_raw(self, raw: NDArray[np.float32]) -> MediaPipeDict[NDArray[np.float32]]:
+        """`to_raw` の配列を `detect` の結果の形式に戻します"""
+
+        return MediaPipeDict(zip(RAW_TARGET_SIZES, np.split(np.asarray(raw, dtype=np.float32), RAW_SPLITS)))
+
     def annotate_pixel_coordinates(self, landmark_array: NDArray[np.float32], width: int, height: int) -> NDArray[np.float32]:
 
         return np.clip(
@@ -318,6 +384,33 @@ class MP:
 
         return np.where(mask, mask_img, src_img)
 
+    def annotate_face_masking_roi(self, img: cv2.Mat, face_pixel_coord: NDArray[np.int32], ksize: tuple[int, int]) -> cv2.Mat:
+        """
+        顔の輪郭の外接矩形の中だけをぼかして合成します (`img` を直接書き換える)
+
+        ぼかしは外接矩形をカーネルの半分だけ広げた領域で計算するため，
+        画像全体を `cv2.blur` してから `annotate_face_masking` で合成した結果と一致します．
+        """
+
+        height, width = img.shape[:2]
+        oval = face_pixel_coord[FACEMESH_FACE_OVAL_ORDERED]
+
+        # 外接矩形 (画像内)
+        x0, y0 = np.maximum(oval.min(axis=0), 0)
+        x1, y1 = np.minimum(oval.max(axis=0) + 1, (width, height))
+        if x0 >= x1 or y0 >= y1: return img
+
+        # カーネルの半分の余白を付けた領域をぼかす
+        mx, my = ksize[0] // 2, ksize[1] // 2
+        ox0, oy0 = max(x0 - mx, 0), max(y0 - my, 0)
+        ox1, oy1 = min(x1 + mx, width), min(y1 + my, height)
+        blurred = cv2.blur(img[oy0:oy1, ox0:ox1], ksize)[y0 - oy0:y1 - oy0, x0 - ox0:x1 - ox0]
+
+        mask = cv2.fillPoly(np.zeros((y1 - y0, x1 - x0), dtype=np.uint8), [oval - (x0, y0)], 255)
+        np.copyto(img[y0:y1, x0:x1], blurred, where=mask.astype(bool)[..., None])
+
+        return img
+
     def annotate(
         self,
         img: cv2.Mat,
@@ -329,41 +422,17 @@ class MP:
 
         out_img = img.copy()
 
-        pixel_coordinates = MediaPipeDict[NDArray[np.float32]]({
-            target: self.annotate_pixel_coordinates(landmark_array, img.shape[1], img.shape[0])
-            for target, landmark_array in mp_dict.items()
-            if landmark_array is not None and not np.isnan(landmark_array).any()
-        })
+        # 全ターゲットの画素座標を1回の演算で求める
+        pixel_coordinates = self.renderer.pixel_coordinates(mp_dict, img.shape[1], img.shape[0])
 
         # draw and mask
 
         if mask_face_oval and "face" in pixel_coordinates:
             ksize = (tmp := np.array(img.shape[:2]) // 50) + (1 - tmp % 2)
-            out_img = self.annotate_face_masking(
-                out_img, pixel_coordinates["face"],
-                cv2.blur(out_img, ksize)
-            )
+            # 顔の周辺だけをぼかして合成する
+            out_img = self.annotate_face_masking_roi(out_img, pixel_coordinates["face"], tuple(int(k) for k in ksize))
 
-        for target in self.annotate_targets:
-
-            if not target in pixel_coordinates: continue
-
-            if np.isnan(pixel_coordinates[target]).any(): continue
-
-            if draw_connection:
-                out_img = self.annotate_draw_connections(
-                    out_img, pixel_coordinates[target],
-                    self.connections[target],
-                    self.connection_drawing_spec[target]
-                )
-
-            if draw_landmark:
-                out_img = self.annotate_draw_landmarks(
-                    out_img, pixel_coordinates[target],
-                    DEFAULT_LANDMARK_DRAWING_SPEC[target]
-                )
-
-        return out_img
+        return self.renderer.draw(out_img, pixel_coordinates, draw_connection, draw_landmark)
 
     def normalize(
         self,
@@ -419,6 +488,14 @@ class MP:
                 for target, indices in self.landmark_indices.items()
             ], axis=-2).reshape(-1)
 
+    def get_target_sizes(self) -> MediaPipeDict[int]:
+        """出力順のターゲット毎のランドマーク数"""
+
+        return MediaPipeDict({
+            target: len(range(len(INDEXINGS[target]))[indices]) if isinstance(indices, slice) else len(indices)
+            for target, indices in self.landmark_indices.items()
+        })
+
     def get_header(self, delimiter = ','):
 
         self.header_cache = self.header_cache or delimiter.join(chain.from_iterable(
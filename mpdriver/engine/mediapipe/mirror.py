@@ -0,0 +1,55 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+左右反転したランドマークの対応表
+
+FACEMESH_MIRROR[i] は，画像を左右反転したときに顔メッシュのランドマーク i が移る先のインデックスです．
+目・眉・唇・輪郭 (FACEMESH_CONTOURS の 124 辺) は左右の対応と一致します．
+FACEMESH_TESSELATION の左右対称な写像ではなく，三角形分割は左右で完全には対称でないため，1322 辺のうち 6 辺は辺に移りません．
+正中線上のランドマーク (0, 1, 2, 4, ...) は自分自身に対応します．
+"""
+
+FACEMESH_MIRROR = (
+      0,   1,   2, 248,   4,   5,   6, 249,   8,   9,  10,  11,  12,  13,  14,  15,  #   0 -  15
+     16,  17,  18,  19, 250, 251, 252, 253, 254, 255, 256, 257, 258, 259, 260, 261,  #  16 -  31
+    262, 263, 264, 265, 266, 267, 268, 269, 270, 271, 272, 273, 274, 275, 276, 277,  #  32 -  47
+    278, 279, 280, 281, 282, 283, 284, 285, 286, 287, 288, 289, 290, 291, 292, 293,  #  48 -  63
+    294, 295, 296, 297, 298, 299, 300, 301, 302, 303, 304, 305, 306, 307, 308, 309,  #  64 -  79
+    310, 311, 312, 313, 314, 315, 316, 317, 318, 319, 320, 321, 322, 323,  94, 324,  #  80 -  95
+    325, 326, 327, 328, 329, 330, 331, 332, 333, 334, 335, 336, 337, 338, 339, 340,  #  96 - 111
+    341, 342, 343, 344, 345, 346, 347, 348, 349, 350, 351, 352, 353, 354, 355, 356,  # 112 - 127
+    357, 358, 359, 360, 361, 362, 363, 364, 365, 366, 367, 368, 369, 370, 371, 372,  # 128 - 143
+    373, 374, 375, 376, 377, 378, 379, 151, 152, 380, 381, 382, 383, 384, 385, 386,  # 144 - 159
+    387, 388, 389, 390, 164, 391, 392, 393, 168, 394, 395, 396, 397, 398, 399, 175,  # 160 - 175
+    400, 401, 402, 403, 404, 405, 406, 407, 408, 409, 410, 411, 412, 413, 414, 415,  # 176 - 191
+    416, 417, 418, 195, 419, 197, 420, 199, 200, 421, 422, 423, 424, 425, 426, 427,  # 192 - 207
+    428, 429, 430, 431, 432, 433, 434, 435, 436, 437, 438, 439, 440, 441, 442, 443,  # 208 - 223
+    444, 445, 446, 447, 448, 449, 450, 451, 452, 453, 454, 455, 456, 457, 458, 459,  # 224 - 239
+    460, 461, 462, 463, 464, 465, 466, 467,   3,   7,  20,  21,  22,  23,  24,  25,  # 240 - 255
+     26,  27,  28,  29,  30,  31,  32,  33,  34,  35,  36,  37,  38,  39,  40,  41,  # 256 - 271
+     42,  43,  44,  45,  46,  47,  48,  49,  50,  51,  52,  53,  54,  55,  56,  57,  # 272 - 287
+     58,  59,  60,  61,  62,  63,  64,  65,  66,  67,  68,  69,  70,  71,  72,  73,  # 288 - 303
+     74,  75,  76,  77,  78,  79,  80,  81,  82,  83,  84,  85,  86,  87,  88,  89,  # 304 - 319
+     90,  91,  92,  93,  95,  96,  97,  98,  99, 100, 101, 102, 103, 104, 105, 106,  # 320 - 335
+    107, 108, 109, 110, 111, 112, 113, 114, 115, 116, 117, 118, 119, 120, 121, 122,  # 336 - 351
+    123, 124, 125, 126, 127, 128, 129, 130, 131, 132, 133, 134, 135, 136, 137, 138,  # 352 - 367
+    139, 140, 141, 142, 143, 144, 145, 146, 147, 148, 149, 150, 153, 154, 155, 156,  # 368 - 383
+    157, 158, 159, 160, 161, 162, 163, 165, 166, 167, 169, 170, 171, 172, 173, 174,  # 384 - 399
+    176, 177, 178, 179, 180, 181, 182, 183, 184, 185, 186, 187, 188, 189, 190, 191,  # 400 - 415
+    192, 193, 194, 196, 198, 201, 202, 203, 204, 205, 206, 207, 208, 209, 210, 211,  # 416 - 431
+    212, 213, 214, 215, 216, 217, 218, 219, 220, 221, 222, 223, 224, 225, 226, 227,  # 432 - 447
+    228, 229, 230, 231, 232, 233, 234, 235, 236, 237, 238, 239, 240, 241, 242, 243,  # 448 - 463
+    244, 245, 246, 247,  # 464 - 467
+)
@@ -3,7 +3,36 @@ from pathlib import Path
 from .video import (
     VideoCapture, VideoWriter, VideoWriter_fourcc,
     FOURCC,
+    FFmpegWriter, FFMPEG_STDOUT, ffmpeg_available,
+    ImageSequenceWriter,
     cap_to_frame_iter, frame_iter_to_video_writer,
     video_or_imgdir_pathes,
     is_image, is_video
+)
+from .sparse import (
+    save_sparse, load_sparse, load_presence
+)
+from .writer import (
+    LandmarkWriter, NpyWriter, CsvWriter, NpzWriter, LmzWriter, ArrayWriter,
+    open_writer
+)
+from .delta import (
+    delta_encode, delta_decode
+)
+from .lmz import (
+    LmzReader, iter_lmz, load_lmz
+)
+from .pack import (
+    PackWriter, PackClipWriter, PackIndexEntry,
+    load_pack_index, read_pack_clip
+)
+from .meta import (
+    RunMetadata, metadata_path, load_metadata, build_summary, update_summary, load_summary
+)
+from .raw_cache import (
+    RawCacheInfo, raw_cache_path, load_raw_cache_info, iter_raw_cache
+)
+from .reader import (
+    SIDECAR_SUFFIXES, LandmarkDataset, sliding_windows,
+    load_csv_row_groups, read_csv_row_group
 )
\ No newline at end of file
@@ -0,0 +1,97 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+ロックを使わないアトミックな書き込み
+
+出力先と同じディレクトリの一時ファイルに書き込み，完成してから `os.replace` で置き換えます．
+書き込み途中のファイルが最終的な名前で見えることはなく，複数のプロセスが互いを待つこともありません．
+"""
+
+import os
+import re
+import uuid
+from glob import escape
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Iterator
+
+TEMP_SUFFIX = ".tmp"
+TEMP_NAME = re.compile(rf"\..+\.[0-9a-f]{{12}}{re.escape(TEMP_SUFFIX)}(\.[^.]+)?")
+
+def temp_path(path: Path, suffix: str = "") -> Path:
+    """
+    出力先と同じディレクトリの，他と衝突しない隠しファイル名 (e.g. video.npy -> .video.npy.<id>.tmp)
+
+    拡張子で形式を決める書き込み (e.g. ffmpeg) のために，`suffix` を末尾に付けられます (e.g. .video.mp4.<id>.tmp.mp4)．
+    """
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex[:12]}{TEMP_SUFFIX}{suffix}")
+
+def is_temp_path(path: Path) -> bool:
+    """`temp_path` で作った一時ファイルの名前か"""
+    return TEMP_NAME.fullmatch(path.name) is not None
+
+def remove_temp_files(path: Path):
+    """
+    `path` の一時ファイルを削除します
+
+    書き込み中に強制終了した (e.g. 制限時間を超えた) ジョブは一時ファイルを片付けられないため，実行した側で呼び出します．
+    """
+
+    for tmp in path.parent.glob(f".{escape(path.name)}.*"):
+        if is_temp_path(tmp):
+            tmp.unlink(missing_ok=True)
+
+def makedirs(path: Path):
+    """出力先の親ディレクトリを作成します．既に存在する場合や，他のプロセスと同時に作成した場合も成功します"""
+    os.makedirs(path.parent, exist_ok=True)
+
+def fsync_path(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def fsync_dir(path: Path):
+    """ディレクトリのエントリ (置き換えたファイル名) をディスクに反映します"""
+    if os.name == "nt": return # Windows ではディレクトリを open できない
+    fsync_path(path)
+
+def atomic_replace(tmp: Path, path: Path, fsync: bool = False):
+    """書き終えた一時ファイルを出力先へ置き換えます．`fsync` の場合は内容とディレクトリをディスクに反映します"""
+
+    if fsync:
+        fsync_path(tmp)
+    os.replace(tmp, path)
+    if fsync:
+        fsync_dir(path.parent)
+
+@contextmanager
+def atomic_open(path: Path, mode: str = "wb", fsync: bool = False, **kwargs: Any) -> Iterator[IO[Any]]:
+    """
+    一時ファイルを開き，ブロックを正常に抜けたときだけ `path` へ置き換えます
+
+    例外が発生した場合は一時ファイルを削除し，既存の `path` には触れません．
+    """
+
+    makedirs(path)
+    tmp = temp_path(path)
+    try:
+        with open(tmp, mode, **kwargs) as fp:
+            yield fp
+        atomic_replace(tmp, path, fsync)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,100 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+ランドマークの時系列に特化した差分符号化
+
+1つのブロック (T, ...) を次の順に変換します．先頭のフレームはキーフレームとして絶対値を持つため，
+ブロック毎に独立して復元できます．
+
+1. 各値を `step` 刻みに量子化した整数にする
+2. 未検出 (NaN) の位置をビットマスクに記録し，値は直前の検出値で埋める
+3. 値毎に時間方向の差分を取る (先頭フレームは絶対値)
+4. 差分を zigzag 符号化し，最小のバイト幅に詰めてバイト毎に並べ替える (byte shuffle)
+
+出力はそのまま zlib / lzma / zstd で圧縮します．
+"""
+
+import struct
+from typing import Any, TypeVar
+
+import numpy as np
+
+_T = TypeVar("_T")
+NDArray = np.ndarray[Any, np.dtype[_T]]
+
+DEFAULT_DELTA_STEP = 1e-4
+
+_WIDTH = struct.Struct("<B")
+_UINT_TYPES = {1: np.uint8, 2: np.uint16, 4: np.uint32, 8: np.uint64}
+
+def _forward_fill_index(missing: NDArray[np.bool_]) -> NDArray[np.intp]:
+    """(T, C) の各列について，直前の欠損でない行の番号を返します．先頭から欠損なら 0"""
+    index = np.where(missing, 0, np.arange(missing.shape[0])[:, None])
+    return np.maximum.accumulate(index, axis=0)
+
+def delta_encode(block: NDArray[np.floating], step: float = DEFAULT_DELTA_STEP) -> bytes:
+    """(T, ...) のブロックを差分符号化したバイト列に変換します"""
+
+    frames = block.shape[0]
+    values = block.reshape(frames, -1)
+    missing = np.isnan(values)
+
+    quantized = np.rint(np.where(missing, 0, values) / step).astype(np.int64)
+    if missing.any(): # 欠損は直前の値で埋め，差分を 0 にする
+        quantized = np.take_along_axis(quantized, _forward_fill_index(missing), axis=0)
+
+    # 値毎の時系列が連続するように (C, T) の順に並べる
+    residuals = np.diff(quantized.T, axis=1, prepend=0)
+    zigzag = ((residuals << 1) ^ (residuals >> 63)).view(np.uint64)
+
+    peak = int(zigzag.max(initial=0))
+    width = next(w for w in (1, 2, 4, 8) if peak < 1 << (8 * w))
+    shuffled = zigzag.ravel().astype(_UINT_TYPES[width]).view(np.uint8).reshape(-1, width).T
+
+    return (
+        _WIDTH.pack(width)
+        + np.packbits(missing, axis=None).tobytes()
+        + np.ascontiguousarray(shuffled).tobytes()
+    )
+
+def delta_decode(
+    data: bytes,
+    frames: int,
+    shape: tuple[int, ...],
+    dtype: np.dtype | type = np.float32,
+    step: float = DEFAULT_DELTA_STEP
+    ) -> NDArray[np.floating]:
+    """`delta_encode` の出力から (frames, *shape) のブロックを復元します"""
+
+    columns = int(np.prod(shape, dtype=np.int64))
+    size = frames * columns
+
+    (width,) = _WIDTH.unpack_from(data)
+    mask_bytes = -(-size // 8)
+    buffer = np.frombuffer(data, dtype=np.uint8, offset=_WIDTH.size)
+
+    missing = np.unpackbits(buffer[:mask_bytes], count=size).astype(np.bool_).reshape(frames, columns)
+    zigzag = (
+        buffer[mask_bytes:mask_bytes + size * width]
+        .reshape(width, size).T.copy()
+        .view(_UINT_TYPES[width]).ravel().astype(np.uint64)
+    )
+
+    residuals = ((zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64))
+    quantized = np.cumsum(residuals.reshape(columns, frames), axis=1).T
+
+    block = (quantized * step).astype(dtype)
+    block[missing] = np.nan
+    return block.reshape(frames, *shape)
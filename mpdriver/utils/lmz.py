@@ -0,0 +1,212 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+チャンク毎に圧縮したランドマークのコンテナ (.lmz)
+
+    magic "LMZ\\x01"
+    <I ヘッダ長, ヘッダ (JSON: version, codec, level, dtype, shape, chunk_size, filter, step)
+    チャンク * n: <IQ (フレーム数, バイト数), 圧縮したデータ (C順序)
+    <IQ (0, 0)                  # 終端
+    インデックス (int64, (n, 2): オフセット, フレーム数)
+    <Q インデックスのオフセット, magic "LMZI"
+
+チャンクは独立に展開できるため，インデックスから任意のチャンクだけを読めます．
+filter が "delta" の場合，各チャンクは `mpdriver.utils.delta` で差分符号化してから圧縮されており，
+チャンクの先頭フレームがキーフレームになります．
+書き込みが中断されてインデックスがない場合は，先頭から順にチャンクを辿ります．
+"""
+
+import json
+import lzma
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterator, TypedDict, TypeVar
+
+import numpy as np
+
+from .delta import delta_decode
+
+_T = TypeVar("_T")
+NDArray = np.ndarray[Any, np.dtype[_T]]
+PathLike = str | Path
+
+LMZ_LAYOUT_VERSION = 1
+LMZ_MAGIC = b"LMZ\x01"
+LMZ_INDEX_MAGIC = b"LMZI"
+DEFAULT_CHUNK_FRAMES = 256
+
+_CHUNK_HEADER = struct.Struct("<IQ")
+_HEADER_LEN = struct.Struct("<I")
+_INDEX_OFFSET = struct.Struct("<Q")
+
+Codec = tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]
+"(圧縮, 展開)"
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("codec 'zstd' requires the 'zstandard' package (pip install zstandard)") from None
+    return zstandard
+
+def get_codec(name: str, level: int | None = None) -> Codec:
+    """コーデック名と圧縮レベル (None ならコーデックの既定値) から (圧縮, 展開) の関数を返します"""
+
+    if name == "zlib":
+        lv = -1 if level is None else level
+        return (lambda b: zlib.compress(b, lv)), zlib.decompress
+    if name == "lzma":
+        preset = lzma.PRESET_DEFAULT if level is None else level
+        return (lambda b: lzma.compress(b, preset=preset)), lzma.decompress
+    if name == "zstd":
+        zstandard = _zstandard()
+        lv = 3 if level is None else level
+        # ZstdCompressor はスレッドセーフではないため，呼び出し毎に作成する
+        return (
+            lambda b: zstandard.ZstdCompressor(level=lv).compress(b),
+            lambda b: zstandard.ZstdDecompressor().decompress(b)
+        )
+    raise ValueError(f"unknown codec '{name}' (zlib, lzma or zstd)")
+
+class LmzHeader(TypedDict):
+    version: int
+    codec: str
+    level: int | None
+    dtype: str
+    shape: list[int]
+    "1フレームあたりの形状"
+    chunk_size: int
+    filter: str | None
+    "None または \"delta\""
+    step: float | None
+    "filter=\"delta\" の量子化の刻み幅"
+
+def write_lmz_header(fp: BinaryIO, header: LmzHeader):
+    data = json.dumps(header).encode()
+    fp.write(LMZ_MAGIC + _HEADER_LEN.pack(len(data)) + data)
+
+def write_lmz_chunk(fp: BinaryIO, frames: int, payload: bytes) -> int:
+    """チャンクを書き込み，その先頭のオフセットを返します"""
+    offset = fp.tell()
+    fp.write(_CHUNK_HEADER.pack(frames, len(payload)) + payload)
+    return offset
+
+def write_lmz_index(fp: BinaryIO, index: list[tuple[int, int]]):
+    fp.write(_CHUNK_HEADER.pack(0, 0))
+    offset = fp.tell()
+    fp.write(np.array(index, dtype="<i8").reshape(-1, 2).tobytes())
+    fp.write(_INDEX_OFFSET.pack(offset) + LMZ_INDEX_MAGIC)
+
+class LmzReader:
+    """
+    .lmz をチャンク単位で展開して読み込むリーダ
+
+    ファイル全体を読み込まず，必要なチャンクのみを展開します．
+    """
+
+    def __init__(self, path: PathLike):
+
+        self.path = Path(path)
+        self.fp = open(self.path, "rb")
+
+        if self.fp.read(len(LMZ_MAGIC)) != LMZ_MAGIC:
+            raise ValueError(f"not a .lmz file: {self.path}")
+        (header_len,) = _HEADER_LEN.unpack(self.fp.read(_HEADER_LEN.size))
+        self.header: LmzHeader = json.loads(self.fp.read(header_len))
+        self.data_offset = self.fp.tell()
+
+        self.dtype = np.dtype(self.header["dtype"])
+        self.shape = tuple(self.header["shape"])
+        self.decompress = get_codec(self.header["codec"], self.header["level"])[1]
+        self.filter = self.header.get("filter")
+        self.index = self._read_index()
+
+    def _read_index(self) -> NDArray[np.int64]:
+
+        footer = _INDEX_OFFSET.size + len(LMZ_INDEX_MAGIC)
+        size = self.fp.seek(0, 2)
+        if size - self.data_offset >= footer:
+            self.fp.seek(size - footer)
+            (offset,) = _INDEX_OFFSET.unpack(self.fp.read(_INDEX_OFFSET.size))
+            if self.fp.read(len(LMZ_INDEX_MAGIC)) == LMZ_INDEX_MAGIC:
+                self.fp.seek(offset)
+                return np.frombuffer(self.fp.read(size - footer - offset), dtype="<i8").reshape(-1, 2)
+
+        # インデックスがない (書き込み途中で中断された) 場合は先頭から辿る
+        index = list[tuple[int, int]]()
+        offset = self.data_offset
+        while True:
+            self.fp.seek(offset)
+            head = self.fp.read(_CHUNK_HEADER.size)
+            if len(head) < _CHUNK_HEADER.size: break
+            frames, nbytes = _CHUNK_HEADER.unpack(head)
+            if frames == 0 or offset + _CHUNK_HEADER.size + nbytes > size: break
+            index.append((offset, frames))
+            offset += _CHUNK_HEADER.size + nbytes
+        return np.array(index, dtype=np.int64).reshape(-1, 2)
+
+    @property
+    def n_chunks(self) -> int:
+        return len(self.index)
+
+    def __len__(self) -> int:
+        """フレーム数"""
+        return int(self.index[:, 1].sum())
+
+    def decode_chunk(self, payload: bytes, frames: int) -> NDArray[Any]:
+        data = self.decompress(payload)
+        if self.filter == "delta":
+            return delta_decode(data, frames, self.shape, self.dtype, self.header["step"])
+        if self.filter is not None:
+            raise ValueError(f"unknown .lmz filter '{self.filter}'")
+        return np.frombuffer(data, dtype=self.dtype).reshape(frames, *self.shape)
+
+    def read_chunk(self, i: int) -> NDArray[Any]:
+        """i 番目のチャンクを展開します"""
+
+        offset, _ = self.index[i]
+        self.fp.seek(offset)
+        frames, nbytes = _CHUNK_HEADER.unpack(self.fp.read(_CHUNK_HEADER.size))
+        return self.decode_chunk(self.fp.read(nbytes), frames)
+
+    def iter_chunks(self) -> Iterator[NDArray[Any]]:
+        for i in range(self.n_chunks):
+            yield self.read_chunk(i)
+
+    def read(self) -> NDArray[Any]:
+        chunks = list(self.iter_chunks())
+        if not chunks:
+            return np.empty((0, *self.shape), dtype=self.dtype)
+        return np.concatenate(chunks)
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def iter_lmz(path: PathLike) -> Iterator[NDArray[Any]]:
+    """.lmz をチャンク毎に展開しながら返します"""
+    with LmzReader(path) as reader:
+        yield from reader.iter_chunks()
+
+def load_lmz(path: PathLike) -> NDArray[Any]:
+    """.lmz を全て展開して (T, ...) の配列として読み込みます"""
+    with LmzReader(path) as reader:
+        return reader.read()
@@ -0,0 +1,267 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+ランドマーク出力毎のメタデータ (サイドカー) と，コーパス全体のサマリインデックス
+
+    <dst>/video.npy
+    <dst>/video.npy.meta.json   # サイドカー
+    <dst>/summary.json          # サイドカーから作成したサマリインデックス
+
+ランドマークの値を読まずに，検出率などで出力を選別できます．
+"""
+
+import json
+import os
+import time
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Mapping, ParamSpec, TypedDict, TypeVar
+
+import numpy as np
+
+from .atomic import atomic_open
+from .pack import load_pack_index
+
+_T = TypeVar("_T")
+_P = ParamSpec("_P")
+NDArray = np.ndarray[Any, np.dtype[_T]]
+PathLike = str | Path
+
+META_LAYOUT_VERSION = 1
+META_SUFFIX = ".meta.json"
+SUMMARY_NAME = "summary.json"
+
+class SourceInfo(TypedDict):
+    path: str
+    size: int
+    "バイト数 (連続画像の場合はファイルの合計)"
+    mtime: float
+    width: int
+    height: int
+    fps: float
+    frame_count: int
+    fourcc: str
+
+class RunMetadata(TypedDict):
+    version: int
+    key: str
+    "出力ディレクトリからの相対パス，または pack のキー"
+    source: SourceInfo
+    frames: int
+    "処理したフレーム数"
+    detection_rate: dict[str, float]
+    "ターゲット毎の検出されたフレームの割合"
+    both_hands_rate: float
+    "両手が検出されたフレームの割合"
+    mean_visibility: dict[str, float | None]
+    "ターゲット毎の検出されたフレームでの visibility の平均"
+    config_hash: str
+    engine: dict[str, str]
+    "パッケージのバージョン"
+    timings: dict[str, float]
+    "処理の段階毎の所要時間 [s]"
+    created: float
+
+def engine_versions() -> dict[str, str]:
+
+    import cv2
+    import mediapipe
+
+    try:
+        mpdriver = metadata.version("MPDriver3")
+    except metadata.PackageNotFoundError: # インストールせずに実行している
+        mpdriver = "unknown"
+
+    return {
+        "mpdriver": mpdriver,
+        "mediapipe": getattr(mediapipe, "__version__", "unknown"),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+
+def source_info(src: Path, width: int, height: int, fps: float, frame_count: int, fourcc: int = 0) -> SourceInfo:
+
+    if src.is_file():
+        stat = src.stat()
+        size, mtime = stat.st_size, stat.st_mtime
+    else:
+        stats = [p.stat() for p in src.iterdir() if p.is_file()]
+        size = sum(s.st_size for s in stats)
+        mtime = max((s.st_mtime for s in stats), default=0.)
+
+    return SourceInfo(
+        path=src.as_posix(),
+        size=size,
+        mtime=mtime,
+        width=width,
+        height=height,
+        fps=fps,
+        frame_count=frame_count,
+        fourcc=fourcc.to_bytes(4, "little").decode("latin1").strip("\0") if fourcc else ""
+    )
+
+class StageTimer:
+    """パイプラインの段階毎に所要時間を積算します"""
+
+    def __init__(self):
+        self.timings = dict[str, float]()
+
+    def add(self, stage: str, seconds: float):
+        self.timings[stage] = self.timings.get(stage, 0.) + seconds
+
+    def wrap(self, stage: str, func: Callable[_P, _T]) -> Callable[_P, _T]:
+        """呼び出し毎の時間を `stage` に積算する関数を返します"""
+
+        def timed(*args: _P.args, **kwargs: _P.kwargs) -> _T:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+
+        return timed
+
+    def wrap_iter(self, stage: str, iterable: Iterable[_T]) -> Iterator[_T]:
+        """要素の取り出し毎の時間を `stage` に積算するイテレータを返します"""
+
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add(stage, time.perf_counter() - start)
+            yield item
+
+class DetectionStats:
+    """
+    推論結果から，ターゲット毎の検出フレーム数と visibility の合計を積算します
+
+    `update` には `MP.detect` の戻り値 (正規化前) を渡します．未検出のターゲットは全て NaN です．
+    """
+
+    def __init__(self, targets: Iterable[str]):
+        self.targets = list(targets)
+        self.frames = 0
+        self.detected = dict.fromkeys(self.targets, 0)
+        self.visibility = dict.fromkeys(self.targets, 0.)
+        self.both_hands = 0
+        self.has_hands = {"left_hand", "right_hand"} <= set(self.targets)
+
+    def update(self, mp_dict: Mapping[str, NDArray[np.floating]]):
+
+        self.frames += 1
+        present = set[str]()
+        for target in self.targets:
+            landmarks = mp_dict[target]
+            if np.isnan(landmarks).all(): continue
+            present.add(target)
+            self.detected[target] += 1
+            self.visibility[target] += float(np.nanmean(landmarks[:, 3]))
+
+        if self.has_hands and {"left_hand", "right_hand"} <= present:
+            self.both_hands += 1
+
+    def metadata(self) -> dict[str, Any]:
+        frames = max(self.frames, 1)
+        return {
+            "detection_rate": {t: self.detected[t] / frames for t in self.targets},
+            "both_hands_rate": self.both_hands / frames,
+            "mean_visibility": {
+                t: self.visibility[t] / self.detected[t] if self.detected[t] else None
+                for t in self.targets
+            },
+        }
+
+def metadata_path(landmarks: Path) -> Path:
+    """ランドマーク出力のサイドカーのパス (e.g. video.npy -> video.npy.meta.json)"""
+    return landmarks.with_name(landmarks.name + META_SUFFIX)
+
+def write_metadata(path: Path, meta: RunMetadata, fsync: bool = False):
+    with atomic_open(path, "w", fsync=fsync, encoding="utf-8") as fp:
+        json.dump(meta, fp, ensure_ascii=False, indent=1)
+
+def load_metadata(path: PathLike) -> RunMetadata:
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+def _iter_metadata(root: Path) -> Iterator[RunMetadata]:
+
+    # pack: インデックスのエントリに埋め込まれたメタデータ
+    if (root / "pack.json").exists():
+        for entry in load_pack_index(root).values():
+            if (meta := entry.get("meta")) is not None:
+                yield meta
+        return
+
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(META_SUFFIX) and not filename.startswith("."):
+                try:
+                    yield load_metadata(Path(dirpath) / filename)
+                except (OSError, ValueError):
+                    continue # 壊れたサイドカーは無視する
+
+def build_summary(root: PathLike, fsync: bool = False) -> dict[str, RunMetadata]:
+    """
+    `root` 以下の全てのサイドカーからサマリインデックス (`root/summary.json`) を作成します
+
+    Returns:
+        dict[str, RunMetadata]: キー毎のメタデータ
+    """
+
+    root = Path(root)
+    clips = {meta["key"]: meta for meta in sorted(_iter_metadata(root), key=lambda m: m.get("created", 0))}
+    with atomic_open(root / SUMMARY_NAME, "w", fsync=fsync, encoding="utf-8") as fp:
+        json.dump({"version": META_LAYOUT_VERSION, "clips": clips}, fp, ensure_ascii=False)
+    return clips
+
+def update_summary(root: PathLike, sidecars: Iterable[Path] = (), pack_keys: Iterable[str] = (), fsync: bool = False) -> dict[str, RunMetadata]:
+    """
+    サマリインデックスに，指定したサイドカーと pack のキーのメタデータだけを読み直して反映します (`root` 以下を探索しない)
+
+    サマリがまだない場合は `build_summary` で作成します．読めないサイドカー (失敗したジョブなど) は無視します．
+    """
+
+    root = Path(root)
+    if not (root / SUMMARY_NAME).exists():
+        return build_summary(root, fsync)
+
+    clips = load_summary(root)
+    for path in sidecars:
+        try:
+            meta = load_metadata(path)
+        except (OSError, ValueError):
+            continue
+        clips[meta["key"]] = meta
+    if pack_keys := set(pack_keys):
+        for key, entry in load_pack_index(root).items():
+            if key in pack_keys and (meta := entry.get("meta")) is not None:
+                clips[meta["key"]] = meta
+
+    with atomic_open(root / SUMMARY_NAME, "w", fsync=fsync, encoding="utf-8") as fp:
+        json.dump({"version": META_LAYOUT_VERSION, "clips": clips}, fp, ensure_ascii=False)
+    return clips
+
+def load_summary(root: PathLike) -> dict[str, RunMetadata]:
+    """サマリインデックスを読み込みます．存在しない場合は空の辞書を返します"""
+
+    path = Path(root) / SUMMARY_NAME
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)["clips"]
@@ -0,0 +1,258 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+複数のクリップを少数の大きなシャードファイルにまとめて追記する出力形式 (pack)
+
+    <pack>/
+    ├─ pack.json                  # レイアウトのバージョン
+    ├─ shards/<writer>-<seq>.bin  # 行を連結した生データ (C順序)
+    └─ index/<writer>.jsonl       # 1クリップ1行のインデックス
+
+シャードとインデックスはライタ (プロセス) 毎に別ファイルになるため，
+複数のワーカーがロックなしで同じ pack に追記できます．
+既存のファイルは書き換えず，後の実行は新しいシャードに追記されます．
+同じキーのクリップが複数ある場合は，後から追記されたものが有効です．
+"""
+
+import os
+import json
+import socket
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import quote
+from typing import Any, BinaryIO, Iterator, NotRequired, TypedDict, TypeVar
+
+import numpy as np
+
+from .atomic import atomic_open, temp_path
+from .writer import LandmarkWriter, NpyWriter
+
+_T = TypeVar("_T")
+NDArray = np.ndarray[Any, np.dtype[_T]]
+PathLike = str | Path
+
+PACK_LAYOUT_VERSION = 1
+PACK_SUFFIX = "pack"
+DEFAULT_SHARD_SIZE = 2 << 30 # 2 GiB
+
+class PackIndexEntry(TypedDict):
+    key: str
+    "クリップの識別子 (入力ディレクトリからの相対パス)"
+    source: str
+    "入力ファイルのパス"
+    shard: str
+    "shards/ 以下のファイル名"
+    offset: int
+    "シャード内のバイトオフセット"
+    frames: int
+    shape: list[int]
+    "1フレームあたりの形状"
+    dtype: str
+    fps: float
+    config_hash: str
+    created: float
+    "インデックスに登録した時刻 (UNIX時間)"
+    meta: NotRequired[dict[str, Any]]
+    "`mpdriver.utils.meta.RunMetadata`"
+
+def _read_jsonl(path: Path) -> Iterator[dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as fp:
+        for line in fp:
+            if not line.endswith("\n"): break # 書き込み途中の行
+            yield json.loads(line)
+
+def load_pack_index(root: PathLike) -> dict[str, PackIndexEntry]:
+    """pack のインデックスを読み込みます．キーが重複する場合は後から追記されたものが有効です"""
+
+    index_dir = Path(root) / "index"
+    if not index_dir.is_dir():
+        return {}
+
+    entries = sorted(
+        (entry for path in index_dir.glob("*.jsonl") for entry in _read_jsonl(path)),
+        key=lambda entry: entry.get("created", 0)
+    )
+    return {entry["key"]: entry for entry in entries}
+
+def clip_spool_path(root: Path, key: str) -> Path:
+    """他のクリップの書き込み中に行を退避するファイルの名前 (実際には `temp_path` の一時ファイルに書き込む)"""
+    return root / f"{quote(key, safe='')}.spool.npy"
+
+class PackWriter:
+    """
+    pack にクリップを追記するライタ
+
+    1プロセスに1つ作成し，複数のクリップで使い回します．
+    シャードが `shard_size` を超えると，次のクリップから新しいシャードに切り替えます．
+    `fsync` の場合は，クリップのデータをディスクに反映してからインデックスに登録します．
+    """
+
+    def __init__(self, root: PathLike, shard_size: int = DEFAULT_SHARD_SIZE, writer_id: str | None = None, fsync: bool = False):
+
+        self.root = Path(root)
+        self.shard_size = shard_size
+        self.fsync = fsync
+        self.writer_id = writer_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.seq = -1
+        self.shard: BinaryIO | None = None
+        self.shard_name = ""
+        self.active: PackClipWriter | None = None
+        "シャードへ書き込み中のクリップ"
+
+        os.makedirs(self.root / "shards", exist_ok=True)
+        os.makedirs(self.root / "index", exist_ok=True)
+        if not (meta := self.root / "pack.json").exists():
+            # 複数のワーカーが同時に作成しても，不完全な pack.json は見えない
+            with atomic_open(meta, "w") as fp:
+                json.dump({"version": PACK_LAYOUT_VERSION}, fp)
+
+        self.index_path = self.root / "index" / f"{self.writer_id}.jsonl"
+
+    def _rollover(self):
+        if self.shard is not None:
+            self.shard.close()
+        self.seq += 1
+        self.shard_name = f"{self.writer_id}-{self.seq:04d}.bin"
+        self.shard = open(self.root / "shards" / self.shard_name, "ab")
+
+    def shard_for_next_clip(self) -> BinaryIO:
+        if self.shard is None or self.shard.tell() >= self.shard_size:
+            self._rollover()
+        return self.shard
+
+    def open_clip(self, key: str, source: str, total: int, fps: float = 0., config_hash: str = "") -> "PackClipWriter":
+        return PackClipWriter(self, key, source, total, fps, config_hash)
+
+    def commit(self, entry: PackIndexEntry):
+        """データを書き終えたクリップをインデックスに追記します"""
+        self.shard.flush()
+        if self.fsync:
+            os.fsync(self.shard.fileno())
+        with open(self.index_path, "a", encoding="utf-8") as fp:
+            fp.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            if self.fsync:
+                fp.flush()
+                os.fsync(fp.fileno())
+
+    def close(self):
+        if self.shard is not None:
+            self.shard.close()
+            self.shard = None
+
+    def __del__(self):
+        self.close()
+
+class PackClipWriter(LandmarkWriter):
+    """
+    1クリップ分の行をシャードの末尾へ書き出し，close 時にインデックスへ登録します
+
+    同じ pack で別のクリップが書き込み中の場合は，行を一時的な .npy に退避し，
+    close 時にシャードへ追記します．
+    """
+
+    suffix = PACK_SUFFIX
+
+    def __init__(self, pack: PackWriter, key: str, source: str, total: int, fps: float = 0., config_hash: str = ""):
+        super().__init__(pack.root, total, atomic=False)
+        self.pack = pack
+        self.key = key
+        self.source = source
+        self.fps = fps
+        self.config_hash = config_hash
+        self.shard: BinaryIO | None = None
+        self.spool: NpyWriter | None = None
+        self.offset = 0
+        self.shape: tuple[int, ...] | None = None
+        self.dtype: np.dtype | None = None
+        self.meta: dict[str, Any] | None = None
+        "close 時にインデックスのエントリへ埋め込むメタデータ"
+
+    def _begin(self):
+        self.shard = self.pack.shard_for_next_clip()
+        self.offset = self.shard.tell()
+        self.pack.active = self
+
+    def write(self, row: NDArray[np.floating]):
+
+        if self.shape is None:
+            self.shape, self.dtype = row.shape, row.dtype.newbyteorder("<")
+            if self.pack.active is None:
+                self._begin()
+            else:
+                self.spool = NpyWriter(temp_path(clip_spool_path(self.pack.root, self.key)), self.total, atomic=False)
+
+        if self.spool is not None:
+            self.spool.write(row)
+        else:
+            self.shard.write(np.ascontiguousarray(row, dtype=self.dtype).tobytes())
+        self.count += 1
+
+    def close(self) -> int:
+
+        if self.shape is None:
+            return 0
+
+        if self.spool is not None: # 退避した行をシャードへ追記
+            self.spool.close()
+            self._begin()
+            spooled = np.load(self.spool.path, mmap_mode="r")
+            for start in range(0, len(spooled), 1024):
+                self.shard.write(np.ascontiguousarray(spooled[start:start + 1024], dtype=self.dtype).tobytes())
+            del spooled
+            self.spool.path.unlink(missing_ok=True)
+            self.spool = None
+
+        entry = PackIndexEntry(
+            key=self.key,
+            source=self.source,
+            shard=self.pack.shard_name,
+            offset=self.offset,
+            frames=self.count,
+            shape=list(self.shape),
+            dtype=self.dtype.str,
+            fps=self.fps,
+            config_hash=self.config_hash,
+            created=time.time()
+        )
+        if self.meta is not None:
+            entry["meta"] = self.meta
+        self.pack.commit(entry)
+        self.shard = None
+        self.pack.active = None
+        return self.count
+
+    def abort(self):
+
+        if self.spool is not None:
+            self.spool.abort()
+            self.spool = None
+
+        # 書き込んだデータはインデックスに登録せず，シャードを書き込み前の長さに戻す
+        if self.shard is None: return
+        self.shard.flush()
+        self.shard.truncate(self.offset)
+        self.shard.seek(self.offset) # truncate では位置が戻らない
+        self.shard = None
+        self.pack.active = None
+
+def read_pack_clip(root: PathLike, entry: PackIndexEntry) -> np.memmap:
+    """インデックスのエントリが指すクリップを np.memmap で開きます"""
+
+    return np.memmap(
+        Path(root) / "shards" / entry["shard"],
+        dtype=np.dtype(entry["dtype"]), mode="r",
+        offset=entry["offset"], shape=(entry["frames"], *entry["shape"])
+    )
@@ -0,0 +1,74 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+推論結果 (正規化前の全ランドマーク) のキャッシュ
+
+    <cache>/<holistic のハッシュ>/<入力の内容のハッシュ>.raw.npy    # (T, 543, 4)
+    <cache>/<holistic のハッシュ>/<入力の内容のハッシュ>.raw.json   # 入力の情報
+
+推論の結果は holistic の設定と入力の内容だけで決まります．
+`landmark_indices`，`dimension_targets`，normalize，clip，flat を変えた出力は，キャッシュから推論せずに作り直せます．
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Iterator, TypedDict
+
+from .atomic import atomic_open
+from .meta import SourceInfo
+
+RAW_CACHE_SUFFIX = ".raw.npy"
+RAW_CACHE_INFO_SUFFIX = ".raw.json"
+
+class RawCacheInfo(TypedDict):
+    content_hash: str
+    holistic_hash: str
+    source: SourceInfo
+    "キャッシュを作成したときの入力"
+    frames: int
+    created: float
+
+def raw_cache_path(root: Path, holistic_hash: str, content_hash: str) -> Path:
+    return root / holistic_hash / f"{content_hash}{RAW_CACHE_SUFFIX}"
+
+def raw_cache_info_path(cache_file: Path) -> Path:
+    return cache_file.with_name(cache_file.name[:-len(RAW_CACHE_SUFFIX)] + RAW_CACHE_INFO_SUFFIX)
+
+def write_raw_cache_info(cache_file: Path, source: SourceInfo, frames: int, fsync: bool = False):
+
+    content_hash, holistic_hash = cache_file.name[:-len(RAW_CACHE_SUFFIX)], cache_file.parent.name
+    info = RawCacheInfo(content_hash=content_hash, holistic_hash=holistic_hash, source=source, frames=frames, created=time.time())
+    with atomic_open(raw_cache_info_path(cache_file), "w", fsync=fsync, encoding="utf-8") as fp:
+        json.dump(info, fp, ensure_ascii=False, indent=1)
+
+def load_raw_cache_info(cache_file: Path) -> RawCacheInfo:
+    with open(raw_cache_info_path(cache_file), "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+def iter_raw_cache(root: Path, holistic_hash: str) -> Iterator[tuple[Path, RawCacheInfo]]:
+    """holistic の設定が同じキャッシュを (キャッシュのパス, 情報) で返します (情報が壊れたものは除く)"""
+
+    directory = root / holistic_hash
+    if not directory.is_dir():
+        return
+    for info_path in directory.glob(f"*{RAW_CACHE_INFO_SUFFIX}"):
+        cache_file = info_path.with_name(info_path.name[:-len(RAW_CACHE_INFO_SUFFIX)] + RAW_CACHE_SUFFIX)
+        try:
+            info = load_raw_cache_info(cache_file)
+        except (OSError, ValueError):
+            continue
+        if cache_file.exists():
+            yield cache_file, info
@@ -0,0 +1,210 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+from typing import Any, Iterator, Literal, Sequence, TypeVar, overload
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from .atomic import is_temp_path
+from .pack import PackIndexEntry, load_pack_index
+from .raw_cache import RAW_CACHE_SUFFIX
+from .writer import CSV_ROW_GROUPS_SUFFIX
+
+_T = TypeVar("_T")
+NDArray = np.ndarray[Any, np.dtype[_T]]
+PathLike = str | Path
+
+PadMode = Literal["constant", "edge"]
+
+SIDECAR_SUFFIXES = (".mirror.npy", RAW_CACHE_SUFFIX, CSV_ROW_GROUPS_SUFFIX)
+"ランドマークと同じディレクトリに出力される付随ファイル (`mpdriver run` の mirror, raw と .csv の行グループ)"
+
+def sliding_windows(
+    array: NDArray[_T],
+    length: int,
+    stride: int = 1,
+    pad: PadMode | None = None,
+    pad_value: float = 0.
+    ) -> NDArray[_T]:
+    """
+    時間軸 (axis=0) に沿って固定長の窓を切り出します
+
+    パディングが不要な場合は `as_strided` による読み取り専用のビューを返し，データをコピーしません．
+
+    Args:
+        array (NDArray): (T, ...) の配列
+        length (int): 窓の長さ
+        stride (int, optional): 窓をずらすフレーム数. Defaults to 1.
+        pad (PadMode | None, optional): 末尾の端数を埋める方法．None なら端数の窓は捨てる. Defaults to None.
+        pad_value (float, optional): pad="constant" のときの値. Defaults to 0.
+
+    Returns:
+        NDArray: (n_windows, length, ...) の配列
+    """
+
+    if length < 1 or stride < 1:
+        raise ValueError(f"length and stride must be positive ({length=}, {stride=})")
+
+    frames = array.shape[0]
+
+    if pad is not None:
+        # 最後の窓が末尾のフレームを含むように，必要な分だけパディングする
+        n_windows = max(1, -(-max(frames - length, 0) // stride) + 1)
+        pad_width = (n_windows - 1) * stride + length - frames
+        if pad_width > 0:
+            widths = [(0, pad_width)] + [(0, 0)] * (array.ndim - 1)
+            if pad == "constant":
+                array = np.pad(array, widths, mode="constant", constant_values=pad_value)
+            else:
+                array = np.pad(array, widths, mode=pad)
+    elif frames < length:
+        return np.empty((0, length, *array.shape[1:]), dtype=array.dtype)
+    else:
+        n_windows = (frames - length) // stride + 1
+
+    return as_strided(
+        array,
+        shape=(n_windows, length, *array.shape[1:]),
+        strides=(array.strides[0] * stride, *array.strides),
+        writeable=False
+    )
+
+def load_csv_row_groups(path: PathLike) -> NDArray[np.int64]:
+    """
+    `CsvWriter(row_group=...)` が出力した行グループの境界を読み込みます
+
+    Returns:
+        NDArray[np.int64]: (n_groups + 1, 2) の (開始行, バイトオフセット)．末尾はファイル全体の (行数, サイズ)
+    """
+    path = Path(path)
+    return np.load(path.with_name(path.name + CSV_ROW_GROUPS_SUFFIX))
+
+def read_csv_row_group(path: PathLike, group: int, dtype: type[np.floating] = np.float32) -> NDArray[np.floating]:
+    """
+    .csv の1つの行グループだけを読み込みます
+
+    行グループ毎にファイルの一部のバイト範囲のみを読むため，別々のプロセスやスレッドから並列に呼び出せます．
+    """
+
+    bounds = load_csv_row_groups(path)
+    (start_row, start), (stop_row, stop) = bounds[group], bounds[group + 1]
+
+    with open(path, "rb") as fp:
+        fp.seek(start)
+        text = fp.read(stop - start)
+
+    rows = np.loadtxt(text.decode().splitlines(), delimiter=",", dtype=dtype, ndmin=2)
+    if rows.shape[0] != stop_row - start_row:
+        raise ValueError(f"row group {group} is corrupted ({rows.shape[0]} != {stop_row - start_row} rows)")
+    return rows
+
+class LandmarkDataset(Sequence[NDArray[Any]]):
+    """
+    MPDriver の出力を memmap で開くリーダ
+
+    `root` には .npy ファイル，.npy を含むディレクトリ，または pack ディレクトリを指定します．
+    ディレクトリでは `exclude` の接尾辞を持つ付随ファイルと書き込み途中の一時ファイルを除きます．
+    クリップは `np.memmap` のビューとして返され，ファイル全体を読み込みません．
+    pack ではシャード毎に1つの memmap を共有します．
+    """
+
+    def __init__(self, root: PathLike, pattern: str = "**/*.npy", exclude: Sequence[str] = SIDECAR_SUFFIXES):
+
+        self.root = Path(root)
+        self._shards = dict[str, np.memmap]()
+        self._clips = dict[str, NDArray[Any]]()
+        self.entries: dict[str, PackIndexEntry] | None = None
+
+        if (self.root / "pack.json").exists(): # pack
+            self.entries = load_pack_index(self.root)
+            self.keys = list(self.entries)
+        elif self.root.is_file(): # 単一の .npy
+            self.keys = [self.root.name]
+        else: # .npy を含むディレクトリ
+            self.keys = sorted(
+                p.relative_to(self.root).as_posix() for p in self.root.glob(pattern)
+                if not p.name.endswith(tuple(exclude)) and not is_temp_path(p)
+            )
+
+    def _open_pack_clip(self, entry: PackIndexEntry) -> NDArray[Any]:
+
+        if (shard := self._shards.get(entry["shard"])) is None:
+            shard = self._shards[entry["shard"]] = np.memmap(self.root / "shards" / entry["shard"], dtype=np.uint8, mode="r")
+
+        dtype = np.dtype(entry["dtype"])
+        nbytes = entry["frames"] * int(np.prod(entry["shape"], dtype=np.int64)) * dtype.itemsize
+        return shard[entry["offset"]:entry["offset"] + nbytes].view(dtype).reshape(entry["frames"], *entry["shape"])
+
+    def open(self, key: str) -> NDArray[Any]:
+        """キーに対応するクリップを読み取り専用のビューとして開きます"""
+
+        if (clip := self._clips.get(key)) is not None:
+            return clip
+
+        if self.entries is not None:
+            clip = self._open_pack_clip(self.entries[key])
+        elif self.root.is_file():
+            clip = np.load(self.root, mmap_mode="r")
+        else:
+            clip = np.load(self.root / key, mmap_mode="r")
+
+        self._clips[key] = clip
+        return clip
+
+    def frames(self, key: str) -> int:
+        if self.entries is not None:
+            return self.entries[key]["frames"]
+        return self.open(key).shape[0]
+
+    def clip(self, key: str, start: int | None = None, stop: int | None = None) -> NDArray[Any]:
+        """クリップの一部のフレームをコピーせずに取り出します"""
+        return self.open(key)[start:stop]
+
+    def windows(
+        self,
+        key: str,
+        length: int,
+        stride: int = 1,
+        pad: PadMode | None = None,
+        pad_value: float = 0.
+        ) -> NDArray[Any]:
+        """クリップから固定長の窓を切り出します．`sliding_windows` を参照"""
+        return sliding_windows(self.open(key), length, stride, pad, pad_value)
+
+    def iter_windows(
+        self,
+        length: int,
+        stride: int = 1,
+        pad: PadMode | None = None,
+        pad_value: float = 0.
+        ) -> Iterator[tuple[str, NDArray[Any]]]:
+        """全てのクリップについて (キー, 窓) を順に返します"""
+        for key in self.keys:
+            yield key, self.windows(key, length, stride, pad, pad_value)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @overload
+    def __getitem__(self, index: int | str) -> NDArray[Any]: ...
+    @overload
+    def __getitem__(self, index: slice) -> list[NDArray[Any]]: ...
+    def __getitem__(self, index: int | str | slice):
+        if isinstance(index, str):
+            return self.open(index)
+        if isinstance(index, slice):
+            return [self.open(key) for key in self.keys[index]]
+        return self.open(self.keys[index])
@@ -0,0 +1,108 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+from typing import Any, Mapping, TypeVar
+
+import numpy as np
+
+_T = TypeVar("_T")
+NDArray = np.ndarray[Any, np.dtype[_T]]
+PathLike = str | Path
+
+SPARSE_LAYOUT_VERSION = 1
+
+def _target_bounds(sizes: NDArray[np.int64]) -> list[tuple[int, int]]:
+    bounds = np.concatenate([[0], np.cumsum(sizes)])
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+def to_sparse(matrix: NDArray[np.floating], target_sizes: Mapping[str, int], n_dims: int) -> dict[str, NDArray[Any]]:
+    """密なランドマーク行列を，ターゲット毎の存在ビットマスクと検出フレームの値に分解します
+
+    Args:
+        matrix (NDArray): (T, L * D) または (T, L, D) のランドマーク行列
+        target_sizes (Mapping[str, int]): 出力順のターゲット名とランドマーク数
+        n_dims (int): 1ランドマークあたりの次元数 D
+
+    Returns:
+        dict[str, NDArray]: np.savez にそのまま渡せる配列の辞書
+    """
+
+    frames = matrix.shape[0]
+    cube = matrix.reshape(frames, -1, n_dims)
+    targets = list(target_sizes.keys())
+    sizes = np.array(list(target_sizes.values()), dtype=np.int64)
+
+    if cube.shape[1] != sizes.sum():
+        raise ValueError(f"number of landmarks mismatch ({cube.shape[1]} != {sizes.sum()})")
+
+    bounds = _target_bounds(sizes)
+    presence = np.zeros((frames, len(targets)), dtype=np.bool_)
+    for i, (start, end) in enumerate(bounds):
+        if start == end: continue # 出力対象外のターゲット
+        presence[:, i] = ~np.isnan(cube[:, start:end]).all(axis=(1, 2))
+
+    arrays: dict[str, NDArray[Any]] = {
+        "version": np.array(SPARSE_LAYOUT_VERSION),
+        "shape": np.array(matrix.shape, dtype=np.int64),
+        "targets": np.array(targets),
+        "sizes": sizes,
+        "mask": np.packbits(presence, axis=1, bitorder="little"),
+    }
+    for i, (target, (start, end)) in enumerate(zip(targets, bounds)):
+        arrays[f"values_{target}"] = np.ascontiguousarray(cube[presence[:, i], start:end])
+
+    return arrays
+
+def save_sparse(file: PathLike, matrix: NDArray[np.floating], target_sizes: Mapping[str, int], n_dims: int):
+    """ランドマーク行列を疎な .npz 形式で保存します"""
+
+    np.savez(file, **to_sparse(matrix, target_sizes, n_dims))
+
+def _unpack_presence(npz: Mapping[str, NDArray[Any]]) -> NDArray[np.bool_]:
+    n_targets = len(npz["targets"])
+    return np.unpackbits(npz["mask"], axis=1, count=n_targets, bitorder="little").astype(np.bool_)
+
+def load_presence(file: PathLike) -> tuple[list[str], NDArray[np.bool_]]:
+    """ランドマークの値を読まずに，存在ビットマスクのみを読み込みます
+
+    Returns:
+        tuple[list[str], NDArray[np.bool_]]: ターゲット名と (T, n_targets) の存在フラグ
+    """
+
+    with np.load(file) as npz:
+        return npz["targets"].tolist(), _unpack_presence(npz)
+
+def load_sparse(file: PathLike) -> NDArray[np.floating]:
+    """疎な .npz 形式から，未検出を NaN で埋めた密なランドマーク行列を復元します"""
+
+    with np.load(file) as npz:
+
+        shape = tuple(npz["shape"].tolist())
+        targets: list[str] = npz["targets"].tolist()
+        sizes = npz["sizes"]
+        presence = _unpack_presence(npz)
+        values = {target: npz[f"values_{target}"] for target in targets}
+
+    dtype = next((v.dtype for v in values.values() if v.size), np.float32)
+    matrix = np.full(shape, np.nan, dtype=dtype)
+    n_dims = next((v.shape[-1] for v in values.values() if v.ndim == 3), None)
+    if n_dims is None:
+        return matrix
+
+    cube = matrix.reshape(shape[0], -1, n_dims)
+    for i, (target, (start, end)) in enumerate(zip(targets, _target_bounds(sizes))):
+        cube[presence[:, i], start:end] = values[target]
+
+    return matrix
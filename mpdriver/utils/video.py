@@ -2,8 +2,16 @@ from pathlib import Path
 from itertools import count, chain
 from typing import overload, TypeAlias, Iterable, Iterator, TypedDict, Literal, Callable
 from typing_extensions import Self
+from threading import Thread
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
+import os
+import subprocess
 import mimetypes
+import shutil
+import numpy as np
 import cv2
+import ffmpeg
 
 PathLike = str | Path
 
@@ -188,6 +196,205 @@ class FFmpegStream:
     fps: int = 25, z: float = ...
     ) -> Self: ...
 
+FFMPEG_STDOUT = "-"
+FFMPEG_STDOUT_FORMATS = {
+  'y4m': {'format': 'yuv4mpegpipe'},
+  'raw': {'format': 'rawvideo', 'pix_fmt': 'bgr24'},
+}
+
+def ffmpeg_available(cmd: str = "ffmpeg") -> bool:
+  return shutil.which(cmd) is not None
+
+class FFmpegWriter:
+  """フレームを ffmpeg のサブプロセスへパイプで渡して符号化します
+
+  符号化は別プロセスで行われるため，推論と並行して進みます．
+  cv2.VideoWriter と同じく write / release / isOpened で使用できます．
+
+  filename に "-" を指定すると，y4m または raw (bgr24) のフレームを ffmpeg から直接標準出力へ書き出します．
+  """
+
+  def __init__(
+    self,
+    filename: PathLike,
+    fps: float,
+    frame_size: tuple[int, int],
+    codec: str = "libx264",
+    preset: str | None = "veryfast",
+    crf: int | None = 23,
+    threads: int = 0,
+    pix_fmt: str = "yuv420p",
+    stdout_format: Literal["y4m", "raw"] = "y4m",
+    cmd: str = "ffmpeg"
+    ):
+    """
+    Args:
+        filename (PathLike): 出力先．"-" なら標準出力
+        fps (float): フレームレート
+        frame_size (tuple[int, int]): (幅, 高さ)
+        codec (str, optional): エンコーダ. Defaults to "libx264".
+        preset (str | None, optional): エンコーダのプリセット. Defaults to "veryfast".
+        crf (int | None, optional): 品質 (小さいほど高画質). Defaults to 23.
+        threads (int, optional): エンコーダのスレッド数．0 なら ffmpeg に任せる. Defaults to 0.
+        pix_fmt (str, optional): 出力の画素形式. Defaults to "yuv420p".
+        stdout_format (Literal["y4m", "raw"], optional): 標準出力へ書き出すときの形式. Defaults to "y4m".
+        cmd (str, optional): ffmpeg の実行ファイル. Defaults to "ffmpeg".
+    """
+
+    width, height = frame_size
+    self.frame_size = frame_size
+    self.stderr = b""
+
+    stream = ffmpeg.input("pipe:", format="rawvideo", pix_fmt="bgr24", s=f"{width}x{height}", framerate=fps)
+
+    if str(filename) == FFMPEG_STDOUT:
+      output_kwargs = {'pix_fmt': pix_fmt} | FFMPEG_STDOUT_FORMATS[stdout_format]
+      stream = stream.output("pipe:", **output_kwargs)
+    else:
+      output_kwargs = {'vcodec': codec, 'pix_fmt': pix_fmt}
+      if preset: output_kwargs['preset'] = preset
+      if crf is not None: output_kwargs['crf'] = crf
+      if threads: output_kwargs['threads'] = threads
+      stream = stream.output(str(filename), **output_kwargs)
+
+    # stdout は親プロセスのものをそのまま使い，Python を経由せずに書き出す
+    self.process = (
+      stream.global_args("-hide_banner", "-loglevel", "error")
+      .overwrite_output()
+      .run_async(cmd=cmd, pipe_stdin=True, pipe_stderr=True)
+    )
+    self._stderr_reader = Thread(target=self._read_stderr, daemon=True)
+    self._stderr_reader.start()
+
+  def _read_stderr(self):
+    self.stderr = self.process.stderr.read()
+
+  def isOpened(self) -> bool:
+    return self.process.poll() is None and not self.process.stdin.closed
+
+  def write(self, image: cv2.Mat):
+
+    if (image.shape[1], image.shape[0]) != self.frame_size:
+      raise ValueError(f"frame size mismatch ({image.shape[1]}x{image.shape[0]} != {self.frame_size[0]}x{self.frame_size[1]})")
+
+    try:
+      self.process.stdin.write(memoryview(np.ascontiguousarray(image)))
+    except BrokenPipeError:
+      self.release()
+      raise
+
+  def release(self):
+    """入力を閉じて符号化の完了を待ちます．ffmpeg が失敗した場合は RuntimeError を送出します"""
+
+    if self.process.stdin.closed: return
+
+    try:
+      self.process.stdin.close()
+    except BrokenPipeError:
+      pass
+    returncode = self.process.wait()
+    self._stderr_reader.join()
+
+    if returncode != 0:
+      raise RuntimeError(f"ffmpeg exited with {returncode}: {self.stderr.decode(errors='replace').strip()}")
+
+  def kill(self):
+    """符号化を中断します"""
+    self.process.kill()
+    self.process.wait()
+    try:
+      self.process.stdin.close()
+    except BrokenPipeError:
+      pass
+
+class ImageSequenceWriter:
+  """フレームを連番画像として，スレッドプールで並列に符号化して書き出します
+
+  cv2.imencode は符号化中に GIL を解放するため，推論と並行して複数のフレームを符号化できます．
+  未完了のフレームが `max_pending` を超えると，古いものから完了を待ちます．
+  """
+
+  def __init__(
+    self,
+    directory: PathLike,
+    suffix: str = ".png",
+    digits: int = 4,
+    quality: int = 95,
+    compression: int = 1,
+    threads: int = 0,
+    max_pending: int = 0
+    ):
+    """
+    Args:
+        directory (PathLike): 出力ディレクトリ．存在しない場合は作成します
+        suffix (str, optional): 画像の拡張子. Defaults to ".png".
+        digits (int, optional): 連番の桁数. Defaults to 4.
+        quality (int, optional): JPEG / WebP の品質 (0 ~ 100). Defaults to 95.
+        compression (int, optional): PNG の圧縮レベル (0 ~ 9). Defaults to 1.
+        threads (int, optional): 符号化のスレッド数．0 なら min(4, CPU数). Defaults to 0.
+        max_pending (int, optional): 未完了のフレーム数の上限．0 なら threads の2倍. Defaults to 0.
+    """
+
+    self.directory = Path(directory)
+    self.suffix = suffix
+    self.digits = digits
+    self.index = 0
+
+    ext = suffix.lower()
+    if ext in (".jpg", ".jpeg", ".jpe"):
+      self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    elif ext == ".webp":
+      self.params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    elif ext == ".png":
+      self.params = [cv2.IMWRITE_PNG_COMPRESSION, compression]
+    else:
+      self.params = []
+
+    threads = threads or min(4, os.cpu_count() or 1)
+    self.max_pending = max_pending or 2 * threads
+    self.pending = deque[Future[None]]()
+
+    os.makedirs(self.directory, exist_ok=True)
+    self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="ImageSequenceWriter")
+
+  def _write(self, path: Path, image: cv2.Mat):
+    ok, buffer = cv2.imencode(self.suffix, image, self.params)
+    if not ok:
+      raise ValueError(f"failed to encode '{path}'")
+    with open(path, "wb") as fp:
+      fp.write(memoryview(buffer))
+
+  def isOpened(self) -> bool:
+    return self.executor is not None
+
+  def write(self, image: cv2.Mat):
+
+    path = self.directory / f"{self.index:0{self.digits}}{self.suffix}"
+    self.pending.append(self.executor.submit(self._write, path, image))
+    self.index += 1
+
+    while len(self.pending) > self.max_pending:
+      self.pending.popleft().result()
+
+  def release(self):
+    """全てのフレームの書き出しを待ちます"""
+
+    if self.executor is None: return
+    try:
+      while self.pending:
+        self.pending.popleft().result()
+    finally:
+      self.executor.shutdown()
+      self.executor = None
+
+  def kill(self):
+    """未着手のフレームを破棄して終了します"""
+
+    if self.executor is None: return
+    self.pending.clear()
+    self.executor.shutdown(cancel_futures=True)
+    self.executor = None
+
 def cap_to_frame_iter(
   cap: VideoCapture,
   start: int | None = None,
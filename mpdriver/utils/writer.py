@@ -0,0 +1,519 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import struct
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from types import TracebackType
+from typing import Any, BinaryIO, ClassVar, Mapping, TypeVar
+from typing_extensions import Self
+
+import numpy as np
+
+from .atomic import temp_path, makedirs, atomic_replace, atomic_open
+from .sparse import SPARSE_LAYOUT_VERSION
+from .delta import delta_encode
+from .lmz import (
+    LMZ_LAYOUT_VERSION, DEFAULT_CHUNK_FRAMES, LmzHeader,
+    get_codec, write_lmz_header, write_lmz_chunk, write_lmz_index
+)
+
+_T = TypeVar("_T")
+NDArray = np.ndarray[Any, np.dtype[_T]]
+PathLike = str | Path
+
+CSV_ROW_GROUPS_SUFFIX = ".rowgroups.npy"
+
+def _rewrite_npy_header(path: PathLike, shape: tuple[int, ...], dtype: np.dtype):
+    """.npy のヘッダの shape を，データの位置を変えずに書き換えます"""
+
+    with open(path, "r+b") as fp:
+
+        major, _ = np.lib.format.read_magic(fp)
+        len_format = "<H" if major == 1 else "<I"
+        len_size = struct.calcsize(len_format)
+        (header_len,) = struct.unpack(len_format, fp.read(len_size))
+
+        header = repr({
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": shape,
+        }).encode("latin1")
+
+        if len(header) + 1 > header_len:
+            raise ValueError(f"npy header overflow ({len(header) + 1} > {header_len})")
+
+        fp.seek(np.lib.format.MAGIC_LEN + len_size)
+        fp.write(header + b" " * (header_len - len(header) - 1) + b"\n")
+
+class LandmarkWriter:
+    """
+    ランドマークを1フレームずつディスクへ書き出すライタの基底クラス
+
+    行は生成された順に `write` で渡され，`close` で出力を確定します．
+    1行も書かれなかった場合は出力を残しません．
+
+    `atomic` の場合は同じディレクトリの一時ファイル `tmp_path` に書き込み，close 時に `path` へ置き換えます．
+    書き込み途中の出力が `path` に現れることはありません．
+    """
+
+    suffix: ClassVar[str]
+
+    def __init__(self, path: Path, total: int, atomic: bool = True, fsync: bool = False):
+        self.path = path
+        self.total = total
+        self.count = 0
+        self.atomic = atomic
+        self.fsync = fsync
+        self.tmp_path = temp_path(path) if atomic else path
+
+    def _commit(self):
+        """書き終えた一時ファイルを出力先へ置き換えます"""
+        if self.atomic:
+            atomic_replace(self.tmp_path, self.path, self.fsync)
+
+    def write(self, row: NDArray[np.floating]):
+        raise NotImplementedError
+
+    def close(self) -> int:
+        """出力を確定し，書き出したフレーム数を返します"""
+        raise NotImplementedError
+
+    def abort(self):
+        """書き出し途中の出力を破棄します"""
+        raise NotImplementedError
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc_value: BaseException | None, traceback: TracebackType | None):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class NpyWriter(LandmarkWriter):
+    """
+    `np.lib.format.open_memmap` で既知のフレーム数分の .npy を確保し，行を直接書き込みます．
+    close 時に実際のフレーム数へ切り詰めます．
+    """
+
+    suffix = ".npy"
+
+    def __init__(self, path: Path, total: int, atomic: bool = True, fsync: bool = False):
+        super().__init__(path, total, atomic, fsync)
+        self.memmap: np.memmap | None = None
+
+    def write(self, row: NDArray[np.floating]):
+
+        if self.memmap is None:
+            makedirs(self.path)
+            self.memmap = np.lib.format.open_memmap(
+                self.tmp_path, mode="w+", dtype=row.dtype, shape=(max(self.total, 1), *row.shape)
+            )
+
+        if self.count >= self.memmap.shape[0]:
+            raise ValueError(f"frame count exceeds the allocated size ({self.memmap.shape[0]})")
+
+        self.memmap[self.count] = row
+        self.count += 1
+
+    def close(self) -> int:
+
+        if self.memmap is None:
+            return 0
+
+        shape, dtype, offset = self.memmap.shape, self.memmap.dtype, self.memmap.offset
+        self.memmap.flush()
+        self.memmap = None
+
+        if self.count < shape[0]: # 確保したサイズより少なければ切り詰める
+            row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+            _rewrite_npy_header(self.tmp_path, (self.count, *shape[1:]), dtype)
+            os.truncate(self.tmp_path, offset + self.count * row_bytes)
+
+        self._commit()
+        return self.count
+
+    def abort(self):
+        if self.memmap is None: return
+        self.memmap = None
+        self.tmp_path.unlink(missing_ok=True)
+
+def _round_trip_precision(dtype: np.dtype) -> int:
+    """値を失わずに往復できる有効桁数 (float32: 9, float64: 17)"""
+    return int(np.ceil(1 + (np.finfo(dtype).nmant + 1) * np.log10(2)))
+
+class CsvWriter(LandmarkWriter):
+    """
+    行を `chunk_size` 行ずつまとめて .csv に追記します
+
+    チャンク全体を1つの書式文字列で一度に整形し，バッファ付きのバイナリストリームへ書き込みます．
+    `precision` を省略すると dtype の値を失わない桁数 (`%.9g` / `%.17g`) で出力します．
+    未検出の値は `nan` になります．
+
+    `row_group` を指定すると，その行数毎の (開始行, バイトオフセット) を
+    `<name>.csv.rowgroups.npy` に出力し，行グループ単位で並列に読み込めるようにします．
+    """
+
+    suffix = ".csv"
+
+    def __init__(
+        self,
+        path: Path,
+        total: int,
+        header: str = "",
+        chunk_size: int = 1024,
+        precision: int | None = None,
+        row_group: int = 0,
+        buffer_size: int = 1 << 20,
+        atomic: bool = True,
+        fsync: bool = False
+        ):
+
+        super().__init__(path, total, atomic, fsync)
+        self.header = header
+        self.chunk_size = row_group or chunk_size # 行グループの境界とチャンクの境界を揃える
+        self.precision = precision
+        self.row_group = row_group
+        self.buffer_size = buffer_size
+        self.buffer = list[NDArray[np.floating]]()
+        self.fp: BinaryIO | None = None
+        self.row_fmt = ""
+        self.row_groups = list[tuple[int, int]]()
+
+    @property
+    def row_groups_path(self) -> Path:
+        return self.path.with_name(self.path.name + CSV_ROW_GROUPS_SUFFIX)
+
+    def flush(self):
+
+        if not self.buffer: return
+
+        if self.fp is None:
+            makedirs(self.path)
+            self.fp = open(self.tmp_path, "wb", buffering=self.buffer_size)
+            if self.header:
+                self.fp.write(f"# {self.header}\n".encode())
+            row = self.buffer[0]
+            precision = _round_trip_precision(row.dtype) if self.precision is None else self.precision
+            self.row_fmt = ",".join([f"%.{precision}g"] * row.shape[0]) + "\n"
+
+        if self.row_group:
+            self.row_groups.append((self.count - len(self.buffer), self.fp.tell()))
+
+        block = np.stack(self.buffer)
+        self.fp.write(((self.row_fmt * block.shape[0]) % tuple(block.ravel().tolist())).encode())
+        self.buffer.clear()
+
+    def write(self, row: NDArray[np.floating]):
+
+        if row.ndim != 1:
+            raise ValueError(f"matrix.ndim != 2 ({row.ndim + 1})")
+
+        self.buffer.append(row)
+        self.count += 1
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def close(self) -> int:
+        self.flush()
+        if self.fp is None:
+            return self.count
+
+        if self.row_group: # 末尾の (行数, ファイルサイズ) を番兵として追加
+            self.row_groups.append((self.count, self.fp.tell()))
+            with atomic_open(self.row_groups_path, fsync=self.fsync) as fp:
+                np.save(fp, np.array(self.row_groups, dtype=np.int64))
+
+        self.fp.close()
+        self.fp = None
+        self._commit()
+        return self.count
+
+    def abort(self):
+        self.buffer.clear()
+        if self.fp is None: return
+        self.fp.close()
+        self.fp = None
+        self.tmp_path.unlink(missing_ok=True)
+
+class NpzWriter(LandmarkWriter):
+    """
+    .npz を出力します．行は一時的な .npy (memmap) に退避し，close 時に .npz へまとめます．
+
+    `sparse` の場合はターゲット毎に検出されたフレームの値のみを退避し，
+    `mpdriver.utils.sparse` と同じレイアウトで出力します．
+    `compress` の場合は `np.savez_compressed` で出力します．
+    """
+
+    suffix = ".npz"
+
+    def __init__(
+        self,
+        path: Path,
+        total: int,
+        sparse: bool = False,
+        target_sizes: Mapping[str, int] | None = None,
+        n_dims: int | None = None,
+        compress: bool = False,
+        fsync: bool = False
+        ):
+
+        super().__init__(path, total, fsync=fsync)
+
+        if sparse and (target_sizes is None or n_dims is None):
+            raise ValueError("sparse layout requires target_sizes and n_dims")
+
+        self.sparse = sparse
+        self.compress = compress
+        self.target_sizes = dict(target_sizes or {})
+        self.n_dims = n_dims
+        self.shape: tuple[int, ...] | None = None
+        self.dtype: np.dtype | None = None
+        self.presence = np.zeros((max(total, 1), len(self.target_sizes)), dtype=np.bool_)
+        self.spools: dict[str, NpyWriter] = {}
+
+    def _spool_path(self, name: str) -> Path:
+        return temp_path(self.path.with_name(f"{self.path.name}.{name}"))
+
+    def write(self, row: NDArray[np.floating]):
+
+        if self.shape is None:
+            self.shape, self.dtype = row.shape, row.dtype
+            names = list(self.target_sizes) if self.sparse else ["landmarks"]
+            self.spools = {name: NpyWriter(self._spool_path(name), self.total, atomic=False) for name in names}
+
+        if not self.sparse:
+            self.spools["landmarks"].write(row)
+            self.count += 1
+            return
+
+        if self.count >= self.presence.shape[0]:
+            raise ValueError(f"frame count exceeds the allocated size ({self.presence.shape[0]})")
+
+        landmarks = row.reshape(-1, self.n_dims)
+        start = 0
+        for i, (target, size) in enumerate(self.target_sizes.items()):
+            values = landmarks[start:start + size]
+            start += size
+            if size == 0 or np.isnan(values).all(): continue # 未検出
+            self.presence[self.count, i] = True
+            self.spools[target].write(values)
+        self.count += 1
+
+    def _load_spool(self, name: str, shape: tuple[int, ...], dtype: np.dtype) -> NDArray[Any]:
+        if self.spools[name].close() == 0:
+            return np.empty((0, *shape), dtype=dtype)
+        return np.load(self.spools[name].path, mmap_mode="r")
+
+    def close(self) -> int:
+
+        if self.shape is None:
+            return 0
+
+        if self.sparse:
+            arrays: dict[str, NDArray[Any]] = {
+                "version": np.array(SPARSE_LAYOUT_VERSION),
+                "shape": np.array((self.count, *self.shape), dtype=np.int64),
+                "targets": np.array(list(self.target_sizes)),
+                "sizes": np.array(list(self.target_sizes.values()), dtype=np.int64),
+                "mask": np.packbits(self.presence[:self.count], axis=1, bitorder="little"),
+            } | {
+                f"values_{target}": self._load_spool(target, (size, self.n_dims), self.dtype)
+                for target, size in self.target_sizes.items()
+            }
+        else:
+            arrays = {"landmarks": self._load_spool("landmarks", self.shape, self.dtype)}
+
+        with atomic_open(self.path, fsync=self.fsync) as fp:
+            (np.savez_compressed if self.compress else np.savez)(fp, **arrays)
+
+        del arrays
+        for spool in self.spools.values():
+            spool.path.unlink(missing_ok=True)
+
+        return self.count
+
+    def abort(self):
+        for spool in self.spools.values():
+            spool.abort()
+            spool.path.unlink(missing_ok=True)
+
+class LmzWriter(LandmarkWriter):
+    """
+    行を `chunk_size` フレームずつ圧縮して .lmz (`mpdriver.utils.lmz`) に追記します
+
+    圧縮と書き込みはバックグラウンドのスレッドで行い，その間に次のチャンクの推論を進めます．
+    zlib / lzma / zstd は圧縮中に GIL を解放します．
+    未完了のチャンクが `max_pending` を超えると，古いものから完了を待ちます．
+
+    `delta_step` を指定すると，各チャンクを `step` 刻みに量子化して差分符号化してから圧縮します (非可逆)．
+    チャンクの先頭がキーフレームになるため，`chunk_size` がランダムアクセスの単位です．
+    """
+
+    suffix = ".lmz"
+
+    def __init__(
+        self,
+        path: Path,
+        total: int,
+        codec: str = "zlib",
+        level: int | None = None,
+        chunk_size: int = DEFAULT_CHUNK_FRAMES,
+        max_pending: int = 2,
+        delta_step: float | None = None,
+        atomic: bool = True,
+        fsync: bool = False
+        ):
+
+        super().__init__(path, total, atomic, fsync)
+        self.codec = codec
+        self.level = level
+        self.compress = get_codec(codec, level)[0]
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending
+        self.delta_step = delta_step
+        self.buffer = list[NDArray[np.floating]]()
+        self.fp: BinaryIO | None = None
+        self.executor: ThreadPoolExecutor | None = None
+        self.pending = list[Future[None]]()
+        self.index = list[tuple[int, int]]()
+
+    def _open(self, row: NDArray[np.floating]):
+        makedirs(self.path)
+        self.fp = open(self.tmp_path, "wb")
+        write_lmz_header(self.fp, LmzHeader(
+            version=LMZ_LAYOUT_VERSION,
+            codec=self.codec,
+            level=self.level,
+            dtype=row.dtype.newbyteorder("<").str,
+            shape=list(row.shape),
+            chunk_size=self.chunk_size,
+            filter=None if self.delta_step is None else "delta",
+            step=self.delta_step
+        ))
+        # 1スレッドで実行するため，チャンクは投入した順に書き込まれる
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LmzWriter")
+
+    def _write_chunk(self, block: NDArray[np.floating]):
+        if self.delta_step is None:
+            data = np.ascontiguousarray(block, dtype=block.dtype.newbyteorder("<")).tobytes()
+        else:
+            data = delta_encode(block, self.delta_step)
+        payload = self.compress(data)
+        self.index.append((write_lmz_chunk(self.fp, block.shape[0], payload), block.shape[0]))
+
+    def flush(self):
+
+        if not self.buffer: return
+
+        if self.fp is None:
+            self._open(self.buffer[0])
+
+        self.pending.append(self.executor.submit(self._write_chunk, np.stack(self.buffer)))
+        self.buffer.clear()
+
+        while len(self.pending) > self.max_pending:
+            self.pending.pop(0).result()
+
+    def write(self, row: NDArray[np.floating]):
+        self.buffer.append(row)
+        self.count += 1
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def close(self) -> int:
+
+        self.flush()
+        if self.fp is None:
+            return self.count
+
+        try:
+            for future in self.pending:
+                future.result()
+        finally:
+            self.pending.clear()
+            self.executor.shutdown()
+            self.executor = None
+
+        write_lmz_index(self.fp, self.index)
+        self.fp.close()
+        self.fp = None
+        self._commit()
+        return self.count
+
+    def abort(self):
+        self.buffer.clear()
+        if self.fp is None: return
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.executor.shutdown()
+        self.executor = None
+        self.fp.close()
+        self.fp = None
+        self.tmp_path.unlink(missing_ok=True)
+
+class ArrayWriter(LandmarkWriter):
+    """
+    ディスクへ書き出さず，メモリ上の配列に行を書き込みます
+
+    `out` を渡した場合はその配列 (e.g. 共有メモリ上の配列) へ直接書き込みます．
+    渡さない場合は既知のフレーム数分を確保し，足りなければ拡張します．close 後の `array` が結果です．
+    """
+
+    suffix = ""
+
+    def __init__(self, total: int, out: NDArray[np.floating] | None = None):
+        super().__init__(Path(), total, atomic=False)
+        self.buffer = out
+        self.growable = out is None
+        self.array: NDArray[np.floating] | None = None
+
+    def write(self, row: NDArray[np.floating]):
+
+        if self.buffer is None:
+            self.buffer = np.empty((max(self.total, 1), *row.shape), dtype=row.dtype)
+
+        if self.count >= self.buffer.shape[0]:
+            if not self.growable: # out は拡張できない
+                raise ValueError(f"frame count exceeds the size of out ({self.buffer.shape[0]})")
+            self.buffer = np.concatenate([self.buffer, np.empty_like(self.buffer)])
+
+        self.buffer[self.count] = row
+        self.count += 1
+
+    def close(self) -> int:
+        if self.buffer is not None:
+            self.array = self.buffer[:self.count]
+        return self.count
+
+    def abort(self):
+        self.buffer = None
+
+WRITERS: dict[str, type[LandmarkWriter]] = {
+    writer.suffix: writer for writer in (NpyWriter, CsvWriter, NpzWriter, LmzWriter)
+}
+
+def open_writer(path: Path, total: int, **options: Any) -> LandmarkWriter:
+    """出力先の拡張子に対応する `LandmarkWriter` を作成します"""
+
+    try:
+        writer_type = WRITERS[path.suffix]
+    except KeyError:
+        raise ValueError(f"unsupported landmarks .ext '{path.suffix}'") from None
+
+    return writer_type(path, total, **options)
@@ -28,8 +28,12 @@ setup(
         "opencv-python==4.10.0.84",
         "ffmpeg-python",
         "mediapipe",
-        "tqdm"
+        "tqdm",
+        "threadpoolctl"
     ],
+    extras_require = {
+        "zstd": ["zstandard"]
+    },
     entry_points = {
         "console_scripts": [
             "mpdriver = mpdriver.__main__:main"
@@ -0,0 +1,108 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""`AsyncExtractor` のタイムアウトと取り消し (MediaPipe で推論する)"""
+
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("mediapipe")
+
+from mpdriver.api import AsyncExtractor
+
+LONG_FRAMES = 600
+"取り消さなければ数秒かかる長さ"
+
+def write_video(path, frames: int):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 30., (160, 120))
+    for i in range(frames):
+        image = np.zeros((120, 160, 3), dtype=np.uint8)
+        cv2.circle(image, (20 + i % 120, 60), 10, (255, 255, 255), -1)
+        writer.write(image)
+    writer.release()
+
+@pytest.fixture(scope="module")
+def videos(tmp_path_factory):
+    root = tmp_path_factory.mktemp("videos")
+    write_video(root / "short.mp4", 5)
+    write_video(root / "long.mp4", LONG_FRAMES)
+    return root / "short.mp4", root / "long.mp4"
+
+async def timed(awaitable) -> tuple[object, float]:
+    start = time.perf_counter()
+    return await awaitable, time.perf_counter() - start
+
+def test_extract(videos):
+
+    short, _ = videos
+    async def main():
+        async with AsyncExtractor() as extractor:
+            return await extractor.extract(short)
+    landmarks = asyncio.run(main())
+    assert landmarks.shape[0] == 5
+
+def test_timeout_stops_the_running_job(videos):
+
+    short, long = videos
+    async def main():
+        async with AsyncExtractor() as extractor:
+            with pytest.raises(TimeoutError):
+                await extractor.extract(long, timeout=0.3)
+            # 1つのスレッドで実行するため，中断していなければ長い動画の残りを待つことになる
+            return await timed(extractor.extract(short))
+    landmarks, seconds = asyncio.run(main())
+    assert landmarks.shape[0] == 5
+    assert seconds < 3.
+
+def test_cancel_stops_the_running_job(videos):
+
+    short, long = videos
+    async def main():
+        async with AsyncExtractor() as extractor:
+            task = asyncio.ensure_future(extractor.extract(long))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return await timed(extractor.extract(short))
+    landmarks, seconds = asyncio.run(main())
+    assert landmarks.shape[0] == 5
+    assert seconds < 3.
+
+def test_extract_many_returns_timeouts(videos):
+
+    short, long = videos
+    async def main():
+        async with AsyncExtractor(timeout=0.5) as extractor:
+            return {path.name: landmarks async for path, landmarks, _ in extractor.extract_many([long, short], return_exceptions=True)}
+    results = asyncio.run(main())
+    assert isinstance(results["long.mp4"], TimeoutError)
+    assert results["short.mp4"].shape[0] == 5
+
+def test_timeout_reaches_the_worker_process(videos):
+
+    short, long = videos
+    async def main():
+        async with AsyncExtractor(workers=1) as extractor:
+            await extractor.extract(short) # ワーカの起動とモデルの読み込み
+            with pytest.raises(TimeoutError):
+                await extractor.extract(long, timeout=0.3)
+            return await timed(extractor.extract(short))
+    landmarks, seconds = asyncio.run(main())
+    assert landmarks.shape[0] == 5
+    assert seconds < 3.
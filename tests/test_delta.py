@@ -0,0 +1,77 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""差分符号化 (`mpdriver.utils.delta`): 量子化，欠損のビットマスク，zigzag と byte shuffle"""
+
+import numpy as np
+import pytest
+
+from mpdriver.utils.delta import delta_decode, delta_encode
+
+STEP = 1e-3
+
+def trajectory(frames: int = 50, columns: int = 6) -> np.ndarray:
+    t = np.linspace(0., 2. * np.pi, frames)[:, None]
+    return (np.sin(t + np.arange(columns)) * 0.5).astype(np.float32)
+
+def payload_width(data: bytes) -> int:
+    return data[0]
+
+@pytest.mark.parametrize("shape", [(6,), (3, 2)])
+def test_round_trip_within_half_step(shape):
+
+    block = trajectory().reshape(-1, *shape)
+    restored = delta_decode(delta_encode(block, STEP), len(block), shape, np.float32, STEP)
+    assert restored.shape == block.shape and restored.dtype == np.float32
+    assert np.abs(restored - block).max() <= STEP / 2 + 1e-6
+
+def test_missing_values_keep_their_positions():
+
+    block = trajectory()
+    block[:3, 0] = np.nan   # 先頭から欠損
+    block[10:20, 2] = np.nan
+    block[-1] = np.nan
+    restored = delta_decode(delta_encode(block, STEP), len(block), (6,), np.float32, STEP)
+
+    np.testing.assert_array_equal(np.isnan(restored), np.isnan(block))
+    present = ~np.isnan(block)
+    assert np.abs(restored[present] - block[present]).max() <= STEP / 2 + 1e-6
+
+def test_zigzag_packs_small_residuals_into_one_byte():
+
+    block = trajectory(frames=100, columns=4)
+    size = block.size
+    data = delta_encode(block, 1e-2)
+    assert payload_width(data) == 1
+    assert len(data) == 1 + -(-size // 8) + size # 幅，欠損のビットマスク，1バイトずつの差分
+
+    # 負の差分も正の差分と同じ幅に収まる
+    assert payload_width(delta_encode(-block, 1e-2)) == 1
+
+def test_large_residuals_widen_and_stay_exact():
+
+    block = np.array([[0.], [1.], [-1.], [0.]], dtype=np.float64)
+    data = delta_encode(block, 1e-6) # 差分は ±2e6 なので 4 バイト
+    assert payload_width(data) == 4
+    np.testing.assert_allclose(delta_decode(data, 4, (1,), np.float64, 1e-6), block, atol=1e-9)
+
+def test_byte_shuffle_groups_bytes_by_significance():
+
+    block = np.array([[0.3], [0.6], [0.9], [1.2]], dtype=np.float32) # 先頭の絶対値と差分は全て 300 (zigzag で 600 = 0x0258)
+    data = delta_encode(block, 1e-3)
+    assert payload_width(data) == 2
+    values = np.frombuffer(data, dtype=np.uint8, offset=1 + 1) # 幅と1バイトのビットマスクの後
+    # 下位バイトが並んだ後に上位バイトが並ぶ
+    np.testing.assert_array_equal(values[:4], [0x58] * 4)
+    np.testing.assert_array_equal(values[4:], [0x02] * 4)
@@ -0,0 +1,140 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""コーディネータとワーカ (localhost) によるジョブの分配"""
+
+import socket
+import time
+from threading import Thread
+from typing import Any
+
+from mpdriver.core.distributed import JobBoard, serve_jobs, connect_board, run_worker
+from mpdriver.core.main_base import AppBase, AppExecutor, JobFailure
+
+AUTHKEY = "test"
+
+class EchoApp(AppBase):
+
+    def __init__(self):
+        pass
+
+    def run(self, x: int, mode: str = "ok"):
+        if mode == "raise":
+            raise ValueError(f"bad {x}")
+        time.sleep(0.05)
+        return x
+
+class EchoExecutor(AppExecutor[EchoApp]):
+    app_type = EchoApp
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def serve_in_thread(board: JobBoard, address: tuple[str, int]) -> tuple[Thread, dict[str, Any]]:
+    """`serve_jobs` をスレッドで実行します．結果は `state["failures"]` と `state["outcomes"]` に入ります"""
+
+    state: dict[str, Any] = {"outcomes": {}}
+    def on_complete(i: int, outcome: tuple[Any, float] | JobFailure):
+        state["outcomes"][i] = outcome
+    def target():
+        state["failures"] = serve_jobs(board, address, AUTHKEY, on_complete)
+    thread = Thread(target=target, daemon=True)
+    thread.start()
+    return thread, state
+
+def worker_in_thread(address: tuple[str, int], name: str, cpu: int | None = None) -> tuple[Thread, dict[str, Any]]:
+
+    state: dict[str, Any] = {}
+    def target():
+        state["counts"] = run_worker(EchoExecutor, connect_board(address, AUTHKEY, timeout=10.), name, cpu)
+    thread = Thread(target=target, daemon=True)
+    thread.start()
+    return thread, state
+
+def test_board_expire_requeues_leased_jobs():
+
+    board = JobBoard([((i,), {}) for i in range(3)], lease=0.1)
+    worker = board.register("a")
+    assert [i for i, _, _ in board.acquire(worker, 2)] == [0, 1]
+
+    time.sleep(0.2)
+    assert board.expire() == [0, 1]
+    assert board.heartbeat(worker, [0, 1]) == [0, 1] # 期限切れの lease は延長できない
+    assert board.pending == [0, 1, 2]
+
+    other = board.register("b")
+    assert [i for i, _, _ in board.acquire(other, 1)] == [0]
+    board.complete(other, 0, 1.)
+    board.complete(worker, 0, 1.) # 遅れて届いた同じジョブの結果は数えない
+    assert [i for i, _ in board.drain(0.)] == [0]
+
+def test_board_retries_then_fails():
+
+    board = JobBoard([((0,), {})], retries=1, retry_backoff=0.)
+    worker = board.register("a")
+    for _ in range(2):
+        (i, _, _), = board.acquire(worker, 1)
+        board.fail(worker, i, "ValueError: bad 0")
+    assert board.done()
+    assert [(f.index, f.attempts) for f in board.failed()] == [(0, 2)]
+
+def test_workers_share_jobs_and_report_failures():
+
+    modes = ["ok"] * 8 + ["raise"]
+    board = JobBoard([((i,), {"mode": mode}) for i, mode in enumerate(modes)], lease=5.)
+    address = ("127.0.0.1", free_port())
+    server, served = serve_in_thread(board, address)
+    workers = [worker_in_thread(address, name) for name in ("a", "b")]
+
+    for thread, _ in workers:
+        thread.join(60.)
+    server.join(60.)
+    assert not server.is_alive()
+
+    completed, failed = (sum(counts) for counts in zip(*(state["counts"] for _, state in workers)))
+    assert (completed, failed) == (8, 1)
+    assert sorted(served["outcomes"]) == list(range(len(modes)))
+    assert [(f.index, f.error) for f in served["failures"]] == [(8, "ValueError: bad 8")]
+
+def test_expired_lease_runs_on_another_worker():
+
+    board = JobBoard([((i,), {}) for i in range(4)], lease=1.)
+    address = ("127.0.0.1", free_port())
+    server, served = serve_in_thread(board, address)
+
+    # ジョブを借りたまま応答しないワーカ
+    stale = connect_board(address, AUTHKEY, timeout=10.)
+    (leased, _, _), = stale.acquire(stale.register("stale"), 1)
+
+    worker, state = worker_in_thread(address, "live")
+    worker.join(60.)
+    server.join(60.)
+
+    assert state["counts"] == (4, 0)
+    assert leased in served["outcomes"]
+    assert served["failures"] == []
+
+def test_worker_with_process_pool():
+
+    board = JobBoard([((i,), {}) for i in range(4)], lease=5.)
+    address = ("127.0.0.1", free_port())
+    server, served = serve_in_thread(board, address)
+    worker, state = worker_in_thread(address, "pool", cpu=2)
+    worker.join(120.)
+    server.join(60.)
+
+    assert state["counts"] == (4, 0)
+    assert sorted(served["outcomes"]) == [0, 1, 2, 3]
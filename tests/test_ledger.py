@@ -0,0 +1,95 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""ジョブの台帳 (`JobLedger`) による完了の判定"""
+
+import os
+
+from mpdriver.core.ledger import JobLedger, file_output, input_identity, pack_output
+
+CONFIG = "config-hash"
+
+def make_input(tmp_path, data: bytes = b"video"):
+    src = tmp_path / "a.mp4"
+    src.write_bytes(data)
+    return src
+
+def make_output(tmp_path, data: bytes = b"landmarks"):
+    out = tmp_path / "a.npy"
+    out.write_bytes(data)
+    return out
+
+def test_done_job_is_skipped_until_input_or_output_changes(tmp_path):
+
+    src, out = make_input(tmp_path), make_output(tmp_path)
+    with JobLedger(tmp_path / "runs.sqlite") as ledger:
+        identity = input_identity(src)
+        assert not ledger.is_done(identity, CONFIG)
+
+        ledger.pending(identity, CONFIG)
+        assert not ledger.is_done(identity, CONFIG) # 中断したジョブはやり直す
+
+        ledger.done(identity, CONFIG, 1.5, [file_output(out)])
+        assert ledger.is_done(identity, CONFIG)
+        assert not ledger.is_done(identity, "other-config")
+
+        out.write_bytes(b"short") # 出力のサイズが違う
+        assert not ledger.is_done(identity, CONFIG)
+        out.write_bytes(b"landmarks")
+        assert ledger.is_done(identity, CONFIG)
+
+        out.unlink()
+        assert not ledger.is_done(identity, CONFIG)
+
+def test_changed_input_is_compared_by_content_hash(tmp_path):
+
+    src, out = make_input(tmp_path), make_output(tmp_path)
+    with JobLedger(tmp_path / "runs.sqlite") as ledger:
+        ledger.done(input_identity(src, hash_content=True), CONFIG, 1., [file_output(out)])
+
+        os.utime(src, (0., 0.)) # 内容を変えずに更新時刻だけ変える (e.g. コピー)
+        touched = input_identity(src)
+        assert not ledger.is_done(touched, CONFIG)
+        assert ledger.is_done(touched, CONFIG, hash_content=True)
+        assert ledger.is_done(touched, CONFIG) # 一致したのでサイズと更新時刻が更新された
+
+        src.write_bytes(b"other") # 内容が変わった
+        assert not ledger.is_done(input_identity(src), CONFIG, hash_content=True)
+
+def test_pack_outputs_are_checked_by_key(tmp_path):
+
+    src = make_input(tmp_path)
+    root = tmp_path / "lm"
+    with JobLedger(tmp_path / "runs.sqlite") as ledger:
+        identity = input_identity(src)
+        ledger.done(identity, CONFIG, 1., [pack_output(root, "a.mp4")])
+
+        pack_keys = {root.resolve().as_posix(): {"a.mp4"}}
+        assert ledger.is_done(identity, CONFIG, pack_keys)
+        assert not ledger.is_done(identity, CONFIG, {root.resolve().as_posix(): set()})
+
+def test_failed_jobs_and_content_hashes_are_recorded(tmp_path):
+
+    src = make_input(tmp_path)
+    with JobLedger(tmp_path / "runs.sqlite") as ledger:
+        identity = input_identity(src, hash_content=True)
+        ledger.failed(identity, CONFIG, "ValueError: bad", 3)
+        assert not ledger.is_done(identity, CONFIG)
+
+        (entry,) = ledger.entries("failed")
+        assert (entry.status, entry.attempts, entry.error) == ("failed", 3, "ValueError: bad")
+        assert ledger.content_hashes() == {(identity.path, identity.size, identity.mtime): identity.content_hash}
+
+    with JobLedger(tmp_path / "runs.sqlite") as ledger: # 再び開いても残る
+        assert ledger.get(identity.path, CONFIG).status == "failed"
@@ -0,0 +1,84 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""".lmz (`LmzWriter`，`LmzReader`) のチャンク単位の読み書き"""
+
+import numpy as np
+import pytest
+
+from mpdriver.utils import LmzReader, LmzWriter, load_lmz
+from mpdriver.utils.lmz import LMZ_INDEX_MAGIC, get_codec
+
+def landmarks(frames: int = 10) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((frames, 8)).astype(np.float32)
+    matrix[3, :4] = np.nan
+    return matrix
+
+def write(path, matrix: np.ndarray, **options) -> int:
+    with LmzWriter(path, len(matrix), **options) as writer:
+        for row in matrix:
+            writer.write(row)
+    return writer.count
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_chunks_round_trip(tmp_path, codec):
+
+    matrix = landmarks()
+    assert write(tmp_path / "a.lmz", matrix, codec=codec, chunk_size=4) == 10
+
+    with LmzReader(tmp_path / "a.lmz") as reader:
+        assert reader.header["codec"] == codec
+        assert reader.n_chunks == 3 and len(reader) == 10
+        assert reader.index[:, 1].tolist() == [4, 4, 2]
+        np.testing.assert_array_equal(reader.read_chunk(1), matrix[4:8]) # 途中のチャンクだけを展開する
+    np.testing.assert_array_equal(load_lmz(tmp_path / "a.lmz"), matrix)
+
+def test_delta_filter_is_lossy_within_half_step(tmp_path):
+
+    matrix = landmarks()
+    write(tmp_path / "a.lmz", matrix, chunk_size=4, delta_step=1e-3)
+    restored = load_lmz(tmp_path / "a.lmz")
+    np.testing.assert_array_equal(np.isnan(restored), np.isnan(matrix))
+    present = ~np.isnan(matrix)
+    assert np.abs(restored[present] - matrix[present]).max() <= 5e-4 + 1e-6
+
+def test_reader_walks_chunks_without_index(tmp_path):
+
+    path = tmp_path / "a.lmz"
+    matrix = landmarks()
+    write(path, matrix, chunk_size=4)
+
+    data = path.read_bytes()
+    assert data.endswith(LMZ_INDEX_MAGIC)
+    # 最後のチャンクの途中で中断された: インデックスも最後のチャンクもない
+    with LmzReader(path) as reader:
+        last = int(reader.index[-1, 0])
+    path.write_bytes(data[:last + 5])
+
+    with LmzReader(path) as reader:
+        assert reader.n_chunks == 2
+        np.testing.assert_array_equal(reader.read(), matrix[:8])
+
+def test_abort_removes_the_partial_file(tmp_path):
+
+    writer = LmzWriter(tmp_path / "a.lmz", 10, chunk_size=2)
+    for row in landmarks()[:5]:
+        writer.write(row)
+    writer.abort()
+    assert list(tmp_path.iterdir()) == []
+
+def test_unknown_codec():
+    with pytest.raises(ValueError, match="unknown codec"):
+        get_codec("brotli")
@@ -0,0 +1,111 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""pack (`mpdriver.utils.pack`) への追記，中断と読み込み"""
+
+import numpy as np
+
+from mpdriver.utils import LandmarkDataset
+from mpdriver.utils.pack import PackWriter, load_pack_index, read_pack_clip
+
+def clip(frames: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((frames, 6)).astype(np.float32)
+
+def write_clip(pack: PackWriter, key: str, matrix: np.ndarray) -> int:
+    writer = pack.open_clip(key, f"/videos/{key}", len(matrix), 30.)
+    for row in matrix:
+        writer.write(row)
+    return writer.close()
+
+def shard_bytes(root) -> int:
+    return sum(p.stat().st_size for p in (root / "shards").iterdir())
+
+def test_clips_are_indexed_and_read_back(tmp_path):
+
+    pack = PackWriter(tmp_path, writer_id="w")
+    a, b = clip(5, 0), clip(3, 1)
+    assert write_clip(pack, "a.mp4", a) == 5
+    assert write_clip(pack, "sub/b.mp4", b) == 3
+    pack.close()
+
+    index = load_pack_index(tmp_path)
+    assert list(index) == ["a.mp4", "sub/b.mp4"]
+    assert index["sub/b.mp4"]["offset"] == a.nbytes
+    assert index["a.mp4"]["fps"] == 30. and index["a.mp4"]["shape"] == [6]
+    np.testing.assert_array_equal(read_pack_clip(tmp_path, index["sub/b.mp4"]), b)
+
+    ds = LandmarkDataset(tmp_path)
+    assert ds.keys == ["a.mp4", "sub/b.mp4"]
+    np.testing.assert_array_equal(ds.clip("a.mp4", 1, 4), a[1:4])
+
+def test_abort_truncates_and_next_clip_reuses_the_offset(tmp_path):
+
+    pack = PackWriter(tmp_path, writer_id="w")
+    write_clip(pack, "a.mp4", clip(5))
+
+    aborted = pack.open_clip("broken.mp4", "/videos/broken.mp4", 10)
+    for row in clip(4, 2):
+        aborted.write(row)
+    aborted.abort()
+    assert shard_bytes(tmp_path) == clip(5).nbytes # 書き込んだ分は切り詰められる
+
+    b = clip(3, 1)
+    write_clip(pack, "b.mp4", b)
+    pack.close()
+
+    index = load_pack_index(tmp_path)
+    assert "broken.mp4" not in index
+    assert index["b.mp4"]["offset"] == clip(5).nbytes
+    assert shard_bytes(tmp_path) == clip(5).nbytes + b.nbytes
+    np.testing.assert_array_equal(read_pack_clip(tmp_path, index["b.mp4"]), b)
+
+def test_interleaved_clips_are_spooled(tmp_path):
+
+    pack = PackWriter(tmp_path, writer_id="w")
+    a, b = clip(4, 0), clip(6, 1)
+    first = pack.open_clip("a.mp4", "a", len(a))
+    second = pack.open_clip("b.mp4", "b", len(b))
+    for i in range(6): # 2つのクリップを交互に書き込む (b は一時ファイルへ退避)
+        if i < 4:
+            first.write(a[i])
+        second.write(b[i])
+    second.close()
+    first.close()
+    pack.close()
+
+    index = load_pack_index(tmp_path)
+    np.testing.assert_array_equal(read_pack_clip(tmp_path, index["a.mp4"]), a)
+    np.testing.assert_array_equal(read_pack_clip(tmp_path, index["b.mp4"]), b)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["index", "pack.json", "shards"]
+
+def test_later_clip_wins_and_shards_roll_over(tmp_path):
+
+    pack = PackWriter(tmp_path, shard_size=1, writer_id="w") # クリップ毎に新しいシャード
+    write_clip(pack, "a.mp4", clip(2, 0))
+    write_clip(pack, "a.mp4", clip(3, 1))
+    pack.close()
+
+    index = load_pack_index(tmp_path)
+    assert index["a.mp4"]["frames"] == 3 and index["a.mp4"]["shard"] == "w-0001.bin"
+    np.testing.assert_array_equal(read_pack_clip(tmp_path, index["a.mp4"]), clip(3, 1))
+
+def test_partial_index_line_is_ignored(tmp_path):
+
+    pack = PackWriter(tmp_path, writer_id="w")
+    write_clip(pack, "a.mp4", clip(2))
+    pack.close()
+    with open(tmp_path / "index" / "w.jsonl", "a", encoding="utf-8") as fp:
+        fp.write('{"key": "b.mp4", "sha') # 書き込み途中で終了した
+
+    assert list(load_pack_index(tmp_path)) == ["a.mp4"]
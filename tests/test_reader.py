@@ -0,0 +1,34 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""`LandmarkDataset` によるディレクトリの読み込み"""
+
+import numpy as np
+
+from mpdriver.utils import LandmarkDataset
+from mpdriver.utils.atomic import temp_path
+
+def test_directory_skips_sidecars_and_temp_files(tmp_path):
+
+    clip = np.arange(12, dtype=np.float32).reshape(3, 4)
+    (tmp_path / "sub").mkdir()
+    for name in ["a.npy", "sub/b.npy", "a.mirror.npy", "a.raw.npy", "c.csv.rowgroups.npy"]:
+        np.save(tmp_path / name, clip)
+    np.save(temp_path(tmp_path / "d.npy", ".npy"), clip) # 書き込み途中で終了したジョブの一時ファイル
+
+    ds = LandmarkDataset(tmp_path)
+    assert ds.keys == ["a.npy", "sub/b.npy"]
+    np.testing.assert_array_equal(ds.clip("sub/b.npy", 1, 3), clip[1:3])
+
+    assert LandmarkDataset(tmp_path, "**/*.mirror.npy", exclude=()).keys == ["a.mirror.npy"]
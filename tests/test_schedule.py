@@ -0,0 +1,66 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""投入順序，makespan の予測と `AppExecutor.execute` の報告"""
+
+import time
+
+from mpdriver.core.main_base import AppBase, AppExecutor
+from mpdriver.core.schedule import longest_first, plan_schedule, schedule_report, simulate_makespan
+
+class SleepApp(AppBase):
+
+    def __init__(self):
+        pass
+
+    def run(self, x: int, seconds: float = 0.):
+        time.sleep(seconds)
+        return x
+
+class SleepExecutor(AppExecutor[SleepApp]):
+    app_type = SleepApp
+
+def test_longest_first_keeps_ties_in_order():
+    assert longest_first([1, 3, 1, 3]) == [1, 3, 0, 2]
+
+def test_plan_predicts_before_running():
+
+    plan = plan_schedule([1, 1, 1, 5], 2)
+    assert plan.order == [3, 0, 1, 2]
+    assert plan.predicted == 5
+    assert plan.predicted_unsorted == simulate_makespan([1, 1, 1, 5], 2) == 6
+    assert plan.lower_bound == 5
+
+    # 実際の所要時間は予測を変えない
+    report = schedule_report(plan, [0.1, 0.1, 0.1, 2.], 2, 2.5)
+    assert report.plan is plan
+    assert report.actual_lower_bound == 2.
+    assert "predicted 1.00x the lower bound (unsorted 1.20x)" in report.format()
+
+def test_execute_reports_only_reordered_runs():
+
+    executor = SleepExecutor(2)
+    try:
+        result = executor.execute([((i,), {"seconds": 0.05 * c}) for i, c in enumerate([1, 1, 1, 5])], costs=[1, 1, 1, 5])
+        assert result == [0, 1, 2, 3]
+        assert executor.schedule_report is not None
+
+        # 同じプールで続けて実行できる
+        assert executor.execute([((i,), {}) for i in range(3)], costs=[3, 2, 1]) == [0, 1, 2]
+        assert executor.schedule_report is None
+
+        assert executor.execute([], costs=[]) == []
+        assert executor.schedule_report is None
+    finally:
+        executor.shutdown()
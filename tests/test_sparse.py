@@ -0,0 +1,70 @@
+# Copyright 2024 The MPDriver3 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""疎な .npz (`NpzWriter(sparse=True)`，`mpdriver.utils.sparse`) の読み書き"""
+
+import numpy as np
+
+from mpdriver.utils import load_presence, load_sparse, save_sparse
+from mpdriver.utils.writer import NpzWriter
+
+TARGET_SIZES = {"pose": 2, "left_hand": 3, "empty": 0}
+N_DIMS = 4
+
+def landmarks(frames: int = 5) -> np.ndarray:
+    """左手は奇数フレームだけ，pose は最初のフレームだけ未検出 (NaN)"""
+
+    rng = np.random.default_rng(0)
+    cube = rng.standard_normal((frames, sum(TARGET_SIZES.values()), N_DIMS)).astype(np.float32)
+    cube[0, :2] = np.nan
+    cube[1::2, 2:5] = np.nan
+    return cube.reshape(frames, -1)
+
+def test_writer_round_trip(tmp_path):
+
+    matrix = landmarks()
+    path = tmp_path / "a.npz"
+    with NpzWriter(path, len(matrix), sparse=True, target_sizes=TARGET_SIZES, n_dims=N_DIMS, compress=True) as writer:
+        for row in matrix:
+            writer.write(row)
+
+    np.testing.assert_array_equal(load_sparse(path), matrix)
+    targets, presence = load_presence(path)
+    assert targets == list(TARGET_SIZES)
+    np.testing.assert_array_equal(presence[:, 0], [False, True, True, True, True])
+    np.testing.assert_array_equal(presence[:, 1], [True, False, True, False, True])
+    assert not presence[:, 2].any()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.npz"] # 退避用の一時ファイルは残らない
+
+    with np.load(path) as npz: # 検出されたフレームの値だけを持つ
+        assert npz["values_left_hand"].shape == (3, 3, N_DIMS)
+
+def test_writer_matches_save_sparse(tmp_path):
+
+    matrix = landmarks()
+    save_sparse(tmp_path / "b.npz", matrix, TARGET_SIZES, N_DIMS)
+    with NpzWriter(tmp_path / "c.npz", len(matrix), sparse=True, target_sizes=TARGET_SIZES, n_dims=N_DIMS) as writer:
+        for row in matrix:
+            writer.write(row)
+
+    with np.load(tmp_path / "b.npz") as expected, np.load(tmp_path / "c.npz") as actual:
+        for name in ("shape", "targets", "sizes", "mask", "values_pose", "values_left_hand"):
+            np.testing.assert_array_equal(actual[name], expected[name])
+
+def test_all_missing_frames(tmp_path):
+
+    matrix = np.full((3, sum(TARGET_SIZES.values()) * N_DIMS), np.nan, dtype=np.float32)
+    save_sparse(tmp_path / "d.npz", matrix, TARGET_SIZES, N_DIMS)
+    restored = load_sparse(tmp_path / "d.npz")
+    assert restored.shape == matrix.shape and np.isnan(restored).all()